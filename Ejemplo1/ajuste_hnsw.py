@@ -0,0 +1,271 @@
+"""
+Ajuste de los parámetros HNSW de la colección
+Calcula el top-k exacto por fuerza bruta sobre los embeddings guardados y mide
+recall@k y latencia en copias reconstruidas con distintos M, ef de construcción
+y ef de búsqueda; recomienda la configuración más rápida que alcanza el recall objetivo
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import get_chroma_config, get_hnsw_tuning_config
+from escaneo import iterar_lotes, obtener_coleccion
+
+# Valores por defecto de Chroma cuando la colección no los define
+HNSW_POR_DEFECTO = {"space": "l2", "M": 16, "construction_ef": 100, "search_ef": 100}
+
+def _percentil(ordenados, p):
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100.0 * (len(ordenados) - 1))))]
+
+def configuracion_hnsw(cliente):
+    """Retorna espacio, M, ef de construcción y ef de búsqueda de la colección"""
+    coleccion = obtener_coleccion(cliente)
+    hnsw = (getattr(coleccion, "configuration", None) or {}).get("hnsw") or {}
+    metadata = coleccion.metadata or {}
+    return {
+        "space": hnsw.get("space", metadata.get("hnsw:space", HNSW_POR_DEFECTO["space"])),
+        "M": hnsw.get("max_neighbors", metadata.get("hnsw:M", HNSW_POR_DEFECTO["M"])),
+        "construction_ef": hnsw.get("ef_construction",
+                                    metadata.get("hnsw:construction_ef", HNSW_POR_DEFECTO["construction_ef"])),
+        "search_ef": hnsw.get("ef_search", metadata.get("hnsw:search_ef", HNSW_POR_DEFECTO["search_ef"]))
+    }
+
+def cargar_vectores(cliente, tamano_lote=None):
+    """Lee IDs y embeddings de la colección por lotes; retorna (ids, matriz float32)"""
+    ids = []
+    bloques = []
+    for lote in iterar_lotes(cliente, include=("embeddings",), tamano_lote=tamano_lote):
+        ids.extend(lote["ids"])
+        bloques.append(np.asarray(lote["embeddings"], dtype=np.float32))
+    if not bloques:
+        return [], np.zeros((0, 0), dtype=np.float32)
+    return ids, np.vstack(bloques)
+
+def _distancias(consultas, vectores, espacio):
+    """Distancias como las calcula Chroma (l2 al cuadrado, 1 - coseno o 1 - producto interno)"""
+    if espacio == "cosine":
+        normas_v = np.linalg.norm(vectores, axis=1)
+        normas_c = np.linalg.norm(consultas, axis=1)
+        normas_v[normas_v == 0] = 1.0
+        normas_c[normas_c == 0] = 1.0
+        return 1.0 - (consultas / normas_c[:, None]) @ (vectores / normas_v[:, None]).T
+    if espacio == "ip":
+        return 1.0 - consultas @ vectores.T
+    cuadrados_v = np.einsum("ij,ij->i", vectores, vectores)
+    cuadrados_c = np.einsum("ij,ij->i", consultas, consultas)
+    return np.maximum(cuadrados_c[:, None] + cuadrados_v[None, :] - 2.0 * consultas @ vectores.T, 0.0)
+
+def verdad_exacta(vectores, indices_consulta, k, espacio, bloque=256):
+    """
+    Top-k exacto de cada consulta por fuerza bruta (por bloques de consultas)
+    La propia consulta se excluye: es un vector de la colección
+    """
+    verdad = []
+    for inicio in range(0, len(indices_consulta), bloque):
+        indices = indices_consulta[inicio:inicio + bloque]
+        distancias = _distancias(vectores[indices], vectores, espacio)
+        distancias[np.arange(len(indices)), indices] = np.inf
+        kk = min(k, vectores.shape[0] - 1)
+        candidatos = np.argpartition(distancias, kk - 1, axis=1)[:, :kk]
+        for fila, cand in enumerate(candidatos):
+            verdad.append(cand[np.argsort(distancias[fila, cand])].tolist())
+    return verdad
+
+def _abrir(directorio, nombre):
+    """Abre la copia con un cliente nuevo para que Chroma recargue el índice y su configuración"""
+    import chromadb
+    from chromadb.api.client import SharedSystemClient
+    
+    SharedSystemClient.clear_system_cache()
+    return chromadb.PersistentClient(path=directorio).get_collection(nombre)
+
+def construir_copia(directorio, ids, vectores, espacio, m, ef_construccion, ef_busqueda):
+    """Crea una copia de la colección con los parámetros HNSW indicados; retorna el tiempo (s)"""
+    import chromadb
+    
+    cliente = chromadb.PersistentClient(path=directorio)
+    coleccion = cliente.create_collection(
+        "ajuste_hnsw",
+        configuration={"hnsw": {
+            "space": espacio,
+            "max_neighbors": m,
+            "ef_construction": ef_construccion,
+            "ef_search": ef_busqueda
+        }},
+        embedding_function=None
+    )
+    lote = cliente.get_max_batch_size()
+    inicio = time.perf_counter()
+    for i in range(0, len(ids), lote):
+        coleccion.add(ids=ids[i:i + lote], embeddings=vectores[i:i + lote])
+    return time.perf_counter() - inicio
+
+def medir(coleccion, vectores, indices_consulta, ids, verdad, k, calentamiento=3):
+    """Recall@k medio y latencia por consulta (una consulta por llamada, como en el RAG)"""
+    n_resultados = min(k + 1, len(ids))
+    consultas = [vectores[i] for i in indices_consulta]
+    for consulta in consultas[:calentamiento]:
+        coleccion.query(query_embeddings=[consulta], n_results=n_resultados, include=[])
+    
+    latencias = []
+    recalls = []
+    for indice, consulta, exactos in zip(indices_consulta, consultas, verdad):
+        inicio = time.perf_counter()
+        resultado = coleccion.query(query_embeddings=[consulta], n_results=n_resultados, include=[])
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        
+        encontrados = [id_ for id_ in resultado["ids"][0] if id_ != ids[indice]][:len(exactos)]
+        esperados = {ids[j] for j in exactos}
+        recalls.append(len(esperados.intersection(encontrados)) / len(esperados) if esperados else 1.0)
+    
+    latencias.sort()
+    return {
+        "recall": round(float(np.mean(recalls)), 4),
+        "recall_min": round(float(np.min(recalls)), 4),
+        "p50_ms": round(_percentil(latencias, 50), 3),
+        "p95_ms": round(_percentil(latencias, 95), 3)
+    }
+
+def barrer(cliente, m_values=None, construction_ef=None, search_ef=None, k=None, n_consultas=None, semilla=42):
+    """
+    Ejecuta el barrido completo sobre copias temporales de la colección
+    Retorna un dict con la configuración actual, la muestra y las mediciones
+    """
+    config = get_hnsw_tuning_config()
+    m_values = m_values or config["m_values"]
+    construction_ef = construction_ef or config["construction_ef"]
+    search_ef = search_ef or config["search_ef"]
+    k = k or config["k"]
+    n_consultas = n_consultas or config["queries"]
+    
+    actual = configuracion_hnsw(cliente)
+    ids, vectores = cargar_vectores(cliente)
+    if len(ids) < 2:
+        raise ValueError("Se necesitan al menos 2 embeddings en la colección")
+    
+    generador = np.random.default_rng(semilla)
+    indices_consulta = np.sort(generador.choice(len(ids), size=min(n_consultas, len(ids)), replace=False))
+    
+    inicio = time.perf_counter()
+    verdad = verdad_exacta(vectores, indices_consulta, k, actual["space"])
+    tiempo_verdad = time.perf_counter() - inicio
+    
+    resultados = {
+        "timestamp": datetime.now().isoformat(),
+        "actual": actual,
+        "vectores": len(ids),
+        "dimension": int(vectores.shape[1]),
+        "k": k,
+        "consultas": len(indices_consulta),
+        "verdad_exacta_s": round(tiempo_verdad, 3),
+        "mediciones": []
+    }
+    
+    for m in m_values:
+        for ef_construccion in construction_ef:
+            directorio = tempfile.mkdtemp(prefix="ajuste_hnsw_")
+            try:
+                construccion_s = construir_copia(
+                    directorio, ids, vectores, actual["space"], m, ef_construccion, search_ef[0]
+                )
+                for ef_busqueda in search_ef:
+                    coleccion = _abrir(directorio, "ajuste_hnsw")
+                    coleccion.modify(configuration={"hnsw": {"ef_search": ef_busqueda}})
+                    coleccion = _abrir(directorio, "ajuste_hnsw")
+                    
+                    medicion = medir(coleccion, vectores, indices_consulta, ids, verdad, k)
+                    resultados["mediciones"].append({
+                        "M": m,
+                        "construction_ef": ef_construccion,
+                        "search_ef": ef_busqueda,
+                        "construccion_s": round(construccion_s, 3),
+                        **medicion
+                    })
+            finally:
+                from chromadb.api.client import SharedSystemClient
+                SharedSystemClient.clear_system_cache()
+                shutil.rmtree(directorio, ignore_errors=True)
+    return resultados
+
+def recomendar(mediciones, recall_objetivo=None):
+    """
+    Retorna la medición más rápida (p95) que alcanza el recall objetivo;
+    a igual latencia se prefiere menos memoria (M) y construcción más barata
+    """
+    recall_objetivo = recall_objetivo or get_hnsw_tuning_config()["target_recall"]
+    validas = [m for m in mediciones if m["recall"] >= recall_objetivo]
+    if not validas:
+        return None
+    return min(validas, key=lambda m: (m["p95_ms"], m["M"], m["construction_ef"], m["search_ef"]))
+
+def main():
+    """Ejecuta el barrido y muestra la recomendación"""
+    import chromadb
+    
+    config = get_hnsw_tuning_config()
+    parser = argparse.ArgumentParser(description="Ajuste de parámetros HNSW (recall@k vs latencia)")
+    parser.add_argument("--objetivo", type=float, default=config["target_recall"], help="Recall@k objetivo")
+    parser.add_argument("--k", type=int, default=config["k"])
+    parser.add_argument("--consultas", type=int, default=config["queries"])
+    parser.add_argument("--salida", default=config["results_path"])
+    args = parser.parse_args()
+    
+    print("=" * 60)
+    print("🎯 AJUSTE DE PARÁMETROS HNSW")
+    print("=" * 60)
+    
+    chroma_config = get_chroma_config()
+    coleccion = chromadb.PersistentClient(path=chroma_config["persist_directory"]).get_collection(
+        chroma_config["collection_name"]
+    )
+    resultados = barrer(coleccion, k=args.k, n_consultas=args.consultas)
+    actual = resultados["actual"]
+    
+    print(f"📊 {resultados['vectores']} vectores de {resultados['dimension']} dimensiones, "
+          f"{resultados['consultas']} consultas, recall@{resultados['k']}")
+    print(f"🧮 Verdad exacta por fuerza bruta: {resultados['verdad_exacta_s']:.2f}s")
+    print(f"⚙️  Actual: espacio {actual['space']}, M={actual['M']}, "
+          f"ef_construcción={actual['construction_ef']}, ef_búsqueda={actual['search_ef']}")
+    
+    print(f"\n   {'M':>4}{'ef_c':>6}{'ef_s':>6}{'recall':>9}{'mín':>7}{'p50 ms':>9}{'p95 ms':>9}{'build s':>9}")
+    for m in resultados["mediciones"]:
+        print(f"   {m['M']:>4}{m['construction_ef']:>6}{m['search_ef']:>6}{m['recall']:>9.3f}"
+              f"{m['recall_min']:>7.2f}{m['p50_ms']:>9.2f}{m['p95_ms']:>9.2f}{m['construccion_s']:>9.2f}")
+    
+    recomendada = recomendar(resultados["mediciones"], args.objetivo)
+    resultados["objetivo"] = args.objetivo
+    resultados["recomendada"] = recomendada
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Resultados guardados en {args.salida}")
+    
+    if not recomendada:
+        print(f"⚠️  Ninguna combinación alcanza recall {args.objetivo:.2f}; prueba M o ef mayores")
+        return
+    
+    print(f"\n✅ Recomendado para recall ≥ {args.objetivo:.2f}: M={recomendada['M']}, "
+          f"ef_construcción={recomendada['construction_ef']}, ef_búsqueda={recomendada['search_ef']} "
+          f"(recall {recomendada['recall']:.3f}, p95 {recomendada['p95_ms']:.2f}ms)")
+    if (recomendada["M"], recomendada["construction_ef"]) != (actual["M"], actual["construction_ef"]):
+        print("💡 M y ef_construcción solo se fijan al crear la colección: vuelve a vectorizar con")
+        print(f"   configuration={{'hnsw': {{'space': '{actual['space']}', 'max_neighbors': {recomendada['M']}, "
+              f"'ef_construction': {recomendada['construction_ef']}, 'ef_search': {recomendada['search_ef']}}}}}")
+    elif recomendada["search_ef"] != actual["search_ef"]:
+        print("💡 ef_búsqueda se puede cambiar sin reconstruir:")
+        print(f"   collection.modify(configuration={{'hnsw': {{'ef_search': {recomendada['search_ef']}}}}})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""
+Analítica del espacio de embeddings
+Recorre los vectores de la colección por bloques (la memoria depende del bloque y
+de unos pocos escalares por chunk, no de la colección entera) y reporta normas,
+chunks degenerados, casi duplicados (grafo aproximado con LSH por hiperplanos
+aleatorios sobre los vectores centrados), atípicos y agrupamiento k-means
+mini-batch por documento fuente
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import get_analytics_config, get_chroma_config
+from escaneo import iterar_lotes, obtener_coleccion
+
+class Progreso:
+    """Indicador de avance en una sola línea"""
+    
+    def __init__(self, etiqueta, total=None):
+        self.etiqueta = etiqueta
+        self.total = total
+        self.hechos = 0
+        self.inicio = time.perf_counter()
+    
+    def avanzar(self, cantidad):
+        self.hechos += cantidad
+        total = f"/{self.total}" if self.total else ""
+        print(f"\r   ⏳ {self.etiqueta}: {self.hechos}{total}", end="", flush=True)
+    
+    def terminar(self):
+        segundos = time.perf_counter() - self.inicio
+        print(f"\r   ✅ {self.etiqueta}: {self.hechos} en {segundos:.1f}s" + " " * 10)
+
+def _unitarios(bloque):
+    """Normaliza las filas (las de norma 0 quedan en 0) y retorna también las normas"""
+    normas = np.linalg.norm(bloque, axis=1)
+    return bloque / np.where(normas > 0, normas, 1.0)[:, None], normas
+
+def _firmas(centrados, planos, bits_por_banda):
+    """
+    Una clave entera por banda: el signo del vector frente a bits_por_banda hiperplanos
+    Se aplica a los vectores menos el centroide: los embeddings de texto ocupan un cono
+    estrecho (coseno medio alto entre chunks cualesquiera) y, sin centrar, casi todos
+    caen del mismo lado de cada hiperplano y los buckets dejan de ser selectivos
+    """
+    bits = (centrados @ planos.T > 0).reshape(len(centrados), -1, bits_por_banda)
+    return bits.astype(np.int64) @ (1 << np.arange(bits_por_banda, dtype=np.int64))
+
+def primera_pasada(cliente, config, total=None):
+    """
+    Normas, longitudes de texto, fuentes y suma de vectores unitarios (centroide)
+    Solo se conservan escalares por chunk; los vectores se descartan con cada bloque
+    """
+    ids, normas, longitudes, fuentes = [], [], [], []
+    suma = None
+    progreso = Progreso("Pasada 1: normas y centroide", total)
+    for lote in iterar_lotes(cliente, include=("embeddings", "documents", "metadatas"),
+                             tamano_lote=config["batch_size"]):
+        unitarios, normas_bloque = _unitarios(np.asarray(lote["embeddings"], dtype=np.float32))
+        suma = unitarios.sum(axis=0) if suma is None else suma + unitarios.sum(axis=0)
+        normas.append(normas_bloque)
+        ids.extend(lote["ids"])
+        longitudes.extend(len(documento or "") for documento in lote["documents"])
+        fuentes.extend((metadata or {}).get("source", "") for metadata in lote["metadatas"])
+        progreso.avanzar(len(lote["ids"]))
+    progreso.terminar()
+    
+    if not ids:
+        return None
+    return {
+        "ids": ids,
+        "normas": np.concatenate(normas),
+        "longitudes": np.asarray(longitudes),
+        "fuentes": fuentes,
+        "centroide": (suma / max(np.linalg.norm(suma), 1e-12)).astype(np.float32)
+    }
+
+def segunda_pasada(cliente, base, planos, config):
+    """Distancia de cada chunk al centroide y firmas LSH de los vectores centrados"""
+    distancias = np.empty(len(base["ids"]), dtype=np.float32)
+    firmas = []
+    posicion = 0
+    progreso = Progreso("Pasada 2: distancias y firmas", len(base["ids"]))
+    for lote in iterar_lotes(cliente, include=("embeddings",), tamano_lote=config["batch_size"]):
+        fin = posicion + len(lote["ids"])
+        if lote["ids"] != base["ids"][posicion:fin]:
+            raise RuntimeError("La colección cambió durante el análisis; vuelve a ejecutarlo")
+        unitarios, _ = _unitarios(np.asarray(lote["embeddings"], dtype=np.float32))
+        distancias[posicion:fin] = 1.0 - unitarios @ base["centroide"]
+        firmas.append(_firmas(unitarios - base["centroide"], planos, config["lsh_bits_per_band"]))
+        posicion = fin
+        progreso.avanzar(len(lote["ids"]))
+    progreso.terminar()
+    return distancias, np.vstack(firmas)
+
+def pares_candidatos(firmas, max_bucket):
+    """
+    Pares (i, j) con i < j que comparten clave en alguna banda, como array (m, 2) sin
+    repetidos (8 bytes por índice en vez de una tupla de Python por par)
+    Retorna también cuántos buckets se ignoraron por superar max_bucket
+    """
+    n = len(firmas)
+    codigos = []
+    ignorados = 0
+    for banda in range(firmas.shape[1]):
+        orden = np.argsort(firmas[:, banda], kind="stable")
+        claves = firmas[orden, banda]
+        cortes = np.flatnonzero(np.diff(claves)) + 1
+        for grupo in np.split(orden, cortes):
+            if len(grupo) < 2:
+                continue
+            if len(grupo) > max_bucket:
+                ignorados += 1
+                continue
+            a, b = np.triu_indices(len(grupo), 1)
+            menores = np.minimum(grupo[a], grupo[b]).astype(np.int64)
+            mayores = np.maximum(grupo[a], grupo[b]).astype(np.int64)
+            codigos.append(menores * n + mayores)
+        if codigos:
+            codigos = [np.unique(np.concatenate(codigos))]
+    if not codigos:
+        return np.empty((0, 2), dtype=np.int64), ignorados
+    return np.stack(np.divmod(codigos[0], n), axis=1), ignorados
+
+def verificar_pares(cliente, ids, pares, config):
+    """
+    Similitud exacta de los pares candidatos, bloque a bloque: cada bloque trae con
+    get(ids=...) solo los vectores de sus pares (como mucho 2 × ANALYTICS_BATCH_SIZE)
+    """
+    coleccion = obtener_coleccion(cliente)
+    aristas = []
+    progreso = Progreso("Pasada 3: pares candidatos", len(pares))
+    for inicio in range(0, len(pares), config["batch_size"]):
+        bloque = pares[inicio:inicio + config["batch_size"]]
+        indices = np.unique(bloque)
+        lote = coleccion.get(ids=[ids[i] for i in indices], include=["embeddings"])
+        posiciones = {id_: k for k, id_ in enumerate(lote["ids"])}
+        if len(posiciones) != len(indices):
+            raise RuntimeError("La colección cambió durante el análisis; vuelve a ejecutarlo")
+        unitarios, _ = _unitarios(np.asarray(lote["embeddings"], dtype=np.float32))
+        filas_i = [posiciones[ids[i]] for i in bloque[:, 0]]
+        filas_j = [posiciones[ids[j]] for j in bloque[:, 1]]
+        similitudes = np.einsum("ij,ij->i", unitarios[filas_i], unitarios[filas_j])
+        for (i, j), similitud in zip(bloque, similitudes):
+            if similitud >= config["duplicate_threshold"]:
+                aristas.append((int(i), int(j), float(similitud)))
+        progreso.avanzar(len(bloque))
+    progreso.terminar()
+    return aristas
+
+def grupos_duplicados(aristas, n):
+    """Componentes conexas del grafo de casi duplicados (union-find)"""
+    padre = list(range(n))
+    
+    def raiz(i):
+        while padre[i] != i:
+            padre[i] = padre[padre[i]]
+            i = padre[i]
+        return i
+    
+    for i, j, _ in aristas:
+        padre[raiz(i)] = raiz(j)
+    grupos = {}
+    for i in {i for arista in aristas for i in arista[:2]}:
+        grupos.setdefault(raiz(i), []).append(i)
+    return sorted((sorted(grupo) for grupo in grupos.values()), key=len, reverse=True)
+
+def _zscore(valores):
+    desviacion = valores.std()
+    return (valores - valores.mean()) / desviacion if desviacion > 0 else np.zeros_like(valores)
+
+def _iniciar_centros(unitarios, k, rng):
+    """k-means++ sobre el primer bloque"""
+    centros = [unitarios[rng.integers(len(unitarios))]]
+    for _ in range(1, k):
+        distancias = np.clip(1.0 - np.max(unitarios @ np.array(centros).T, axis=1), 0.0, None)
+        total = distancias.sum()
+        if total <= 0:
+            break
+        centros.append(unitarios[rng.choice(len(unitarios), p=distancias / total)])
+    return np.array(centros)
+
+def kmeans_fuente(cliente, fuente, k, config, rng):
+    """
+    k-means esférico mini-batch sobre los chunks de una fuente (un bloque por paso)
+    Retorna tamaños y cohesión (similitud media al centro) de cada grupo
+    """
+    centros, cuentas = None, None
+    filtro = {"source": fuente}
+    for _ in range(config["kmeans_epochs"]):
+        for lote in iterar_lotes(cliente, include=("embeddings",), tamano_lote=config["batch_size"], where=filtro):
+            unitarios, _ = _unitarios(np.asarray(lote["embeddings"], dtype=np.float32))
+            if centros is None:
+                centros = _iniciar_centros(unitarios, min(k, len(unitarios)), rng)
+                cuentas = np.zeros(len(centros))
+            asignacion = np.argmax(unitarios @ centros.T, axis=1)
+            for c in np.unique(asignacion):
+                miembros = unitarios[asignacion == c]
+                cuentas[c] += len(miembros)
+                tasa = len(miembros) / cuentas[c]
+                centros[c] = (1 - tasa) * centros[c] + tasa * miembros.mean(axis=0)
+            centros /= np.maximum(np.linalg.norm(centros, axis=1), 1e-12)[:, None]
+    if centros is None:
+        return []
+    
+    tamanos = np.zeros(len(centros), dtype=np.int64)
+    similitudes = np.zeros(len(centros))
+    for lote in iterar_lotes(cliente, include=("embeddings",), tamano_lote=config["batch_size"], where=filtro):
+        unitarios, _ = _unitarios(np.asarray(lote["embeddings"], dtype=np.float32))
+        similitud = unitarios @ centros.T
+        asignacion = np.argmax(similitud, axis=1)
+        np.add.at(tamanos, asignacion, 1)
+        np.add.at(similitudes, asignacion, similitud[np.arange(len(asignacion)), asignacion])
+    grupos = [
+        {"chunks": int(tamano), "cohesion": round(float(similitudes[c] / tamano), 4)}
+        for c, tamano in enumerate(tamanos) if tamano
+    ]
+    return sorted(grupos, key=lambda g: g["chunks"], reverse=True)
+
+def analizar(cliente, config=None):
+    """Ejecuta todas las pasadas y retorna el informe (None si la colección está vacía)"""
+    config = config or get_analytics_config()
+    coleccion = obtener_coleccion(cliente)
+    rng = np.random.default_rng(config["seed"])
+    inicio = time.perf_counter()
+    
+    total = coleccion.count()
+    if not total:
+        return None
+    dimension = len(next(iterar_lotes(coleccion, include=("embeddings",), tamano_lote=1))["embeddings"][0])
+    planos = rng.standard_normal((config["lsh_bands"] * config["lsh_bits_per_band"], dimension)).astype(np.float32)
+    
+    base = primera_pasada(coleccion, config, total)
+    if base is None:
+        return None
+    distancias, firmas = segunda_pasada(coleccion, base, planos, config)
+    pares, ignorados = pares_candidatos(firmas, config["lsh_max_bucket"])
+    aristas = verificar_pares(coleccion, base["ids"], pares, config)
+    
+    ids, normas, longitudes, fuentes = base["ids"], base["normas"], base["longitudes"], base["fuentes"]
+    
+    def chunk(i, **extra):
+        return dict({"id": ids[i], "source": os.path.basename(fuentes[i]), "caracteres": int(longitudes[i])}, **extra)
+    
+    degenerados = [
+        chunk(i, norma=round(float(normas[i]), 4))
+        for i in np.flatnonzero((normas <= 1e-6) | (longitudes < config["min_chunk_chars"]))
+    ]
+    z_norma, z_distancia = _zscore(normas), _zscore(distancias)
+    atipicos = [
+        chunk(i, z_norma=round(float(z_norma[i]), 2), z_distancia=round(float(z_distancia[i]), 2))
+        for i in np.flatnonzero((np.abs(z_norma) > config["outlier_z"]) | (z_distancia > config["outlier_z"]))
+    ]
+    grupos = grupos_duplicados(aristas, len(ids))
+    
+    clusters = {}
+    conteo_fuentes = {}
+    for fuente in fuentes:
+        conteo_fuentes[fuente] = conteo_fuentes.get(fuente, 0) + 1
+    progreso = Progreso("k-means por fuente", len(conteo_fuentes))
+    for fuente in sorted(conteo_fuentes):
+        if fuente:
+            clusters[fuente] = kmeans_fuente(coleccion, fuente, config["clusters_per_source"], config, rng)
+        progreso.avanzar(1)
+    progreso.terminar()
+    
+    return {
+        "vectores": len(ids),
+        "dimension": dimension,
+        "normas": {
+            "media": float(normas.mean()),
+            "desviacion": float(normas.std()),
+            "min": float(normas.min()),
+            "p50": float(np.percentile(normas, 50)),
+            "max": float(normas.max())
+        },
+        "degenerados": degenerados,
+        "atipicos": atipicos,
+        "duplicados": {
+            "umbral": config["duplicate_threshold"],
+            "pares_candidatos": len(pares),
+            "buckets_ignorados": ignorados,
+            "aristas": len(aristas),
+            "grupos": [[chunk(i) for i in grupo] for grupo in grupos],
+            "chunks_redundantes": sum(len(grupo) - 1 for grupo in grupos)
+        },
+        "clusters_por_fuente": clusters,
+        "segundos": round(time.perf_counter() - inicio, 2)
+    }
+
+def imprimir_informe(informe, max_filas=10):
+    """Muestra el resumen del análisis"""
+    if informe is None:
+        print("ℹ️ La colección está vacía")
+        return
+    
+    normas = informe["normas"]
+    print(f"\n📐 {informe['vectores']} vectores de {informe['dimension']} dimensiones "
+          f"({informe['segundos']:.1f}s)")
+    print(f"   - Norma: media {normas['media']:.4f} ± {normas['desviacion']:.4f}, "
+          f"mín {normas['min']:.4f}, p50 {normas['p50']:.4f}, máx {normas['max']:.4f}")
+    
+    print(f"\n🧩 Chunks degenerados (vector nulo o texto corto): {len(informe['degenerados'])}")
+    for chunk in informe["degenerados"][:max_filas]:
+        print(f"   - {chunk['source']} [{chunk['id']}]: {chunk['caracteres']} caracteres, norma {chunk['norma']}")
+    
+    print(f"\n🎯 Atípicos: {len(informe['atipicos'])}")
+    for chunk in informe["atipicos"][:max_filas]:
+        print(f"   - {chunk['source']} [{chunk['id']}]: z norma {chunk['z_norma']:+.1f}, "
+              f"z distancia al centroide {chunk['z_distancia']:+.1f}")
+    
+    duplicados = informe["duplicados"]
+    print(f"\n👯 Casi duplicados (coseno ≥ {duplicados['umbral']}): {len(duplicados['grupos'])} grupos, "
+          f"{duplicados['chunks_redundantes']} chunks redundantes "
+          f"({duplicados['pares_candidatos']} pares candidatos verificados)")
+    if duplicados["buckets_ignorados"]:
+        print(f"   ⚠️  {duplicados['buckets_ignorados']} buckets demasiado grandes no se compararon "
+              f"(ANALYTICS_LSH_MAX_BUCKET)")
+    for grupo in duplicados["grupos"][:max_filas]:
+        print(f"   - {len(grupo)} chunks: " + ", ".join(f"{c['source']} ({c['caracteres']} car.)" for c in grupo[:4]))
+    
+    print(f"\n🗂️  Clusters por fuente:")
+    for fuente, grupos in informe["clusters_por_fuente"].items():
+        tamanos = ", ".join(f"{g['chunks']} ({g['cohesion']:.2f})" for g in grupos)
+        print(f"   - {os.path.basename(fuente)}: {tamanos}")
+
+def main():
+    """Analiza los embeddings de la colección y guarda el informe en JSON"""
+    import chromadb
+    
+    config = get_analytics_config()
+    parser = argparse.ArgumentParser(description="Analítica del espacio de embeddings")
+    parser.add_argument("--umbral", type=float, default=config["duplicate_threshold"],
+                        help="Similitud coseno mínima para casi duplicados")
+    parser.add_argument("--clusters", type=int, default=config["clusters_per_source"], help="k por fuente")
+    parser.add_argument("--lote", type=int, default=config["batch_size"], help="Vectores por bloque")
+    parser.add_argument("--salida", default=config["results_path"])
+    args = parser.parse_args()
+    config.update(duplicate_threshold=args.umbral, clusters_per_source=args.clusters, batch_size=args.lote)
+    
+    print("=" * 60)
+    print("🧬 ANALÍTICA DE EMBEDDINGS")
+    print("=" * 60)
+    
+    chroma_config = get_chroma_config()
+    coleccion = chromadb.PersistentClient(path=chroma_config["persist_directory"]).get_collection(
+        chroma_config["collection_name"]
+    )
+    informe = analizar(coleccion, config)
+    imprimir_informe(informe)
+    if informe:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Informe guardado en {args.salida}")
+
+if __name__ == "__main__":
+    main()
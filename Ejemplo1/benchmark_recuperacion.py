@@ -0,0 +1,300 @@
+"""
+Benchmark de latencia de la recuperación
+Mide por separado el embedding de las consultas (Ollama) y la búsqueda en Chroma,
+con calentamiento, repeticiones y barridos de k, consultas por llamada y clientes
+simultáneos; guarda los resultados en JSON y los compara con una línea base
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import get_benchmark_config, get_chroma_config, get_models_config
+from escaneo import escanear, obtener_coleccion
+
+def _percentil(ordenados, p):
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100.0 * (len(ordenados) - 1))))]
+
+def resumir_latencias(latencias_ms, consultas, duracion_s):
+    """Resume latencias por operación (ms) y el throughput en consultas por segundo"""
+    ordenados = sorted(latencias_ms)
+    return {
+        "operaciones": len(ordenados),
+        "media_ms": round(sum(ordenados) / len(ordenados), 3) if ordenados else 0.0,
+        "p50_ms": round(_percentil(ordenados, 50), 3),
+        "p95_ms": round(_percentil(ordenados, 95), 3),
+        "p99_ms": round(_percentil(ordenados, 99), 3),
+        "max_ms": round(ordenados[-1], 3) if ordenados else 0.0,
+        "consultas_por_s": round(consultas / duracion_s, 2) if duracion_s > 0 else 0.0
+    }
+
+def _lotes(elementos, tamano, cantidad):
+    """Genera `cantidad` lotes de `tamano` elementos recorriendo la lista en círculo"""
+    lotes = []
+    posicion = 0
+    for _ in range(cantidad):
+        lotes.append([elementos[(posicion + i) % len(elementos)] for i in range(tamano)])
+        posicion += tamano
+    return lotes
+
+def _ejecutar(operacion, lotes, concurrencia, calentamiento):
+    """
+    Ejecuta la operación sobre cada lote con `concurrencia` clientes
+    Retorna las latencias (ms) de cada llamada y la duración total medida
+    """
+    for lote in lotes[:calentamiento]:
+        operacion(lote)
+    medidos = lotes[calentamiento:]
+    
+    latencias = []
+    lock = threading.Lock()
+    
+    def medir(lote):
+        inicio = time.perf_counter()
+        operacion(lote)
+        duracion = (time.perf_counter() - inicio) * 1000
+        with lock:
+            latencias.append(duracion)
+    
+    inicio = time.perf_counter()
+    if concurrencia <= 1:
+        for lote in medidos:
+            medir(lote)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrencia) as ejecutor:
+            list(ejecutor.map(medir, medidos))
+    return latencias, time.perf_counter() - inicio
+
+def medir_embeddings(embeddings, consultas, tamanos_lote, repeticiones, calentamiento):
+    """
+    Mide el embedding de consultas: embed_query para lotes de 1 y
+    embed_documents para lotes mayores
+    """
+    resultados = []
+    for tamano in tamanos_lote:
+        if tamano == 1:
+            operacion = lambda lote: embeddings.embed_query(lote[0])
+        else:
+            operacion = embeddings.embed_documents
+        lotes = _lotes(consultas, tamano, calentamiento + repeticiones)
+        latencias, duracion = _ejecutar(operacion, lotes, 1, calentamiento)
+        resultados.append({"lote": tamano, **resumir_latencias(latencias, tamano * repeticiones, duracion)})
+    return resultados
+
+def medir_busqueda(coleccion, vectores, k, tamano_lote, concurrencia, repeticiones, calentamiento):
+    """
+    Mide la búsqueda en Chroma con vectores ya calculados (sin tiempo de embedding)
+    Cada cliente simultáneo hace `repeticiones` llamadas de `tamano_lote` consultas
+    """
+    def operacion(lote):
+        coleccion.query(
+            query_embeddings=lote,
+            n_results=k,
+            include=["documents", "metadatas", "distances"]
+        )
+    
+    lotes = _lotes(vectores, tamano_lote, calentamiento + repeticiones * concurrencia)
+    latencias, duracion = _ejecutar(operacion, lotes, concurrencia, calentamiento)
+    return {
+        "k": k,
+        "lote": tamano_lote,
+        "concurrencia": concurrencia,
+        **resumir_latencias(latencias, tamano_lote * len(latencias), duracion)
+    }
+
+def vectores_de_consultas(embeddings, consultas):
+    """Calcula una vez los embeddings de las consultas para reutilizarlos en la búsqueda"""
+    return [embeddings.embed_query(consulta) for consulta in consultas]
+
+def vectores_de_coleccion(cliente, cantidad):
+    """Usa embeddings guardados en la colección como consultas (no requiere Ollama)"""
+    return [
+        list(registro["embedding"])
+        for registro in escanear(cliente, include=("embeddings",), limite=cantidad)
+    ]
+
+def ejecutar_benchmark(cliente, embeddings=None, consultas=None, k_values=None, tamanos_lote=None,
+                       concurrencias=None, repeticiones=None, calentamiento=None):
+    """
+    Ejecuta el barrido completo y retorna los resultados como dict
+    Sin modelo de embeddings se buscan vectores de la propia colección y
+    solo se mide la búsqueda
+    """
+    config = get_benchmark_config()
+    consultas = consultas or config["queries"]
+    k_values = k_values or config["k_values"]
+    tamanos_lote = tamanos_lote or config["batch_sizes"]
+    concurrencias = concurrencias or config["concurrency"]
+    repeticiones = repeticiones or config["repetitions"]
+    calentamiento = config["warmup"] if calentamiento is None else calentamiento
+    coleccion = obtener_coleccion(cliente)
+    
+    resultados = {
+        "timestamp": datetime.now().isoformat(),
+        "entorno": {
+            "coleccion": coleccion.name,
+            "documentos": coleccion.count(),
+            "modelo_embeddings": get_models_config()["embedding_model"] if embeddings is not None else None,
+            "python": platform.python_version(),
+            "plataforma": platform.platform()
+        },
+        "parametros": {
+            "consultas": len(consultas),
+            "k": k_values,
+            "lotes": tamanos_lote,
+            "concurrencia": concurrencias,
+            "repeticiones": repeticiones,
+            "calentamiento": calentamiento
+        },
+        "embedding": [],
+        "busqueda": []
+    }
+    
+    if embeddings is not None:
+        resultados["embedding"] = medir_embeddings(
+            embeddings, consultas, tamanos_lote, repeticiones, calentamiento
+        )
+        vectores = vectores_de_consultas(embeddings, consultas)
+    else:
+        vectores = vectores_de_coleccion(cliente, len(consultas))
+    
+    if not vectores:
+        return resultados
+    
+    for k in k_values:
+        for tamano in tamanos_lote:
+            for concurrencia in concurrencias:
+                resultados["busqueda"].append(
+                    medir_busqueda(coleccion, vectores, k, tamano, concurrencia, repeticiones, calentamiento)
+                )
+    return resultados
+
+def comparar_con_baseline(resultados, baseline, tolerancia=None):
+    """
+    Compara cada combinación con la misma de la línea base
+    Retorna las regresiones: p95 mayor o throughput menor que la tolerancia permitida
+    """
+    tolerancia = get_benchmark_config()["regression_tolerance"] if tolerancia is None else tolerancia
+    regresiones = []
+    
+    def comparar(nombre, actual, base):
+        if base["p95_ms"] and actual["p95_ms"] > base["p95_ms"] * (1 + tolerancia):
+            regresiones.append(f"{nombre}: p95 {base['p95_ms']:.2f}ms -> {actual['p95_ms']:.2f}ms")
+        if base["consultas_por_s"] and actual["consultas_por_s"] < base["consultas_por_s"] * (1 - tolerancia):
+            regresiones.append(
+                f"{nombre}: {base['consultas_por_s']:.1f} -> {actual['consultas_por_s']:.1f} consultas/s"
+            )
+    
+    base_embedding = {m["lote"]: m for m in baseline.get("embedding", [])}
+    for medida in resultados["embedding"]:
+        if medida["lote"] in base_embedding:
+            comparar(f"embedding lote={medida['lote']}", medida, base_embedding[medida["lote"]])
+    
+    clave = lambda m: (m["k"], m["lote"], m["concurrencia"])
+    base_busqueda = {clave(m): m for m in baseline.get("busqueda", [])}
+    for medida in resultados["busqueda"]:
+        if clave(medida) in base_busqueda:
+            nombre = "búsqueda k={} lote={} concurrencia={}".format(*clave(medida))
+            comparar(nombre, medida, base_busqueda[clave(medida)])
+    return regresiones
+
+def imprimir_resultados(resultados):
+    """Muestra las tablas de embedding y búsqueda"""
+    entorno = resultados["entorno"]
+    print(f"📊 Colección '{entorno['coleccion']}': {entorno['documentos']} documentos")
+    
+    if resultados["embedding"]:
+        print(f"\n🧮 Embedding de consultas ({entorno['modelo_embeddings']}):")
+        print(f"   {'lote':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'cons/s':>10}")
+        for m in resultados["embedding"]:
+            print(f"   {m['lote']:>5}{m['p50_ms']:>10.2f}{m['p95_ms']:>10.2f}{m['p99_ms']:>10.2f}"
+                  f"{m['consultas_por_s']:>10.1f}")
+    else:
+        print("\nℹ️ Embedding no medido (consultas tomadas de vectores de la colección)")
+    
+    if resultados["busqueda"]:
+        print(f"\n🔍 Búsqueda en Chroma:")
+        print(f"   {'k':>4}{'lote':>6}{'conc':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'cons/s':>10}")
+        for m in resultados["busqueda"]:
+            print(f"   {m['k']:>4}{m['lote']:>6}{m['concurrencia']:>6}{m['p50_ms']:>10.2f}"
+                  f"{m['p95_ms']:>10.2f}{m['p99_ms']:>10.2f}{m['consultas_por_s']:>10.1f}")
+
+def _lista_enteros(texto):
+    return [int(valor) for valor in texto.split(",") if valor.strip()]
+
+def main():
+    """Ejecuta el benchmark y lo compara con la línea base"""
+    config = get_benchmark_config()
+    parser = argparse.ArgumentParser(description="Benchmark de latencia de la recuperación")
+    parser.add_argument("--k", type=_lista_enteros, help="Valores de k (ej. 1,5,10)")
+    parser.add_argument("--lotes", type=_lista_enteros, help="Consultas por llamada (ej. 1,8)")
+    parser.add_argument("--concurrencia", type=_lista_enteros, help="Clientes simultáneos (ej. 1,4)")
+    parser.add_argument("--repeticiones", type=int, help="Operaciones medidas por combinación")
+    parser.add_argument("--calentamiento", type=int, help="Operaciones descartadas antes de medir")
+    parser.add_argument("--sin-embeddings", action="store_true",
+                        help="Solo búsqueda, con vectores de la colección (no usa Ollama)")
+    parser.add_argument("--salida", default=config["results_path"], help="Archivo JSON de resultados")
+    parser.add_argument("--baseline", default=config["baseline_path"], help="Línea base para comparar")
+    parser.add_argument("--guardar-baseline", action="store_true", help="Guardar los resultados como línea base")
+    args = parser.parse_args()
+    
+    print("=" * 60)
+    print("⏱️  BENCHMARK DE RECUPERACIÓN")
+    print("=" * 60)
+    
+    import chromadb
+    
+    chroma_config = get_chroma_config()
+    coleccion = chromadb.PersistentClient(path=chroma_config["persist_directory"]).get_collection(
+        chroma_config["collection_name"]
+    )
+    
+    embeddings = None
+    if not args.sin_embeddings:
+        from cliente_ollama import crear_embeddings
+        embeddings = crear_embeddings(get_models_config()["embedding_model"])
+    
+    resultados = ejecutar_benchmark(
+        coleccion, embeddings,
+        k_values=args.k, tamanos_lote=args.lotes, concurrencias=args.concurrencia,
+        repeticiones=args.repeticiones, calentamiento=args.calentamiento
+    )
+    imprimir_resultados(resultados)
+    
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Resultados guardados en {args.salida}")
+    
+    if args.guardar_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"📌 Línea base actualizada: {args.baseline}")
+        return
+    
+    if not os.path.exists(args.baseline):
+        print(f"💡 Sin línea base; créala con: python benchmark_recuperacion.py --guardar-baseline")
+        return
+    
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regresiones = comparar_con_baseline(resultados, baseline)
+    if regresiones:
+        print(f"\n❌ Regresiones respecto a {args.baseline} (tolerancia {config['regression_tolerance']:.0%}):")
+        for regresion in regresiones:
+            print(f"   - {regresion}")
+        sys.exit(1)
+    print(f"\n✅ Sin regresiones respecto a {args.baseline}")
+
+if __name__ == "__main__":
+    main()
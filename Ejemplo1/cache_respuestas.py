@@ -0,0 +1,541 @@
+"""
+Caché persistente de respuestas del LLM
+Evita regenerar respuestas para preguntas repetidas sobre el mismo contexto
+"""
+
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+import numpy as np
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import get_cache_config, get_models_config
+
+def normalizar_pregunta(pregunta):
+    """
+    Normaliza una pregunta para que variaciones triviales compartan clave
+    (mayúsculas, espacios repetidos y signos de interrogación/exclamación)
+    """
+    texto = pregunta.strip().lower()
+    texto = re.sub(r"[¿?¡!]", "", texto)
+    texto = re.sub(r"\s+", " ", texto)
+    return texto.strip()
+
+def obtener_id_chunk(doc):
+    """
+    Retorna el ID de un chunk recuperado de Chroma
+    Si el documento no trae ID se usa un hash de su contenido y metadatos
+    """
+    doc_id = getattr(doc, "id", None)
+    if doc_id:
+        return str(doc_id)
+    
+    metadata = doc.metadata or {}
+    huella = f"{metadata.get('source', '')}|{metadata.get('page', '')}|{doc.page_content}"
+    return hashlib.sha256(huella.encode("utf-8")).hexdigest()[:32]
+
+def hash_prompt(template):
+    """Retorna el hash del template de prompt usado en la clave de caché"""
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+
+def huella_chunks(textos):
+    """Retorna un hash del contenido de los chunks que respaldan una respuesta"""
+    return hashlib.sha256("\x00".join(textos).encode("utf-8")).hexdigest()
+
+def _crear_contadores(conn):
+    """Contadores acumulados entre sesiones (aciertos y consultas de cada caché)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS contadores (
+            nombre TEXT PRIMARY KEY,
+            valor INTEGER NOT NULL
+        )
+    """)
+
+class _ContadoresPendientes:
+    """
+    Acumula los contadores en memoria y los suma a la tabla cada intervalo_s segundos
+    o al cerrar, para no escribir en disco en cada consulta (el llamador tiene el lock)
+    """
+    
+    def __init__(self, conn, intervalo_s):
+        self._conn = conn
+        self.intervalo_s = intervalo_s
+        self._pendientes = {}
+        self._ultimo_volcado = time.monotonic()
+    
+    def sumar(self, nombre):
+        self._pendientes[nombre] = self._pendientes.get(nombre, 0) + 1
+        if time.monotonic() - self._ultimo_volcado >= self.intervalo_s:
+            self.volcar()
+    
+    def volcar(self):
+        """Escribe los incrementos acumulados en una sola transacción"""
+        self._ultimo_volcado = time.monotonic()
+        if not self._pendientes:
+            return
+        self._conn.executemany(
+            "INSERT INTO contadores (nombre, valor) VALUES (?, ?) "
+            "ON CONFLICT(nombre) DO UPDATE SET valor = valor + excluded.valor",
+            list(self._pendientes.items())
+        )
+        self._conn.commit()
+        self._pendientes.clear()
+
+def leer_contadores(path=None):
+    """
+    Lee los contadores acumulados sin cargar las cachés (p. ej. desde el monitor)
+    Los procesos abiertos los escriben cada ANSWER_CACHE_COUNTERS_FLUSH_S segundos.
+    Retorna {} si el archivo o la tabla todavía no existen
+    """
+    path = path or get_cache_config()["path"]
+    if not os.path.exists(path):
+        return {}
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return dict(conn.execute("SELECT nombre, valor FROM contadores").fetchall())
+    except sqlite3.OperationalError:
+        return {}
+    finally:
+        conn.close()
+
+class AnswerCache:
+    """Caché de respuestas persistida en SQLite con TTL y tamaño máximo"""
+    
+    def __init__(self, path=None, ttl_seconds=None, max_entries=None):
+        """Inicializa la caché y crea la tabla si no existe"""
+        config = get_cache_config()
+        self.path = path or config["path"]
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else config["ttl_seconds"]
+        self.max_entries = max_entries if max_entries is not None else config["max_entries"]
+        
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS respuestas (
+                clave TEXT PRIMARY KEY,
+                pregunta TEXT NOT NULL,
+                chunk_ids TEXT NOT NULL,
+                modelo TEXT NOT NULL,
+                respuesta TEXT NOT NULL,
+                creado REAL NOT NULL,
+                ultimo_acceso REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_respuestas_acceso ON respuestas (ultimo_acceso)"
+        )
+        _crear_contadores(self._conn)
+        self._conn.commit()
+        self._contadores = _ContadoresPendientes(self._conn, config["counters_flush_s"])
+    
+    @staticmethod
+    def construir_clave(pregunta, chunk_ids, modelo, template):
+        """
+        Construye la clave de caché a partir de la pregunta normalizada,
+        los IDs de los chunks en orden de recuperación, el modelo y el prompt
+        """
+        partes = {
+            "pregunta": normalizar_pregunta(pregunta),
+            "chunks": list(chunk_ids),
+            "modelo": modelo,
+            "prompt": hash_prompt(template)
+        }
+        serializado = json.dumps(partes, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(serializado.encode("utf-8")).hexdigest()
+    
+    def obtener(self, clave):
+        """Retorna la respuesta en caché o None si no existe o expiró"""
+        ahora = time.time()
+        
+        with self._lock:
+            fila = self._conn.execute(
+                "SELECT respuesta, creado FROM respuestas WHERE clave = ?", (clave,)
+            ).fetchone()
+            
+            if fila is None:
+                self.misses += 1
+                self._contadores.sumar("respuestas_misses")
+                return None
+            
+            respuesta, creado = fila
+            if self.ttl_seconds and ahora - creado > self.ttl_seconds:
+                self._conn.execute("DELETE FROM respuestas WHERE clave = ?", (clave,))
+                self._conn.commit()
+                self.misses += 1
+                self._contadores.sumar("respuestas_misses")
+                return None
+            
+            self._conn.execute(
+                "UPDATE respuestas SET ultimo_acceso = ? WHERE clave = ?", (ahora, clave)
+            )
+            self._conn.commit()
+            self.hits += 1
+            self._contadores.sumar("respuestas_hits")
+            return respuesta
+    
+    def guardar(self, clave, pregunta, chunk_ids, modelo, respuesta):
+        """Guarda una respuesta y aplica la política de expulsión"""
+        ahora = time.time()
+        
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO respuestas
+                    (clave, pregunta, chunk_ids, modelo, respuesta, creado, ultimo_acceso)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (clave, pregunta, json.dumps(list(chunk_ids)), modelo, respuesta, ahora, ahora)
+            )
+            self._expulsar(ahora)
+            self._conn.commit()
+    
+    def _expulsar(self, ahora):
+        """Elimina entradas expiradas y las menos usadas si se supera el tamaño máximo"""
+        if self.ttl_seconds:
+            self._conn.execute(
+                "DELETE FROM respuestas WHERE creado < ?", (ahora - self.ttl_seconds,)
+            )
+        
+        if self.max_entries:
+            total = self._conn.execute("SELECT COUNT(*) FROM respuestas").fetchone()[0]
+            exceso = total - self.max_entries
+            if exceso > 0:
+                self._conn.execute(
+                    """
+                    DELETE FROM respuestas WHERE clave IN (
+                        SELECT clave FROM respuestas ORDER BY ultimo_acceso ASC LIMIT ?
+                    )
+                    """,
+                    (exceso,)
+                )
+    
+    def limpiar(self):
+        """Elimina todas las entradas de la caché"""
+        with self._lock:
+            self._conn.execute("DELETE FROM respuestas")
+            self._conn.commit()
+    
+    def estadisticas(self):
+        """Retorna el número de entradas y la tasa de aciertos de la sesión"""
+        with self._lock:
+            total = self._conn.execute("SELECT COUNT(*) FROM respuestas").fetchone()[0]
+        
+        consultas = self.hits + self.misses
+        return {
+            "entradas": total,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / consultas if consultas else 0.0
+        }
+    
+    def cerrar(self):
+        """Escribe los contadores pendientes y cierra la conexión con el archivo de caché"""
+        with self._lock:
+            self._contadores.volcar()
+            self._conn.close()
+
+class SemanticAnswerCache:
+    """
+    Caché semántica de respuestas
+    Guarda el embedding de cada pregunta y sirve la respuesta de una pregunta
+    parecida (similitud coseno sobre el umbral) generada con el mismo modelo y prompt
+    y comparada con el mismo modelo de embeddings
+    """
+    
+    def __init__(self, path=None, threshold=None, max_entries=None, ttl_seconds=None, audit_rate=None,
+                 modelo_embeddings=None):
+        """Inicializa la caché y carga los embeddings guardados en memoria"""
+        config = get_cache_config()
+        self.path = path or config["path"]
+        self.modelo_embeddings = modelo_embeddings or get_models_config()["embedding_model"]
+        self.threshold = threshold if threshold is not None else config["semantic_threshold"]
+        self.max_entries = max_entries if max_entries is not None else config["semantic_max_entries"]
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else config["ttl_seconds"]
+        self.audit_rate = audit_rate if audit_rate is not None else config["semantic_audit_rate"]
+        
+        self.lookups = 0
+        self.hits = 0
+        self._lock = threading.Lock()
+        
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS respuestas_semanticas (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                pregunta TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                chunk_ids TEXT NOT NULL,
+                huella_chunks TEXT NOT NULL,
+                grupo TEXT NOT NULL,
+                respuesta TEXT NOT NULL,
+                creado REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS auditoria_semantica (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                creado REAL NOT NULL,
+                pregunta TEXT NOT NULL,
+                pregunta_cacheada TEXT NOT NULL,
+                similitud REAL NOT NULL,
+                solapamiento_chunks REAL,
+                sospechoso INTEGER NOT NULL
+            )
+        """)
+        _crear_contadores(self._conn)
+        self._conn.commit()
+        self._contadores = _ContadoresPendientes(self._conn, config["counters_flush_s"])
+        
+        self._cargar()
+    
+    def _grupo(self, modelo, firma, dimension):
+        """
+        Solo se comparan preguntas respondidas con el mismo modelo y prompt cuyos
+        embeddings salen del mismo modelo y tienen la misma dimensión
+        """
+        return f"{modelo}|{hash_prompt(firma)}|{self.modelo_embeddings}|{dimension}"
+    
+    @staticmethod
+    def _normalizar(embedding):
+        """Normaliza un embedding para que el producto punto sea la similitud coseno"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norma = np.linalg.norm(vector)
+        return vector / norma if norma > 0 else vector
+    
+    def _cargar(self):
+        """
+        Carga las entradas vigentes en una matriz para la búsqueda vectorizada
+        Las filas de otro modelo de embeddings, de otra dimensión o de versiones
+        anteriores de la caché (sin modelo de embeddings en el grupo) se eliminan:
+        nunca podrían coincidir con una pregunta nueva
+        """
+        if self.ttl_seconds:
+            self._conn.execute(
+                "DELETE FROM respuestas_semanticas WHERE creado < ?",
+                (time.time() - self.ttl_seconds,)
+            )
+        
+        filas = self._conn.execute(
+            """
+            SELECT id, pregunta, embedding, chunk_ids, huella_chunks, grupo, respuesta, creado
+            FROM respuestas_semanticas ORDER BY creado ASC
+            """
+        ).fetchall()
+        
+        vigentes = []
+        for fila in filas:
+            partes = fila[5].split("|")
+            dimension = len(fila[2]) // np.dtype(np.float32).itemsize
+            if len(partes) == 4 and partes[2] == self.modelo_embeddings and partes[3] == str(dimension):
+                vigentes.append((fila, dimension))
+        # Si el modelo cambió de dimensión sin cambiar de nombre, vale la más reciente
+        if vigentes:
+            dimension_actual = vigentes[-1][1]
+            vigentes = [fila for fila, dimension in vigentes if dimension == dimension_actual]
+        
+        descartadas = len(filas) - len(vigentes)
+        if descartadas:
+            ids_vigentes = {fila[0] for fila in vigentes}
+            self._conn.executemany(
+                "DELETE FROM respuestas_semanticas WHERE id = ?",
+                [(fila[0],) for fila in filas if fila[0] not in ids_vigentes]
+            )
+            print(f"🧹 Caché semántica: {descartadas} entradas de otro modelo o dimensión de embeddings descartadas")
+        self._conn.commit()
+        
+        self._entradas = [
+            {
+                "id": fila[0],
+                "pregunta": fila[1],
+                "chunk_ids": json.loads(fila[3]),
+                "huella_chunks": fila[4],
+                "grupo": fila[5],
+                "respuesta": fila[6],
+                "creado": fila[7]
+            }
+            for fila in vigentes
+        ]
+        self._matriz = np.vstack([np.frombuffer(fila[2], dtype=np.float32) for fila in vigentes]) if vigentes else None
+        self._grupos = np.array([e["grupo"] for e in self._entradas], dtype=object)
+        self._creados = np.array([e["creado"] for e in self._entradas], dtype=np.float64)
+    
+    def _quitar(self, indices):
+        """Quita entradas de la matriz en memoria (la base ya se actualizó)"""
+        quitar = set(indices)
+        self._entradas = [e for i, e in enumerate(self._entradas) if i not in quitar]
+        if not self._entradas:
+            self._matriz = None
+        else:
+            self._matriz = np.delete(self._matriz, list(quitar), axis=0)
+        self._grupos = np.delete(self._grupos, list(quitar))
+        self._creados = np.delete(self._creados, list(quitar))
+    
+    def buscar(self, embedding, modelo, firma):
+        """
+        Busca la pregunta más parecida del mismo modelo y prompt
+        Retorna (entrada, similitud) si supera el umbral o (None, similitud)
+        """
+        consulta = self._normalizar(embedding)
+        grupo = self._grupo(modelo, firma, consulta.shape[0])
+        
+        with self._lock:
+            self.lookups += 1
+            self._contadores.sumar("semantica_lookups")
+            if self._matriz is None or self._matriz.shape[1] != consulta.shape[0]:
+                return None, 0.0
+            
+            similitudes = self._matriz @ consulta
+            similitudes[self._grupos != grupo] = -1.0
+            
+            if self.ttl_seconds:
+                similitudes[self._creados < time.time() - self.ttl_seconds] = -1.0
+            
+            indice = int(np.argmax(similitudes))
+            similitud = float(similitudes[indice])
+            if similitud < self.threshold:
+                return None, similitud
+            
+            return dict(self._entradas[indice]), similitud
+    
+    def registrar_hit(self):
+        """Cuenta un acierto servido (tras validar que los chunks no cambiaron)"""
+        with self._lock:
+            self.hits += 1
+            self._contadores.sumar("semantica_hits")
+    
+    def guardar(self, pregunta, embedding, chunk_ids, textos_chunks, modelo, firma, respuesta):
+        """Guarda una pregunta con su respuesta y expulsa las más antiguas si hace falta"""
+        vector = self._normalizar(embedding)
+        ahora = time.time()
+        entrada = {
+            "pregunta": pregunta,
+            "chunk_ids": list(chunk_ids),
+            "huella_chunks": huella_chunks(textos_chunks),
+            "grupo": self._grupo(modelo, firma, vector.shape[0]),
+            "respuesta": respuesta,
+            "creado": ahora
+        }
+        
+        with self._lock:
+            # Un embedding de otra dimensión deja obsoletas todas las entradas anteriores
+            if self._matriz is not None and self._matriz.shape[1] != vector.shape[0]:
+                self._conn.execute("DELETE FROM respuestas_semanticas")
+                self._quitar(range(len(self._entradas)))
+            
+            cursor = self._conn.execute(
+                """
+                INSERT INTO respuestas_semanticas
+                    (pregunta, embedding, chunk_ids, huella_chunks, grupo, respuesta, creado)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    pregunta,
+                    vector.tobytes(),
+                    json.dumps(entrada["chunk_ids"]),
+                    entrada["huella_chunks"],
+                    entrada["grupo"],
+                    respuesta,
+                    ahora
+                )
+            )
+            entrada["id"] = cursor.lastrowid
+            self._entradas.append(entrada)
+            self._matriz = vector[np.newaxis, :] if self._matriz is None else np.vstack([self._matriz, vector])
+            self._grupos = np.append(self._grupos, np.array([entrada["grupo"]], dtype=object))
+            self._creados = np.append(self._creados, ahora)
+            
+            # Las entradas en memoria están en orden de creación, igual que la expulsión
+            exceso = len(self._entradas) - self.max_entries if self.max_entries else 0
+            if exceso > 0:
+                self._conn.executemany(
+                    "DELETE FROM respuestas_semanticas WHERE id = ?",
+                    [(e["id"],) for e in self._entradas[:exceso]]
+                )
+                self._quitar(range(exceso))
+            self._conn.commit()
+    
+    def invalidar(self, entrada_id):
+        """Elimina una entrada cuyos chunks de respaldo ya no existen o cambiaron"""
+        with self._lock:
+            self._conn.execute("DELETE FROM respuestas_semanticas WHERE id = ?", (entrada_id,))
+            self._conn.commit()
+            self._quitar([i for i, e in enumerate(self._entradas) if e["id"] == entrada_id])
+    
+    def debe_auditar(self):
+        """Decide si un acierto se registra como muestra de auditoría"""
+        return random.random() < self.audit_rate
+    
+    def registrar_auditoria(self, pregunta, pregunta_cacheada, similitud, solapamiento_chunks=None):
+        """
+        Registra un acierto para revisión manual de falsos positivos
+        Se marca como sospechoso si la pregunta nueva recupera otros chunks
+        """
+        sospechoso = solapamiento_chunks is not None and solapamiento_chunks < 0.5
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO auditoria_semantica
+                    (creado, pregunta, pregunta_cacheada, similitud, solapamiento_chunks, sospechoso)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (time.time(), pregunta, pregunta_cacheada, similitud, solapamiento_chunks, int(sospechoso))
+            )
+            self._conn.commit()
+        return sospechoso
+    
+    def muestras_auditoria(self, limite=20):
+        """Retorna las muestras de auditoría más recientes"""
+        with self._lock:
+            filas = self._conn.execute(
+                """
+                SELECT creado, pregunta, pregunta_cacheada, similitud, solapamiento_chunks, sospechoso
+                FROM auditoria_semantica ORDER BY creado DESC LIMIT ?
+                """,
+                (limite,)
+            ).fetchall()
+        
+        return [
+            {
+                "creado": fila[0],
+                "pregunta": fila[1],
+                "pregunta_cacheada": fila[2],
+                "similitud": fila[3],
+                "solapamiento_chunks": fila[4],
+                "sospechoso": bool(fila[5])
+            }
+            for fila in filas
+        ]
+    
+    def estadisticas(self):
+        """Retorna entradas, tasa de aciertos y falsos hits sospechosos"""
+        with self._lock:
+            auditados, sospechosos = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(sospechoso), 0) FROM auditoria_semantica"
+            ).fetchone()
+            entradas = len(self._entradas)
+        
+        return {
+            "entradas": entradas,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_ratio": self.hits / self.lookups if self.lookups else 0.0,
+            "auditados": auditados,
+            "sospechosos": sospechosos
+        }
+    
+    def cerrar(self):
+        """Escribe los contadores pendientes y cierra la conexión con el archivo de caché"""
+        with self._lock:
+            self._contadores.volcar()
+            self._conn.close()
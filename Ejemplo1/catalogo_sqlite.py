@@ -0,0 +1,232 @@
+"""
+Catálogo de solo lectura sobre chroma.sqlite3
+Responde preguntas de catálogo (chunks por fuente, páginas indexadas, longitudes
+de los chunks) con SQL agregado sobre las tablas de metadatos que Chroma ya
+persiste, sin pasar por collection.get()
+"""
+
+import os
+import sqlite3
+import sys
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import get_chroma_config
+
+# Última migración de cada esquema de Chroma con la que se probaron las consultas
+# (chromadb 1.0.x). Si el archivo tiene una versión más nueva, el catálogo no se usa
+ESQUEMA_SOPORTADO = {"sysdb": 9, "metadb": 5, "embeddings_queue": 2}
+
+# Clave donde Chroma guarda el texto del chunk dentro de embedding_metadata
+CLAVE_DOCUMENTO = "chroma:document"
+
+class CatalogoNoDisponibleError(Exception):
+    """El archivo no existe o su esquema no es el que conocen las consultas"""
+
+class ChromaCatalog:
+    """Consultas agregadas de solo lectura sobre los metadatos persistidos de una colección"""
+    
+    def __init__(self, persist_directory=None, collection_name=None):
+        """Abre chroma.sqlite3 en modo solo lectura y verifica la versión del esquema"""
+        config = get_chroma_config()
+        self.persist_directory = persist_directory or config["persist_directory"]
+        self.collection_name = collection_name or config["collection_name"]
+        self.path = os.path.join(self.persist_directory, "chroma.sqlite3")
+        
+        if not os.path.exists(self.path):
+            raise CatalogoNoDisponibleError(f"No existe {self.path}")
+        
+        self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        try:
+            self._verificar_esquema()
+            self.collection_id, self.dimension = self._coleccion()
+            self.segmento_metadatos = self._segmento("METADATA")
+        except Exception:
+            self._conn.close()
+            raise
+    
+    def _verificar_esquema(self):
+        try:
+            versiones = dict(self._conn.execute(
+                "SELECT dir, MAX(version) FROM migrations GROUP BY dir"
+            ).fetchall())
+        except sqlite3.DatabaseError as e:
+            raise CatalogoNoDisponibleError(f"No se pudo leer la tabla migrations: {e}")
+        
+        for esquema, soportada in ESQUEMA_SOPORTADO.items():
+            version = versiones.get(esquema)
+            if version is None or version > soportada:
+                raise CatalogoNoDisponibleError(
+                    f"Esquema {esquema} en versión {version} (soportada hasta {soportada})"
+                )
+        self.versiones = versiones
+    
+    def _coleccion(self):
+        fila = self._conn.execute(
+            "SELECT id, dimension FROM collections WHERE name = ?", (self.collection_name,)
+        ).fetchone()
+        if fila is None:
+            raise CatalogoNoDisponibleError(f"No existe la colección '{self.collection_name}'")
+        return fila
+    
+    def _segmento(self, scope):
+        fila = self._conn.execute(
+            "SELECT id FROM segments WHERE collection = ? AND scope = ?", (self.collection_id, scope)
+        ).fetchone()
+        if fila is None:
+            raise CatalogoNoDisponibleError(f"La colección no tiene segmento {scope}")
+        return fila[0]
+    
+    def contar(self):
+        """Número de chunks de la colección"""
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM embeddings WHERE segment_id = ?", (self.segmento_metadatos,)
+        ).fetchone()[0]
+    
+    def contar_por_campo(self, campo):
+        """Chunks por valor de un campo de metadatos ({valor: chunks})"""
+        filas = self._conn.execute(
+            """
+            SELECT COALESCE(m.string_value, m.int_value, m.float_value, m.bool_value), COUNT(*)
+            FROM embedding_metadata m JOIN embeddings e ON e.id = m.id
+            WHERE m.key = ? AND e.segment_id = ?
+            GROUP BY 1
+            """,
+            (campo, self.segmento_metadatos)
+        ).fetchall()
+        return dict(filas)
+    
+    def chunks_por_fuente(self):
+        """Chunks por archivo fuente"""
+        return self.contar_por_campo("source")
+    
+    def chunks_por_pagina(self):
+        """Chunks por número de página"""
+        return self.contar_por_campo("page")
+    
+    def longitudes(self):
+        """
+        Chunks con texto y su longitud mínima, promedio y máxima en caracteres
+        LENGTH() de SQLite se detiene en el primer carácter NUL (aparece en texto
+        extraído de algunos PDFs), así que esos pocos chunks se miden en Python
+        """
+        con_nul = (
+            "LENGTH(CAST(SUBSTR(m.string_value, 1, LENGTH(m.string_value)) AS BLOB)) "
+            "< LENGTH(CAST(m.string_value AS BLOB))"
+        )
+        total, suma, minimo, maximo = self._conn.execute(
+            f"""
+            SELECT COUNT(*), SUM(LENGTH(m.string_value)), MIN(LENGTH(m.string_value)), MAX(LENGTH(m.string_value))
+            FROM embedding_metadata m JOIN embeddings e ON e.id = m.id
+            WHERE m.key = ? AND e.segment_id = ? AND NOT ({con_nul})
+            """,
+            (CLAVE_DOCUMENTO, self.segmento_metadatos)
+        ).fetchone()
+        
+        for (texto,) in self._conn.execute(
+            f"""
+            SELECT m.string_value FROM embedding_metadata m JOIN embeddings e ON e.id = m.id
+            WHERE m.key = ? AND e.segment_id = ? AND {con_nul}
+            """,
+            (CLAVE_DOCUMENTO, self.segmento_metadatos)
+        ):
+            total += 1
+            suma = (suma or 0) + len(texto)
+            minimo = len(texto) if minimo is None else min(minimo, len(texto))
+            maximo = len(texto) if maximo is None else max(maximo, len(texto))
+        
+        return {
+            "total": total,
+            "avg_length": suma / total if total else 0.0,
+            "min_length": minimo,
+            "max_length": maximo
+        }
+    
+    def con_metadatos(self):
+        """Chunks que tienen al menos un campo de metadatos además del texto"""
+        return self._conn.execute(
+            """
+            SELECT COUNT(DISTINCT m.id) FROM embedding_metadata m JOIN embeddings e ON e.id = m.id
+            WHERE m.key <> ? AND e.segment_id = ?
+            """,
+            (CLAVE_DOCUMENTO, self.segmento_metadatos)
+        ).fetchone()[0]
+    
+    def segmentos_conocidos(self):
+        """IDs de todos los segmentos registrados (de cualquier colección)"""
+        return {fila[0] for fila in self._conn.execute("SELECT id FROM segments")}
+    
+    def segmento_vectorial(self):
+        """ID del segmento HNSW de la colección (su directorio en persist_directory)"""
+        return self._segmento("VECTOR")
+    
+    def pendientes_de_indexar(self):
+        """
+        Operaciones de embeddings_queue posteriores a lo que el segmento HNSW ya
+        persistió (Chroma las aplica al índice al abrir o al llegar a sync_threshold)
+        """
+        segmento = self.segmento_vectorial()
+        return self._conn.execute(
+            """
+            SELECT COUNT(*) FROM embeddings_queue
+            WHERE topic LIKE '%/' || ?
+              AND seq_id > COALESCE((SELECT seq_id FROM max_seq_id WHERE segment_id = ?), 0)
+            """,
+            (self.collection_id, segmento)
+        ).fetchone()[0]
+    
+    def resumen(self):
+        """Mismo formato que CollectionStats.resumen() (estadisticas_coleccion.py)"""
+        longitudes = self.longitudes()
+        return {
+            "total": self.contar(),
+            "con_metadatos": self.con_metadatos(),
+            "avg_length": longitudes["avg_length"],
+            "min_length": longitudes["min_length"],
+            "max_length": longitudes["max_length"],
+            "chunks_por_fuente": self.chunks_por_fuente(),
+            "chunks_por_pagina": self.chunks_por_pagina()
+        }
+    
+    def cerrar(self):
+        """Cierra la conexión"""
+        self._conn.close()
+
+def abrir_catalogo(persist_directory=None, collection_name=None):
+    """Retorna el catálogo o None (con un aviso) si no se puede usar con este archivo"""
+    try:
+        return ChromaCatalog(persist_directory, collection_name)
+    except (CatalogoNoDisponibleError, sqlite3.Error) as e:
+        print(f"⚠️  Catálogo SQL no disponible, se recorre la colección: {e}")
+        return None
+
+def main():
+    """Muestra el catálogo de la colección"""
+    import time
+    
+    print("=" * 60)
+    print("🗂️  CATÁLOGO DE LA COLECCIÓN (SQL)")
+    print("=" * 60)
+    
+    inicio = time.perf_counter()
+    catalogo = abrir_catalogo()
+    if not catalogo:
+        return
+    
+    resumen = catalogo.resumen()
+    segundos = time.perf_counter() - inicio
+    print(f"🔖 Esquema: " + ", ".join(f"{k} v{v}" for k, v in sorted(catalogo.versiones.items())))
+    print(f"📄 Chunks: {resumen['total']} ({catalogo.dimension} dimensiones)")
+    if resumen["total"]:
+        print(f"📏 Longitud: mín {resumen['min_length']}, promedio {resumen['avg_length']:.1f}, "
+              f"máx {resumen['max_length']} caracteres")
+        print(f"📄 Páginas indexadas: {sorted(resumen['chunks_por_pagina'])}")
+        print(f"📁 Chunks por fuente:")
+        for source, chunks in sorted(resumen["chunks_por_fuente"].items()):
+            print(f"   - {os.path.basename(source)}: {chunks}")
+    print(f"⏱️  {segundos * 1000:.1f}ms")
+    catalogo.cerrar()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,459 @@
+"""
+Cliente Ollama con varios servidores
+Balancea embeddings y generaciones entre los servidores sanos, reintenta en otro
+servidor si uno falla y duplica las peticiones que superan su latencia p95
+(se usa la primera respuesta que llegue)
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+from config import get_ollama_config
+
+def _cubeta_tamano(tamano):
+    """Agrupa los tamaños de entrada en potencias de dos (1, 2, 4, 8...) para medir la latencia"""
+    return 1 << max(tamano - 1, 0).bit_length()
+
+def _error_de_peticion(error):
+    """
+    Un 4xx (modelo sin descargar, petición mal formada) fallaría igual en cualquier
+    servidor: se propaga sin enfriar el servidor ni reintentar en otro
+    """
+    return isinstance(error, urllib.error.HTTPError) and 400 <= error.code < 500
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100.0 * (len(ordenados) - 1))))]
+
+class EndpointOllama:
+    """Estado de un servidor Ollama dentro del pool"""
+    
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self.sano = True
+        self.fuera_hasta = 0.0
+        self.en_vuelo = 0
+        self.latencia_ewma_ms = None
+        self.peticiones = 0
+        self.errores = 0
+        self.ultimo_error = None
+    
+    def disponible(self):
+        return self.sano and time.monotonic() >= self.fuera_hasta
+
+class OllamaPool:
+    """Pool de servidores Ollama con chequeo de salud, failover y peticiones duplicadas"""
+    
+    def __init__(self, hosts=None, intervalo_salud_s=None, hedge=None):
+        """Inicializa los servidores y arranca el chequeo de salud en segundo plano"""
+        config = get_ollama_config()
+        self.endpoints = [EndpointOllama(url) for url in (hosts or config["hosts"])]
+        self.timeout_s = config["request_timeout_s"]
+        self.enfriamiento_s = config["failure_cooldown_s"]
+        self.hedge_habilitado = config["hedge_enabled"] if hedge is None else hedge
+        self.hedge_min_muestras = config["hedge_min_samples"]
+        self.hedge_min_espera_ms = config["hedge_min_delay_ms"]
+        self.hedge_max_lote = config["hedge_max_batch"]
+        self.intervalo_salud_s = config["health_interval_s"] if intervalo_salud_s is None else intervalo_salud_s
+        
+        self._lock = threading.Lock()
+        self._latencias = {}
+        self._ejecutor = ThreadPoolExecutor(max_workers=8 * len(self.endpoints), thread_name_prefix="ollama-pool")
+        self.contadores = {"peticiones": 0, "duplicadas": 0, "duplicadas_ganadoras": 0, "failovers": 0, "fallidas": 0}
+        
+        self._detenido = threading.Event()
+        if self.intervalo_salud_s and len(self.endpoints) > 1:
+            threading.Thread(target=self._bucle_salud, name="ollama-salud", daemon=True).start()
+    
+    # ------------------------------------------------------------------
+    # Salud y selección de servidor
+    # ------------------------------------------------------------------
+    
+    def chequear_salud(self, timeout_s=2.0):
+        """Consulta /api/version en cada servidor y actualiza su estado"""
+        for endpoint in self.endpoints:
+            try:
+                with urllib.request.urlopen(f"{endpoint.url}/api/version", timeout=timeout_s):
+                    pass
+                with self._lock:
+                    endpoint.sano = True
+                    endpoint.fuera_hasta = 0.0
+            except Exception as e:
+                with self._lock:
+                    endpoint.sano = False
+                    endpoint.ultimo_error = str(e)
+    
+    def _bucle_salud(self):
+        while not self._detenido.wait(self.intervalo_salud_s):
+            self.chequear_salud()
+    
+    def _elegir(self, excluir):
+        """Elige el servidor disponible con menos peticiones en vuelo (y menor latencia)"""
+        with self._lock:
+            candidatos = [e for e in self.endpoints if e not in excluir and e.disponible()]
+            if not candidatos:
+                # Si ninguno parece sano se intenta igualmente con los no probados
+                candidatos = [e for e in self.endpoints if e not in excluir]
+            if not candidatos:
+                return None
+            return min(candidatos, key=lambda e: (e.en_vuelo, e.latencia_ewma_ms or 0.0))
+    
+    def _umbral_duplicado_s(self, operacion, tamano=1):
+        """
+        Espera antes de duplicar: el p95 de la operación para ese tamaño de entrada
+        (None si no hay muestras suficientes o el lote es demasiado grande para duplicarlo)
+        """
+        if not self.hedge_habilitado or len(self.endpoints) < 2 or tamano > self.hedge_max_lote:
+            return None
+        with self._lock:
+            muestras = list(self._latencias.get(operacion, ()))
+        if len(muestras) < self.hedge_min_muestras:
+            return None
+        return max(_percentil(muestras, 95), self.hedge_min_espera_ms) / 1000.0
+    
+    # ------------------------------------------------------------------
+    # Peticiones
+    # ------------------------------------------------------------------
+    
+    def _post(self, endpoint, ruta, datos, operacion):
+        """Envía la petición a un servidor y actualiza sus métricas"""
+        with self._lock:
+            endpoint.en_vuelo += 1
+            endpoint.peticiones += 1
+        inicio = time.perf_counter()
+        try:
+            peticion = urllib.request.Request(
+                f"{endpoint.url}{ruta}",
+                data=json.dumps(datos).encode("utf-8"),
+                headers={"Content-Type": "application/json"}
+            )
+            with urllib.request.urlopen(peticion, timeout=self.timeout_s) as respuesta:
+                resultado = json.loads(respuesta.read())
+        except Exception as e:
+            if not _error_de_peticion(e):
+                with self._lock:
+                    endpoint.errores += 1
+                    endpoint.ultimo_error = str(e)
+                    endpoint.fuera_hasta = time.monotonic() + self.enfriamiento_s
+            raise
+        finally:
+            with self._lock:
+                endpoint.en_vuelo -= 1
+        
+        duracion_ms = (time.perf_counter() - inicio) * 1000
+        with self._lock:
+            if endpoint.latencia_ewma_ms is None:
+                endpoint.latencia_ewma_ms = duracion_ms
+            else:
+                endpoint.latencia_ewma_ms = 0.8 * endpoint.latencia_ewma_ms + 0.2 * duracion_ms
+            self._latencias.setdefault(operacion, deque(maxlen=200)).append(duracion_ms)
+        return resultado
+    
+    def solicitar(self, ruta, datos, operacion, tamano=1):
+        """
+        Envía la petición al mejor servidor; si supera el p95 se duplica en otro
+        servidor y se usa la primera respuesta. Si un servidor falla se reintenta
+        en el siguiente. Las peticiones perdedoras terminan en segundo plano.
+        Las latencias se miden por operación y tamaño de entrada (un lote de
+        embeddings no se compara con el p95 de las consultas sueltas)
+        """
+        with self._lock:
+            self.contadores["peticiones"] += 1
+        operacion = f"{operacion}:{_cubeta_tamano(tamano)}"
+        
+        intentados = []
+        pendientes = {}
+        duplicado = None
+        
+        def lanzar(endpoint):
+            intentados.append(endpoint)
+            pendientes[self._ejecutor.submit(self._post, endpoint, ruta, datos, operacion)] = endpoint
+        
+        primero = self._elegir(intentados)
+        if primero is None:
+            raise ConnectionError("No hay servidores Ollama configurados")
+        lanzar(primero)
+        
+        umbral_s = self._umbral_duplicado_s(operacion, tamano)
+        inicio = time.monotonic()
+        ultimo_error = None
+        
+        while pendientes:
+            espera = None
+            if duplicado is None and umbral_s is not None:
+                espera = max(0.0, umbral_s - (time.monotonic() - inicio))
+            hechos, _ = wait(list(pendientes), timeout=espera, return_when=FIRST_COMPLETED)
+            
+            if not hechos:
+                # Superó el p95: duplicar en otro servidor
+                duplicado = self._elegir(intentados) or False
+                if duplicado:
+                    with self._lock:
+                        self.contadores["duplicadas"] += 1
+                    lanzar(duplicado)
+                continue
+            
+            for futuro in hechos:
+                endpoint = pendientes.pop(futuro)
+                try:
+                    resultado = futuro.result()
+                except Exception as e:
+                    if _error_de_peticion(e):
+                        with self._lock:
+                            self.contadores["fallidas"] += 1
+                        raise
+                    ultimo_error = e
+                    continue
+                if duplicado and endpoint is duplicado:
+                    with self._lock:
+                        self.contadores["duplicadas_ganadoras"] += 1
+                return resultado
+            
+            # Todas las peticiones en vuelo fallaron: pasar al siguiente servidor
+            if not pendientes:
+                siguiente = self._elegir(intentados)
+                if siguiente:
+                    with self._lock:
+                        self.contadores["failovers"] += 1
+                    lanzar(siguiente)
+        
+        with self._lock:
+            self.contadores["fallidas"] += 1
+        raise ConnectionError(f"Ningún servidor Ollama respondió: {ultimo_error}")
+    
+    def embed(self, textos, modelo):
+        """Calcula los embeddings de una lista de textos"""
+        return self.solicitar("/api/embed", {"model": modelo, "input": textos}, "embed", len(textos))["embeddings"]
+    
+    def generar(self, prompt, modelo, opciones=None):
+        """Genera una respuesta completa (sin streaming)"""
+        datos = {"model": modelo, "prompt": prompt, "stream": False}
+        if opciones:
+            datos["options"] = opciones
+        return self.solicitar("/api/generate", datos, f"generate:{modelo}")["response"]
+    
+    def _conectar(self, ruta, cuerpo, metodo, content_type):
+        """
+        Abre la petición en el mejor servidor y pasa al siguiente si falla la conexión
+        o responde 5xx. Un 4xx es un error de la petición: se propaga sin penalizar al
+        servidor. Retorna (endpoint, respuesta) sin leer el cuerpo
+        """
+        intentados = []
+        ultimo_error = None
+        while True:
+            endpoint = self._elegir(intentados)
+            if endpoint is None:
+                if isinstance(ultimo_error, urllib.error.HTTPError):
+                    raise ultimo_error
+                raise ConnectionError(f"Ningún servidor Ollama respondió: {ultimo_error}")
+            intentados.append(endpoint)
+            
+            peticion = urllib.request.Request(
+                f"{endpoint.url}{ruta}",
+                data=cuerpo,
+                method=metodo,
+                headers={"Content-Type": content_type}
+            )
+            try:
+                return endpoint, urllib.request.urlopen(peticion, timeout=self.timeout_s)
+            except Exception as e:
+                if _error_de_peticion(e):
+                    raise
+                ultimo_error = e
+            with self._lock:
+                endpoint.errores += 1
+                endpoint.ultimo_error = str(ultimo_error)
+                endpoint.fuera_hasta = time.monotonic() + self.enfriamiento_s
+                self.contadores["failovers"] += 1
+    
+    @contextmanager
+    def abrir(self, ruta, cuerpo=None, metodo="POST", content_type="application/json"):
+        """
+        Abre una petición sin duplicar y con failover antes del primer byte; entrega
+        la respuesta HTTP tal cual (la usa el planificador para reenviar streams)
+        """
+        endpoint, respuesta = self._conectar(ruta, cuerpo, metodo, content_type)
+        with self._lock:
+            endpoint.en_vuelo += 1
+            endpoint.peticiones += 1
+        try:
+            with respuesta:
+                yield respuesta
+        finally:
+            with self._lock:
+                endpoint.en_vuelo -= 1
+    
+    def generar_stream(self, prompt, modelo, opciones=None):
+        """
+        Genera una respuesta en streaming. No se duplica (se pagaría la generación
+        dos veces), pero si un servidor falla antes del primer token se usa otro
+        """
+        datos = {"model": modelo, "prompt": prompt, "stream": True}
+        if opciones:
+            datos["options"] = opciones
+        
+        with self.abrir("/api/generate", json.dumps(datos).encode("utf-8")) as respuesta:
+            for linea in respuesta:
+                if not linea.strip():
+                    continue
+                fragmento = json.loads(linea)
+                if fragmento.get("response"):
+                    yield fragmento["response"]
+                if fragmento.get("done"):
+                    break
+    
+    def estadisticas(self):
+        """Retorna el estado de cada servidor y los contadores del pool"""
+        with self._lock:
+            return {
+                "endpoints": [
+                    {
+                        "url": e.url,
+                        "sano": e.sano,
+                        "disponible": e.disponible(),
+                        "en_vuelo": e.en_vuelo,
+                        "latencia_ewma_ms": e.latencia_ewma_ms,
+                        "peticiones": e.peticiones,
+                        "errores": e.errores,
+                        "ultimo_error": e.ultimo_error
+                    }
+                    for e in self.endpoints
+                ],
+                "p95_ms": {op: _percentil(list(v), 95) for op, v in self._latencias.items()},
+                **self.contadores
+            }
+    
+    def detener(self):
+        """Detiene el chequeo de salud y el ejecutor"""
+        self._detenido.set()
+        self._ejecutor.shutdown(wait=False)
+
+class OllamaPoolEmbeddings(Embeddings):
+    """Embeddings de LangChain respaldados por el pool de servidores"""
+    
+    def __init__(self, model, pool=None):
+        self.model = model
+        self.pool = pool or obtener_pool()
+    
+    def embed_documents(self, texts):
+        return self.pool.embed(list(texts), self.model)
+    
+    def embed_query(self, text):
+        return self.pool.embed([text], self.model)[0]
+
+class OllamaPoolLLM(LLM):
+    """LLM de LangChain respaldado por el pool de servidores"""
+    
+    model: str
+    temperature: Optional[float] = None
+    pool: Any = None
+    
+    @property
+    def _llm_type(self):
+        return "ollama-pool"
+    
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model": self.model, "temperature": self.temperature}
+    
+    def _opciones(self, stop):
+        opciones = {}
+        if self.temperature is not None:
+            opciones["temperature"] = self.temperature
+        if stop:
+            opciones["stop"] = stop
+        return opciones
+    
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> str:
+        return (self.pool or obtener_pool()).generar(prompt, self.model, self._opciones(stop))
+    
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        for texto in (self.pool or obtener_pool()).generar_stream(prompt, self.model, self._opciones(stop)):
+            fragmento = GenerationChunk(text=texto)
+            if run_manager:
+                run_manager.on_llm_new_token(texto, chunk=fragmento)
+            yield fragmento
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def obtener_pool():
+    """Retorna el pool compartido del proceso"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = OllamaPool()
+        return _pool
+
+def usa_pool():
+    """Indica si hay más de un servidor Ollama configurado"""
+    return len(get_ollama_config()["hosts"]) > 1
+
+def crear_embeddings(modelo, base_url=None):
+    """
+    Crea el modelo de embeddings: OllamaEmbeddings con un solo servidor
+    o respaldado por el pool si hay varios
+    """
+    if usa_pool():
+        return OllamaPoolEmbeddings(modelo)
+    
+    from langchain_ollama import OllamaEmbeddings
+    return OllamaEmbeddings(model=modelo, base_url=base_url or get_ollama_config()["hosts"][0])
+
+def crear_llm(modelo, base_url=None, **kwargs):
+    """
+    Crea el LLM: Ollama con un solo servidor o respaldado por el pool si hay varios
+    """
+    if usa_pool():
+        return OllamaPoolLLM(model=modelo, pool=obtener_pool(), **kwargs)
+    
+    from langchain_community.llms import Ollama
+    return Ollama(model=modelo, base_url=base_url or get_ollama_config()["hosts"][0], **kwargs)
+
+def main():
+    """Muestra el estado de los servidores configurados"""
+    from config import get_models_config
+    
+    print("=" * 60)
+    print("🖧 SERVIDORES OLLAMA")
+    print("=" * 60)
+    
+    pool = OllamaPool(intervalo_salud_s=0)
+    pool.chequear_salud()
+    modelo = get_models_config()["embedding_model"]
+    
+    for endpoint in pool.endpoints:
+        estado = "✅" if endpoint.sano else "❌"
+        print(f"{estado} {endpoint.url}")
+        if not endpoint.sano:
+            print(f"   - Error: {endpoint.ultimo_error}")
+            continue
+        try:
+            inicio = time.perf_counter()
+            pool._post(endpoint, "/api/embed", {"model": modelo, "input": ["prueba"]}, "embed:1")
+            print(f"   - Embedding de prueba: {(time.perf_counter() - inicio) * 1000:.1f}ms")
+        except Exception as e:
+            print(f"   - Error en embedding de prueba: {e}")
+    
+    pool.detener()
+
+if __name__ == "__main__":
+    main()
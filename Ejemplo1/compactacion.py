@@ -0,0 +1,260 @@
+"""
+Compactación de chroma_data después de borrados masivos
+Las entradas eliminadas siguen ocupando nodos del grafo HNSW y chroma.sqlite3 no
+devuelve espacio al sistema. La compactación copia solo las entradas vivas a un
+directorio sombra (sin volver a calcular embeddings), lo compacta con VACUUM, lo
+valida y lo intercambia por el actual; mientras tanto la base sigue en servicio.
+Informa del tamaño en disco y de la latencia de búsqueda antes y después
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import time
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark_recuperacion import medir_busqueda, vectores_de_coleccion
+from config import get_chroma_config, get_compaction_config
+from escaneo import iterar_lotes
+from exportador_metricas import tamano_por_segmento
+from inspector_hnsw import inspeccionar
+from respaldos import (ARCHIVO_CHROMA, SUFIJOS_SQLITE_AUXILIARES, contar_colecciones,
+                       intercambiar_directorio, recuperar_intercambio_pendiente, ultima_escritura,
+                       validar_coleccion)
+
+class EscriturasDuranteCompactacionError(Exception):
+    """La base cambió mientras se copiaba; la sombra ya no refleja el estado actual"""
+
+def _comprobar_sin_escrituras(ruta_sqlite, ultima_operacion):
+    """Lanza EscriturasDuranteCompactacionError si la base registró escrituras desde ultima_operacion"""
+    if ultima_escritura(ruta_sqlite) != ultima_operacion:
+        raise EscriturasDuranteCompactacionError(
+            "Hubo escrituras en la base durante la compactación; vuelve a ejecutarla"
+        )
+
+def _liberar_clientes():
+    """Cierra los clientes de Chroma del proceso para liberar los archivos"""
+    from chromadb.api.client import SharedSystemClient
+    
+    SharedSystemClient.clear_system_cache()
+
+def _cliente(directorio):
+    import chromadb
+    
+    return chromadb.PersistentClient(path=directorio)
+
+def medir_estado(directorio, nombre_coleccion, vectores, k):
+    """Bytes en disco, entradas borradas y huérfanas del índice y latencia de búsqueda"""
+    segmentos = inspeccionar(directorio, nombre_coleccion)
+    validos = [s for s in segmentos if "error" not in s and not s["huerfano"]]
+    estado = {
+        "bytes": sum(tamano_por_segmento(directorio).values()),
+        "sqlite_bytes": os.path.getsize(os.path.join(directorio, ARCHIVO_CHROMA)),
+        "borrados_hnsw": sum(s["borrados"] for s in validos),
+        "segmentos_huerfanos": sum(1 for s in segmentos if s.get("huerfano")),
+        "latencia": None
+    }
+    if vectores:
+        coleccion = _cliente(directorio).get_collection(nombre_coleccion)
+        estado["latencia"] = medir_busqueda(
+            coleccion, vectores, k, tamano_lote=1, concurrencia=1,
+            repeticiones=len(vectores), calentamiento=min(3, len(vectores))
+        )
+    _liberar_clientes()
+    return estado
+
+def parametros_coleccion(coleccion):
+    """Metadatos y configuración HNSW para crear otra colección igual (serializables a JSON)"""
+    metadata = coleccion.metadata or None
+    parametros = {"metadata": metadata}
+    hnsw = (coleccion.configuration or {}).get("hnsw")
+    # Las colecciones antiguas guardan los parámetros como hnsw:* en los metadatos
+    if hnsw and not any(clave.startswith("hnsw:") for clave in (metadata or {})):
+        parametros["configuration"] = {"hnsw": hnsw}
+    return parametros
+
+def _copiar_coleccion(origen, cliente_destino, tamano_lote):
+    """Crea la colección en la sombra con la misma configuración y copia sus entradas vivas"""
+    destino = cliente_destino.create_collection(origen.name, embedding_function=None,
+                                                **parametros_coleccion(origen))
+    
+    copiados = 0
+    for lote in iterar_lotes(origen, include=("embeddings", "documents", "metadatas"), tamano_lote=tamano_lote):
+        destino.add(
+            ids=lote["ids"],
+            embeddings=lote["embeddings"],
+            documents=lote["documents"],
+            metadatas=lote["metadatas"]
+        )
+        copiados += len(lote["ids"])
+    return copiados
+
+def _copiar_auxiliares(persist_directory, sombra):
+    """
+    Copia los archivos sueltos que no son de Chroma (por ejemplo las estadísticas de la
+    colección): los IDs no cambian, así que siguen siendo válidos en la sombra
+    """
+    for entrada in os.scandir(persist_directory):
+        if (not entrada.is_file() or entrada.name == ARCHIVO_CHROMA
+                or entrada.name.endswith(SUFIJOS_SQLITE_AUXILIARES)):
+            continue
+        destino = os.path.join(sombra, entrada.name)
+        if entrada.name.endswith(".sqlite3"):
+            origen = sqlite3.connect(f"file:{entrada.path}?mode=ro", uri=True)
+            copia = sqlite3.connect(destino)
+            try:
+                origen.backup(copia)
+            finally:
+                copia.close()
+                origen.close()
+        else:
+            shutil.copy2(entrada.path, destino)
+
+def _vacuum(ruta_sqlite):
+    conexion = sqlite3.connect(ruta_sqlite)
+    try:
+        conexion.execute("VACUUM")
+    finally:
+        conexion.close()
+
+def compactar(persist_directory=None, collection_name=None, config=None):
+    """
+    1. mide tamaño, borrados y latencia del directorio actual
+    2. copia las entradas vivas de cada colección a <dir>.compactando (la base sigue abierta)
+    3. VACUUM de chroma.sqlite3 en la sombra, validación de conteos y búsqueda de muestra
+    4. mide la sombra y, si nadie escribió en la base desde el paso 2, la intercambia
+    La comprobación de escrituras se repite justo antes y justo después del intercambio;
+    si la base cambió entre medias, se deshace el intercambio. Si algo falla antes del
+    intercambio, el directorio actual no se toca
+    """
+    config = config or get_compaction_config()
+    chroma_config = get_chroma_config()
+    persist_directory = os.path.abspath(persist_directory or chroma_config["persist_directory"])
+    collection_name = collection_name or chroma_config["collection_name"]
+    ruta_sqlite = os.path.join(persist_directory, ARCHIVO_CHROMA)
+    sombra = f"{persist_directory}.compactando"
+    tiempos = {}
+    recuperar_intercambio_pendiente(persist_directory)
+    if os.path.exists(sombra):
+        shutil.rmtree(sombra)
+    
+    # Las mismas consultas antes y después, tomadas de los vectores guardados
+    vectores = vectores_de_coleccion(_cliente(persist_directory).get_collection(collection_name),
+                                     config["benchmark_queries"])
+    antes = medir_estado(persist_directory, collection_name, vectores, config["benchmark_k"])
+    
+    try:
+        inicio = time.perf_counter()
+        ultima_operacion = ultima_escritura(ruta_sqlite)
+        esperadas = contar_colecciones(ruta_sqlite)
+        origen = _cliente(persist_directory)
+        destino = _cliente(sombra)
+        tamano_lote = min(config["batch_size"], destino.get_max_batch_size())
+        copiados = {
+            coleccion.name: _copiar_coleccion(coleccion, destino, tamano_lote)
+            for coleccion in origen.list_collections()
+        }
+        _copiar_auxiliares(persist_directory, sombra)
+        _liberar_clientes()
+        tiempos["copia_s"] = time.perf_counter() - inicio
+        
+        inicio = time.perf_counter()
+        _vacuum(os.path.join(sombra, ARCHIVO_CHROMA))
+        tiempos["vacuum_s"] = time.perf_counter() - inicio
+        
+        inicio = time.perf_counter()
+        problemas = validar_coleccion(sombra, esperadas)
+        problemas += [
+            f"{nombre}: se copiaron {total} de {esperadas.get(nombre)} chunks"
+            for nombre, total in copiados.items() if total != esperadas.get(nombre)
+        ]
+        tiempos["validacion_s"] = time.perf_counter() - inicio
+        if problemas:
+            raise ValueError("Validación fallida: " + "; ".join(problemas))
+        
+        despues = medir_estado(sombra, collection_name, vectores, config["benchmark_k"])
+        
+        inicio = time.perf_counter()
+        _comprobar_sin_escrituras(ruta_sqlite, ultima_operacion)
+        anterior = intercambiar_directorio(sombra, persist_directory)
+    except Exception:
+        _liberar_clientes()
+        shutil.rmtree(sombra, ignore_errors=True)
+        raise
+    
+    # Una escritura entre la comprobación y el intercambio habría ido al directorio anterior
+    try:
+        _comprobar_sin_escrituras(os.path.join(anterior, ARCHIVO_CHROMA), ultima_operacion)
+    except EscriturasDuranteCompactacionError:
+        intercambiar_directorio(anterior, persist_directory, anterior=sombra)
+        shutil.rmtree(sombra, ignore_errors=True)
+        raise
+    tiempos["intercambio_s"] = time.perf_counter() - inicio
+    
+    return {
+        "directorio": persist_directory,
+        "anterior": anterior,
+        "colecciones": copiados,
+        "antes": antes,
+        "despues": despues,
+        "tiempos": {clave: round(valor, 3) for clave, valor in tiempos.items()}
+    }
+
+def _mb(bytes_):
+    return bytes_ / (1024 * 1024)
+
+def imprimir_resultado(resultado):
+    """Muestra la comparación antes/después de compactar()"""
+    antes, despues = resultado["antes"], resultado["despues"]
+    tiempos = resultado["tiempos"]
+    colecciones = ", ".join(f"{nombre}: {total}" for nombre, total in resultado["colecciones"].items())
+    print(f"✅ Compactado {resultado['directorio']} ({colecciones or 'sin colecciones'})")
+    print(f"   - Copia de entradas vivas: {tiempos['copia_s']:.2f}s | VACUUM: {tiempos['vacuum_s']:.2f}s | "
+          f"validación: {tiempos['validacion_s']:.2f}s | intercambio: {tiempos['intercambio_s'] * 1000:.1f}ms")
+    
+    ahorro = antes["bytes"] - despues["bytes"]
+    print(f"\n💾 Disco: {_mb(antes['bytes']):.2f} MB → {_mb(despues['bytes']):.2f} MB "
+          f"({_mb(ahorro):+.2f} MB liberados)")
+    print(f"   - chroma.sqlite3: {_mb(antes['sqlite_bytes']):.2f} MB → {_mb(despues['sqlite_bytes']):.2f} MB")
+    print(f"   - Entradas borradas en el índice: {antes['borrados_hnsw']} → {despues['borrados_hnsw']}")
+    print(f"   - Segmentos huérfanos: {antes['segmentos_huerfanos']} → {despues['segmentos_huerfanos']}")
+    
+    if antes["latencia"] and despues["latencia"]:
+        print(f"\n⚡ Latencia de búsqueda ({antes['latencia']['operaciones']} consultas, k={antes['latencia']['k']}):")
+        for clave in ("p50_ms", "p95_ms"):
+            print(f"   - {clave[:-3]}: {antes['latencia'][clave]:.2f}ms → {despues['latencia'][clave]:.2f}ms")
+    
+    if resultado["anterior"]:
+        print(f"\n💡 El directorio anterior quedó en {resultado['anterior']} (bórralo cuando confirmes)")
+    print(f"💡 Reinicia los procesos que tenían la base abierta para que usen la copia compactada")
+
+def main():
+    """Compacta el directorio de persistencia"""
+    parser = argparse.ArgumentParser(description="Reconstruye el índice con las entradas vivas y compacta chroma_data")
+    parser.add_argument("--consultas", type=int, help="Consultas para medir la latencia")
+    args = parser.parse_args()
+    
+    print("=" * 60)
+    print("🗜️  COMPACTACIÓN DE LA BASE DE DATOS")
+    print("=" * 60)
+    
+    config = get_compaction_config()
+    if args.consultas:
+        config["benchmark_queries"] = args.consultas
+    persist_directory = get_chroma_config()["persist_directory"]
+    if not os.path.isdir(persist_directory):
+        print(f"⚠️  El directorio {persist_directory} no existe")
+        return
+    
+    try:
+        imprimir_resultado(compactar(persist_directory, config=config))
+    except Exception as e:
+        print(f"❌ Compactación cancelada, no se modificó {persist_directory}: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,28 @@ OLLAMA_HOST = "172.16.1.37"
 OLLAMA_PORT = 11434
 OLLAMA_BASE_URL = f"http://{OLLAMA_HOST}:{OLLAMA_PORT}"
 
+# Servidores Ollama disponibles. Con más de uno, embeddings y LLM pasan por
+# cliente_ollama.py (balanceo con chequeo de salud, failover y peticiones duplicadas)
+OLLAMA_HOSTS = [OLLAMA_BASE_URL]
+OLLAMA_HEALTH_INTERVAL_S = 10  # Frecuencia del chequeo de salud (0 = desactivado)
+OLLAMA_FAILURE_COOLDOWN_S = 30  # Tiempo que un servidor con error queda fuera del balanceo
+OLLAMA_REQUEST_TIMEOUT_S = 300  # Tiempo máximo de una petición
+OLLAMA_HEDGE_ENABLED = True  # Duplicar en otro servidor las peticiones que superan su p95
+OLLAMA_HEDGE_MIN_SAMPLES = 20  # Muestras de latencia necesarias antes de duplicar
+OLLAMA_HEDGE_MIN_DELAY_MS = 50  # Espera mínima antes de duplicar una petición
+OLLAMA_HEDGE_MAX_BATCH = 8  # Lotes de embeddings con más textos no se duplican
+
+# Planificador de peticiones al LLM (proxy entre los scripts y Ollama)
+# Arrancar con: python planificador_llm.py
+LLM_SCHEDULER_ENABLED = False  # Si es True, las generaciones pasan por el proxy
+LLM_SCHEDULER_HOST = "127.0.0.1"
+LLM_SCHEDULER_PORT = 11435
+LLM_SCHEDULER_URL = f"http://{LLM_SCHEDULER_HOST}:{LLM_SCHEDULER_PORT}"
+LLM_SCHEDULER_WORKERS = 2  # Generaciones simultáneas enviadas a Ollama
+LLM_SCHEDULER_MAX_QUEUE = 50  # Peticiones en espera antes de rechazar nuevas
+LLM_SCHEDULER_INTERACTIVE_TIMEOUT_S = 30  # Espera máxima en cola (interactivas)
+LLM_SCHEDULER_BATCH_TIMEOUT_S = 600  # Espera máxima en cola (batch)
+
 # ============================================================================
 # CONFIGURACIÓN DE MODELOS
 # ============================================================================
@@ -26,6 +48,24 @@ EMBEDDING_MODEL = "nomic-embed-text:latest"
 # - "llama3.1:8b"
 LLM_MODEL = "gpt-oss:20b"
 
+# Enrutador de modelos: elige el LLM por consulta según complejidad, tamaño del
+# contexto y latencia objetivo (si está desactivado se usa siempre LLM_MODEL)
+MODEL_ROUTER_ENABLED = False
+MODEL_ROUTER_LATENCY_TARGET_MS = 15000  # Latencia máxima deseada por respuesta
+# Modelos de menor a mayor capacidad con su latencia estimada:
+# base_ms (tiempo fijo + generación) y ms_per_1k_tokens (prefill por cada 1000 tokens de prompt)
+MODEL_ROUTER_MODELS = [
+    {"name": "llama3.1:8b", "base_ms": 2500, "ms_per_1k_tokens": 400},
+    {"name": "gemma3:12b", "base_ms": 4000, "ms_per_1k_tokens": 700},
+    {"name": "gpt-oss:20b", "base_ms": 6000, "ms_per_1k_tokens": 1000},
+    {"name": "gpt-oss:120b", "base_ms": 14000, "ms_per_1k_tokens": 3000}
+]
+MODEL_ROUTER_QUEUE_FALLBACK_DEPTH = 4  # Cola del planificador a partir de la cual se baja de modelo
+MODEL_ROUTER_LOG_PATH = "decisiones_modelo.jsonl"  # Registro de decisiones y latencias reales
+MODEL_ROUTER_LOG_MAX_ENTRIES = 2000  # Decisiones que se conservan en el registro (las más recientes)
+MODEL_ROUTER_CORRECTION_LIMIT = 2.0  # Cada muestra aporta como máximo x2 (o /2) sobre la estimación
+MODEL_ROUTER_EXPLORATION_RATE = 0.05  # Fracción de consultas degradadas por latencia que usan el modelo deseado
+
 # ============================================================================
 # CONFIGURACIÓN DE LA BASE DE DATOS
 # ============================================================================
@@ -33,6 +73,32 @@ CHROMA_HOST = "localhost"
 CHROMA_PORT = 8000
 COLLECTION_NAME = "documentos_pdf"
 PERSIST_DIRECTORY = "chroma_data"
+SCAN_BATCH_SIZE = 500  # Registros por lote al recorrer la colección (escaneo.py)
+DELETE_BATCH_SIZE = 500  # IDs por llamada a delete() al eliminar por filtro (limpiar_bd.py)
+
+# Respaldos incrementales (python respaldos.py): bloques direccionados por contenido + manifiestos
+BACKUP_DIRECTORY = "respaldos"  # Repositorio de bloques y manifiestos
+BACKUP_BLOCK_SIZE = 4 * 1024 * 1024  # Bytes por bloque; solo se guardan los bloques que cambian
+BACKUP_COMPRESSION_LEVEL = 6  # Nivel de zlib (1 = más rápido, 9 = más compacto)
+BACKUP_WORKERS = 4  # Hilos de hash y compresión
+BACKUP_KEEP = 10  # Respaldos que conserva "python respaldos.py purgar"
+BACKUP_CONSISTENCY_ATTEMPTS = 3  # Copias que se intentan si hay escrituras durante el respaldo
+
+# Compactación (python compactacion.py): reconstruye el índice solo con las entradas vivas
+# en una copia sombra, la compacta con VACUUM y la intercambia por el directorio actual
+COMPACTION_BATCH_SIZE = 1000  # Registros por lote al copiar a la sombra
+COMPACTION_BENCHMARK_QUERIES = 50  # Consultas para medir la latencia antes y después
+COMPACTION_BENCHMARK_K = 5  # Resultados por consulta en la medición
+
+# Exportación/importación columnar (python exportacion.py): IDs, textos, metadatos y vectores
+COLLECTION_EXPORT_BATCH_SIZE = 1000  # Registros por grupo de filas del archivo
+COLLECTION_EXPORT_FLOAT16 = False  # Vectores en float16 (mitad de tamaño, ~3 decimales de precisión)
+COLLECTION_EXPORT_COMPRESSION_LEVEL = 6  # Nivel de zlib de cada columna
+
+# Estadísticas de la colección actualizadas al vectorizar y al eliminar
+# (reconstruir con: python estadisticas_coleccion.py rebuild)
+COLLECTION_STATS_ENABLED = True
+COLLECTION_STATS_PATH = f"{PERSIST_DIRECTORY}/estadisticas_{COLLECTION_NAME}.sqlite3"
 
 # ============================================================================
 # CONFIGURACIÓN DE PROCESAMIENTO DE DOCUMENTOS
@@ -51,6 +117,54 @@ TEXT_SEPARATORS = ["\n\n", "\n", " ", ""]
 # ============================================================================
 SEARCH_K = 5  # Número de documentos a recuperar en búsquedas
 
+# Modo de recuperación: "fixed" (siempre SEARCH_K) o "adaptive" (k según los scores).
+# Antes de activar "adaptive", comprobar la cobertura con "python recuperacion.py"
+SEARCH_MODE = "fixed"
+SEARCH_CANDIDATE_POOL = 12  # Candidatos que se recuperan antes de recortar
+SEARCH_K_MIN = 2  # Mínimo de chunks en modo adaptativo
+SEARCH_K_MAX = 8  # Máximo de chunks en modo adaptativo
+SEARCH_GAP_MIN = 0.05  # Salto mínimo de similitud para cortar el pool
+SEARCH_CUMULATIVE_SHARE = 0.8  # Fracción de la masa de scores a conservar si no hay salto
+
+# Expansión de consultas (multi-query): varias reformulaciones buscadas en paralelo
+MULTI_QUERY_ENABLED = False
+MULTI_QUERY_COUNT = 3  # Reformulaciones adicionales a la consulta original
+MULTI_QUERY_GENERATOR = "rules"  # "rules" (sin modelo) o "llm" (modelo pequeño)
+MULTI_QUERY_MODEL = "llama3.1:8b"  # Modelo usado si MULTI_QUERY_GENERATOR = "llm"
+MULTI_QUERY_BUDGET_MS = 1500  # Tiempo máximo que puede añadir la expansión
+MULTI_QUERY_LLM_BUDGET_SHARE = 0.6  # Parte del presupuesto para generar reformulaciones
+MULTI_QUERY_WORKERS = 4  # Búsquedas concurrentes
+MULTI_QUERY_EXPANSION_WORKERS = 2  # Llamadas a Ollama de la expansión (pool aparte de las búsquedas)
+
+# Compuerta de relevancia: si ningún chunk supera el umbral no se llama al LLM
+# (calibrar con: python relevancia.py)
+RELEVANCE_GATE_ENABLED = True
+RELEVANCE_GATE_MIN_SCORE = 0.45  # Similitud coseno mínima del mejor chunk
+
+# ============================================================================
+# CONFIGURACIÓN DEL CONTEXTO DEL PROMPT
+# ============================================================================
+CONTEXT_MAX_TOKENS = 1000  # Presupuesto de tokens para los chunks del contexto
+CONTEXT_MIN_SCORE = 0.35  # Similitud mínima (coseno) para incluir un chunk
+CONTEXT_CHARS_PER_TOKEN = 4  # Aproximación de caracteres por token
+CONTEXT_MERGE_MIN_OVERLAP = 30  # Caracteres mínimos para fusionar chunks solapados
+CONTEXT_MIN_PARTIAL_TOKENS = 100  # Tokens mínimos para incluir un chunk recortado
+
+# ============================================================================
+# CONFIGURACIÓN DE CACHÉ DE RESPUESTAS
+# ============================================================================
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_PATH = "cache_respuestas.sqlite3"  # Archivo SQLite persistente
+ANSWER_CACHE_TTL_SECONDS = 7 * 24 * 3600  # Vida máxima de una respuesta (0 = sin límite)
+ANSWER_CACHE_MAX_ENTRIES = 1000  # Entradas máximas antes de expulsar las menos usadas
+ANSWER_CACHE_COUNTERS_FLUSH_S = 10  # Cada cuánto se escriben en disco los contadores de aciertos
+
+# Caché semántica: reutiliza respuestas de preguntas parafraseadas
+SEMANTIC_CACHE_ENABLED = True
+SEMANTIC_CACHE_THRESHOLD = 0.92  # Similitud coseno mínima entre preguntas
+SEMANTIC_CACHE_MAX_ENTRIES = 1000  # Preguntas máximas en memoria y en disco
+SEMANTIC_CACHE_AUDIT_RATE = 0.1  # Fracción de aciertos que se auditan
+
 # ============================================================================
 # CONFIGURACIÓN DE PROMPTS
 # ============================================================================
@@ -71,6 +185,81 @@ Respuesta:"""
 DEBUG_MODE = True
 LOG_LEVEL = "INFO"
 
+# Trazas por etapa (carga, división, embeddings, búsqueda, prompt, LLM)
+TRACING_ENABLED = True
+TRACING_EXPORT_PATH = "trazas.json"  # Archivo JSON con spans e histogramas
+TRACING_MAX_SPANS = 5000  # Spans recientes que se conservan en memoria
+
+# Métricas del monitor en formato Prometheus (python database_monitor.py --metrics)
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+METRICS_REFRESH_S = 15  # Intervalo entre sondeos en segundo plano
+METRICS_PROBE_EMBEDDINGS = True  # Medir en cada sondeo un embedding y una búsqueda de 1 resultado
+
+# Chequeo de salud (python salud.py, comando health del monitor y /health del exportador)
+HEALTH_TIMEOUT_S = 2.0  # Plazo máximo de cada sondeo; el chequeo completo no espera más que esto
+HEALTH_CACHE_TTL_S = 5  # Segundos durante los que se reutiliza el último resultado
+
+# Monitor en segundo plano (python database_monitor.py --daemon)
+MONITOR_SAMPLE_INTERVAL_S = 10  # Intervalo entre muestras
+MONITOR_HISTORY_SIZE = 8640  # Muestras en memoria (24 h a 10 s); la memoria no crece con el tiempo
+MONITOR_SNAPSHOT_PATH = "historial_monitor.npz"  # Copia comprimida del historial en disco
+MONITOR_SNAPSHOT_EVERY_S = 300  # Frecuencia de la copia en disco
+MONITOR_ANOMALY_WINDOW_S = 300  # Ventana reciente que se compara con la de referencia
+MONITOR_BASELINE_WINDOW_S = 3600  # Ventana de referencia (anterior a la reciente)
+MONITOR_P95_REGRESSION_FACTOR = 1.5  # p95 de búsqueda reciente / referencia que se considera regresión
+MONITOR_P95_MIN_DELTA_MS = 5.0  # Diferencia mínima en ms para no alertar por ruido
+
+# ============================================================================
+# CONFIGURACIÓN DEL BENCHMARK DE RECUPERACIÓN
+# ============================================================================
+# Ejecutar con: python benchmark_recuperacion.py
+BENCHMARK_QUERIES = [
+    "YOLO",
+    "detection",
+    "model",
+    "architecture",
+    "¿Qué arquitectura usa el detector?",
+    "resultados de precisión en el conjunto de prueba",
+    "limitaciones del método propuesto",
+    "comparación con otros modelos"
+]
+BENCHMARK_WARMUP = 3  # Operaciones descartadas antes de medir
+BENCHMARK_REPETITIONS = 30  # Operaciones medidas por combinación
+BENCHMARK_K_VALUES = [1, 5, 10, 20]  # Resultados por consulta
+BENCHMARK_BATCH_SIZES = [1, 8]  # Consultas por llamada
+BENCHMARK_CONCURRENCY = [1, 4]  # Clientes simultáneos
+BENCHMARK_RESULTS_PATH = "benchmark_recuperacion.json"
+BENCHMARK_BASELINE_PATH = "benchmark_baseline.json"
+BENCHMARK_REGRESSION_TOLERANCE = 0.2  # Empeoramiento relativo (p95 o throughput) tolerado
+
+# Ajuste de HNSW: recall@k frente a la búsqueda exacta en copias reconstruidas
+# Ejecutar con: python ajuste_hnsw.py
+HNSW_TUNING_M_VALUES = [8, 16, 32]  # Vecinos por nodo (max_neighbors / hnsw:M)
+HNSW_TUNING_CONSTRUCTION_EF = [100, 200]  # ef de construcción
+HNSW_TUNING_SEARCH_EF = [10, 25, 50, 100, 200]  # ef de búsqueda
+HNSW_TUNING_K = 10  # Se mide recall@k
+HNSW_TUNING_QUERIES = 100  # Consultas (vectores de la colección, sin contarse a sí mismos)
+HNSW_TUNING_TARGET_RECALL = 0.95  # Recall mínimo para recomendar una configuración
+HNSW_TUNING_RESULTS_PATH = "ajuste_hnsw.json"
+
+# Inspección de los archivos de los segmentos HNSW (python inspector_hnsw.py)
+HNSW_REBUILD_DELETED_RATIO = 0.1  # Fracción de elementos borrados a partir de la cual conviene reconstruir
+HNSW_MIN_DEGREE_RATIO = 0.5  # Grado medio en nivel 0 / máximo (2*M) por debajo del cual el grafo está mal conectado
+
+# Analítica del espacio de embeddings (python analitica_embeddings.py)
+ANALYTICS_BATCH_SIZE = 500  # Vectores por bloque en cada pasada; acota la memoria
+ANALYTICS_DUPLICATE_THRESHOLD = 0.98  # Similitud coseno a partir de la cual dos chunks son casi duplicados
+ANALYTICS_LSH_BANDS = 16  # Bandas de la firma por hiperplanos aleatorios (más bandas = más candidatos)
+ANALYTICS_LSH_BITS_PER_BAND = 12  # Bits por banda (más bits = buckets más selectivos)
+ANALYTICS_LSH_MAX_BUCKET = 200  # Buckets más grandes se ignoran (evita comparaciones cuadráticas)
+ANALYTICS_OUTLIER_Z = 3.0  # Desviaciones estándar (norma o distancia al centroide) para marcar un atípico
+ANALYTICS_MIN_CHUNK_CHARS = 20  # Chunks más cortos se reportan como degenerados
+ANALYTICS_CLUSTERS_PER_SOURCE = 8  # k de k-means por documento fuente
+ANALYTICS_KMEANS_EPOCHS = 3  # Pasadas de k-means mini-batch por fuente
+ANALYTICS_SEED = 0
+ANALYTICS_RESULTS_PATH = "analitica_embeddings.json"
+
 # ============================================================================
 # FUNCIONES DE CONFIGURACIÓN
 # ============================================================================
@@ -80,7 +269,28 @@ def get_ollama_config():
     return {
         "host": OLLAMA_HOST,
         "port": OLLAMA_PORT,
-        "base_url": OLLAMA_BASE_URL
+        "base_url": OLLAMA_BASE_URL,
+        "hosts": OLLAMA_HOSTS,
+        "health_interval_s": OLLAMA_HEALTH_INTERVAL_S,
+        "failure_cooldown_s": OLLAMA_FAILURE_COOLDOWN_S,
+        "request_timeout_s": OLLAMA_REQUEST_TIMEOUT_S,
+        "hedge_enabled": OLLAMA_HEDGE_ENABLED,
+        "hedge_min_samples": OLLAMA_HEDGE_MIN_SAMPLES,
+        "hedge_min_delay_ms": OLLAMA_HEDGE_MIN_DELAY_MS,
+        "hedge_max_batch": OLLAMA_HEDGE_MAX_BATCH
+    }
+
+def get_scheduler_config():
+    """Retorna la configuración del planificador de peticiones al LLM"""
+    return {
+        "enabled": LLM_SCHEDULER_ENABLED,
+        "host": LLM_SCHEDULER_HOST,
+        "port": LLM_SCHEDULER_PORT,
+        "url": LLM_SCHEDULER_URL,
+        "workers": LLM_SCHEDULER_WORKERS,
+        "max_queue": LLM_SCHEDULER_MAX_QUEUE,
+        "interactive_timeout_s": LLM_SCHEDULER_INTERACTIVE_TIMEOUT_S,
+        "batch_timeout_s": LLM_SCHEDULER_BATCH_TIMEOUT_S
     }
 
 def get_chroma_config():
@@ -92,6 +302,52 @@ def get_chroma_config():
         "persist_directory": PERSIST_DIRECTORY
     }
 
+def get_scan_config():
+    """Retorna la configuración del recorrido paginado de la colección"""
+    return {
+        "batch_size": SCAN_BATCH_SIZE
+    }
+
+def get_cleanup_config():
+    """Retorna la configuración de las eliminaciones por lotes"""
+    return {
+        "delete_batch_size": DELETE_BATCH_SIZE
+    }
+
+def get_backup_config():
+    """Retorna la configuración de los respaldos incrementales"""
+    return {
+        "directory": BACKUP_DIRECTORY,
+        "block_size": BACKUP_BLOCK_SIZE,
+        "compression_level": BACKUP_COMPRESSION_LEVEL,
+        "workers": BACKUP_WORKERS,
+        "keep": BACKUP_KEEP,
+        "consistency_attempts": BACKUP_CONSISTENCY_ATTEMPTS
+    }
+
+def get_compaction_config():
+    """Retorna la configuración de la compactación"""
+    return {
+        "batch_size": COMPACTION_BATCH_SIZE,
+        "benchmark_queries": COMPACTION_BENCHMARK_QUERIES,
+        "benchmark_k": COMPACTION_BENCHMARK_K
+    }
+
+def get_collection_export_config():
+    """Retorna la configuración de la exportación/importación columnar"""
+    return {
+        "batch_size": COLLECTION_EXPORT_BATCH_SIZE,
+        "float16": COLLECTION_EXPORT_FLOAT16,
+        "compression_level": COLLECTION_EXPORT_COMPRESSION_LEVEL
+    }
+
+def get_collection_stats_config():
+    """Retorna la configuración de las estadísticas incrementales de la colección"""
+    return {
+        "enabled": COLLECTION_STATS_ENABLED,
+        "path": COLLECTION_STATS_PATH
+    }
+
 def get_models_config():
     """Retorna la configuración de modelos"""
     return {
@@ -99,6 +355,161 @@ def get_models_config():
         "llm_model": LLM_MODEL
     }
 
+def get_router_config():
+    """Retorna la configuración del enrutador de modelos"""
+    return {
+        "enabled": MODEL_ROUTER_ENABLED,
+        "latency_target_ms": MODEL_ROUTER_LATENCY_TARGET_MS,
+        "models": MODEL_ROUTER_MODELS,
+        "queue_fallback_depth": MODEL_ROUTER_QUEUE_FALLBACK_DEPTH,
+        "log_path": MODEL_ROUTER_LOG_PATH,
+        "log_max_entries": MODEL_ROUTER_LOG_MAX_ENTRIES,
+        "correction_limit": MODEL_ROUTER_CORRECTION_LIMIT,
+        "exploration_rate": MODEL_ROUTER_EXPLORATION_RATE
+    }
+
+def get_search_config():
+    """Retorna la configuración de búsqueda"""
+    return {
+        "k": SEARCH_K,
+        "mode": SEARCH_MODE,
+        "candidate_pool": SEARCH_CANDIDATE_POOL,
+        "k_min": SEARCH_K_MIN,
+        "k_max": SEARCH_K_MAX,
+        "gap_min": SEARCH_GAP_MIN,
+        "cumulative_share": SEARCH_CUMULATIVE_SHARE
+    }
+
+def get_multi_query_config():
+    """Retorna la configuración de la expansión de consultas"""
+    return {
+        "enabled": MULTI_QUERY_ENABLED,
+        "count": MULTI_QUERY_COUNT,
+        "generator": MULTI_QUERY_GENERATOR,
+        "model": MULTI_QUERY_MODEL,
+        "budget_ms": MULTI_QUERY_BUDGET_MS,
+        "llm_budget_share": MULTI_QUERY_LLM_BUDGET_SHARE,
+        "workers": MULTI_QUERY_WORKERS,
+        "expansion_workers": MULTI_QUERY_EXPANSION_WORKERS
+    }
+
+def get_relevance_config():
+    """Retorna la configuración de la compuerta de relevancia"""
+    return {
+        "enabled": RELEVANCE_GATE_ENABLED,
+        "min_score": RELEVANCE_GATE_MIN_SCORE
+    }
+
+def get_context_config():
+    """Retorna la configuración del empaquetado de contexto"""
+    return {
+        "max_tokens": CONTEXT_MAX_TOKENS,
+        "min_score": CONTEXT_MIN_SCORE,
+        "chars_per_token": CONTEXT_CHARS_PER_TOKEN,
+        "merge_min_overlap": CONTEXT_MERGE_MIN_OVERLAP,
+        "min_partial_tokens": CONTEXT_MIN_PARTIAL_TOKENS
+    }
+
+def get_cache_config():
+    """Retorna la configuración de la caché de respuestas"""
+    return {
+        "enabled": ANSWER_CACHE_ENABLED,
+        "path": ANSWER_CACHE_PATH,
+        "ttl_seconds": ANSWER_CACHE_TTL_SECONDS,
+        "max_entries": ANSWER_CACHE_MAX_ENTRIES,
+        "counters_flush_s": ANSWER_CACHE_COUNTERS_FLUSH_S,
+        "semantic_enabled": SEMANTIC_CACHE_ENABLED,
+        "semantic_threshold": SEMANTIC_CACHE_THRESHOLD,
+        "semantic_max_entries": SEMANTIC_CACHE_MAX_ENTRIES,
+        "semantic_audit_rate": SEMANTIC_CACHE_AUDIT_RATE
+    }
+
+def get_tracing_config():
+    """Retorna la configuración de las trazas por etapa"""
+    return {
+        "enabled": TRACING_ENABLED,
+        "export_path": TRACING_EXPORT_PATH,
+        "max_spans": TRACING_MAX_SPANS
+    }
+
+def get_metrics_config():
+    """Retorna la configuración del exportador de métricas"""
+    return {
+        "host": METRICS_HOST,
+        "port": METRICS_PORT,
+        "refresh_s": METRICS_REFRESH_S,
+        "probe_embeddings": METRICS_PROBE_EMBEDDINGS
+    }
+
+def get_health_config():
+    """Retorna la configuración del chequeo de salud"""
+    return {
+        "timeout_s": HEALTH_TIMEOUT_S,
+        "cache_ttl_s": HEALTH_CACHE_TTL_S
+    }
+
+def get_monitor_history_config():
+    """Retorna la configuración del monitor en segundo plano"""
+    return {
+        "sample_interval_s": MONITOR_SAMPLE_INTERVAL_S,
+        "history_size": MONITOR_HISTORY_SIZE,
+        "snapshot_path": MONITOR_SNAPSHOT_PATH,
+        "snapshot_every_s": MONITOR_SNAPSHOT_EVERY_S,
+        "anomaly_window_s": MONITOR_ANOMALY_WINDOW_S,
+        "baseline_window_s": MONITOR_BASELINE_WINDOW_S,
+        "p95_regression_factor": MONITOR_P95_REGRESSION_FACTOR,
+        "p95_min_delta_ms": MONITOR_P95_MIN_DELTA_MS
+    }
+
+def get_benchmark_config():
+    """Retorna la configuración del benchmark de recuperación"""
+    return {
+        "queries": BENCHMARK_QUERIES,
+        "warmup": BENCHMARK_WARMUP,
+        "repetitions": BENCHMARK_REPETITIONS,
+        "k_values": BENCHMARK_K_VALUES,
+        "batch_sizes": BENCHMARK_BATCH_SIZES,
+        "concurrency": BENCHMARK_CONCURRENCY,
+        "results_path": BENCHMARK_RESULTS_PATH,
+        "baseline_path": BENCHMARK_BASELINE_PATH,
+        "regression_tolerance": BENCHMARK_REGRESSION_TOLERANCE
+    }
+
+def get_hnsw_tuning_config():
+    """Retorna la configuración del ajuste de parámetros HNSW"""
+    return {
+        "m_values": HNSW_TUNING_M_VALUES,
+        "construction_ef": HNSW_TUNING_CONSTRUCTION_EF,
+        "search_ef": HNSW_TUNING_SEARCH_EF,
+        "k": HNSW_TUNING_K,
+        "queries": HNSW_TUNING_QUERIES,
+        "target_recall": HNSW_TUNING_TARGET_RECALL,
+        "results_path": HNSW_TUNING_RESULTS_PATH
+    }
+
+def get_hnsw_inspection_config():
+    """Retorna los umbrales de la inspección de segmentos HNSW"""
+    return {
+        "rebuild_deleted_ratio": HNSW_REBUILD_DELETED_RATIO,
+        "min_degree_ratio": HNSW_MIN_DEGREE_RATIO
+    }
+
+def get_analytics_config():
+    """Retorna la configuración de la analítica de embeddings"""
+    return {
+        "batch_size": ANALYTICS_BATCH_SIZE,
+        "duplicate_threshold": ANALYTICS_DUPLICATE_THRESHOLD,
+        "lsh_bands": ANALYTICS_LSH_BANDS,
+        "lsh_bits_per_band": ANALYTICS_LSH_BITS_PER_BAND,
+        "lsh_max_bucket": ANALYTICS_LSH_MAX_BUCKET,
+        "outlier_z": ANALYTICS_OUTLIER_Z,
+        "min_chunk_chars": ANALYTICS_MIN_CHUNK_CHARS,
+        "clusters_per_source": ANALYTICS_CLUSTERS_PER_SOURCE,
+        "kmeans_epochs": ANALYTICS_KMEANS_EPOCHS,
+        "seed": ANALYTICS_SEED,
+        "results_path": ANALYTICS_RESULTS_PATH
+    }
+
 def get_processing_config():
     """Retorna la configuración de procesamiento"""
     return {
@@ -125,7 +536,7 @@ def print_config():
     print("=" * 50)
     print("CONFIGURACIÓN ACTUAL DEL SISTEMA")
     print("=" * 50)
-    print(f"Servidor Ollama: {OLLAMA_BASE_URL}")
+    print(f"Servidor Ollama: {', '.join(OLLAMA_HOSTS)}")
     print(f"Modelo Embeddings: {EMBEDDING_MODEL}")
     print(f"Modelo LLM: {LLM_MODEL}")
     print(f"Base de datos: {CHROMA_HOST}:{CHROMA_PORT}")
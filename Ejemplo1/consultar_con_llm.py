@@ -3,11 +3,22 @@ Script para consultar documentos usando un LLM para generar respuestas
 Combina embeddings para búsqueda + LLM para generación de respuestas
 """
 
+import time
+
 from langchain_chroma import Chroma
-from langchain_ollama import OllamaEmbeddings
-from langchain_community.llms import Ollama
 from langchain_core.prompts import PromptTemplate
-from langchain.chains import RetrievalQA
+
+from config import (
+    get_cache_config, get_context_config, get_search_config,
+    get_multi_query_config, get_scheduler_config, get_router_config
+)
+from cache_respuestas import AnswerCache, SemanticAnswerCache, huella_chunks, obtener_id_chunk
+from contexto import construir_contexto, similitud_desde_distancia
+from relevancia import RESPUESTA_SIN_CONTEXTO, mejor_score, pasa_compuerta
+from recuperacion import buscar_por_vector, recuperar_adaptativo, recuperar_multiconsulta
+from enrutador_modelos import ModelRouter
+from cliente_ollama import crear_embeddings, crear_llm as crear_llm_ollama
+from trazas import EmbeddingsTrazados, obtener_tracer, trazar
 
 # Configuración de la base de datos Chroma
 CHROMA_HOST = "localhost"
@@ -20,16 +31,45 @@ OLLAMA_PORT = 11434
 EMBEDDING_MODEL = "nomic-embed-text:latest"  # Para embeddings
 LLM_MODEL = "gpt-oss:20b"  # Para generación de respuestas
 
+# Prompt template para respuestas estructuradas
+PROMPT_TEMPLATE = """
+            Basándote en el siguiente contexto, responde la pregunta de manera clara y precisa.
+            Si la información no está en el contexto, indícalo claramente.
+            
+            Contexto:
+            {context}
+            
+            Pregunta: {question}
+            
+            Respuesta:"""
+
+def crear_llm(modelo):
+    """
+    Crea el cliente del LLM para un modelo
+    (si el planificador está activo, las peticiones pasan por su cola como interactivas
+    y el planificador las reparte con el pool; si no, van a Ollama directamente o al
+    pool cuando hay varios servidores)
+    """
+    scheduler_config = get_scheduler_config()
+    if scheduler_config["enabled"]:
+        from langchain_community.llms import Ollama
+        return Ollama(
+            model=modelo,
+            base_url=scheduler_config["url"],
+            headers={"X-Prioridad": "interactive"}
+        )
+    return crear_llm_ollama(modelo, base_url=f"http://{OLLAMA_HOST}:{OLLAMA_PORT}")
+
 def inicializar_sistema():
     """
-    Inicializa el sistema con embeddings y LLM
+    Inicializa el sistema con embeddings, LLM y cachés de respuestas
     """
     try:
-        # 1. Embeddings para búsqueda semántica
-        embeddings = OllamaEmbeddings(
-            model=EMBEDDING_MODEL,
+        # 1. Embeddings para búsqueda semántica (medidos como query_embed en las trazas)
+        embeddings = EmbeddingsTrazados(crear_embeddings(
+            EMBEDDING_MODEL,
             base_url=f"http://{OLLAMA_HOST}:{OLLAMA_PORT}"
-        )
+        ), obtener_tracer())
         
         # 2. Base de datos vectorial
         chroma_client = Chroma(
@@ -39,41 +79,143 @@ def inicializar_sistema():
         )
         
         # 3. LLM para generación de respuestas
-        llm = Ollama(
-            model=LLM_MODEL,
-            base_url=f"http://{OLLAMA_HOST}:{OLLAMA_PORT}"
-        )
+        #    (con el enrutador activo el modelo se elige por consulta)
+        llm = crear_llm(LLM_MODEL)
+        router = ModelRouter() if get_router_config()["enabled"] else None
         
         # 4. Prompt template para respuestas estructuradas
         prompt_template = PromptTemplate(
             input_variables=["context", "question"],
-            template="""
-            Basándote en el siguiente contexto, responde la pregunta de manera clara y precisa.
-            Si la información no está en el contexto, indícalo claramente.
-            
-            Contexto:
-            {context}
-            
-            Pregunta: {question}
-            
-            Respuesta:"""
+            template=PROMPT_TEMPLATE
         )
         
-        # 5. Chain que combina búsqueda + generación
-        qa_chain = RetrievalQA.from_chain_type(
-            llm=llm,
-            chain_type="stuff",
-            retriever=chroma_client.as_retriever(search_kwargs={"k": 5}),
-            chain_type_kwargs={"prompt": prompt_template}
-        )
+        # 5. Caché de respuestas (la recuperación se hace antes de generar
+        #    para que los IDs de los chunks formen parte de la clave)
+        cache_config = get_cache_config()
+        cache = AnswerCache() if cache_config["enabled"] else None
+        cache_semantica = SemanticAnswerCache() if cache_config["semantic_enabled"] else None
         
-        return qa_chain, chroma_client
+        return {
+            "embeddings": embeddings,
+            "llm": llm,
+            "llms": {LLM_MODEL: llm},
+            "router": router,
+            "chroma_client": chroma_client,
+            "prompt": prompt_template,
+            "cache": cache,
+            "cache_semantica": cache_semantica,
+            "metricas": {"consultas": 0, "llm_llamadas": 0, "llm_evitadas_compuerta": 0}
+        }
         
     except Exception as e:
         print(f"Error al inicializar el sistema: {e}")
-        return None, None
+        return None
+
+def recuperar_documentos(chroma_client, query, k=None, embedding=None):
+    """
+    Recupera los chunks más relevantes para la consulta junto con su similitud
+    Si ya se calculó el embedding de la pregunta se reutiliza
+    En modo "adaptive" el número de chunks depende de la distribución de scores
+    Con multi-query se buscan también reformulaciones de la pregunta en paralelo
+    """
+    config = get_search_config()
+    
+    if embedding is None:
+        resultados = chroma_client.similarity_search_with_score(query, k=k or config["k"])
+        return [(doc, similitud_desde_distancia(distancia)) for doc, distancia in resultados]
+    
+    if k is None and get_multi_query_config()["enabled"]:
+        return recuperar_multiconsulta(chroma_client, query, embedding)
+    
+    if k is None and config["mode"] == "adaptive":
+        return recuperar_adaptativo(chroma_client, embedding)
+    
+    return buscar_por_vector(chroma_client, embedding, k or config["k"])
+
+def formatear_contexto(documentos):
+    """
+    Concatena los chunks del contexto igual que la chain "stuff"
+    """
+    return "\n\n".join(doc.page_content for doc in documentos)
+
+def firma_prompt():
+    """
+    Retorna el texto que identifica cómo se construye el prompt
+    (template + parámetros de empaquetado) para la clave de caché
+    """
+    parametros = sorted(get_context_config().items())
+    return f"{PROMPT_TEMPLATE}|{parametros}"
+
+def chunks_vigentes(chroma_client, chunk_ids, huella):
+    """
+    Verifica que los chunks que respaldan una respuesta cacheada sigan
+    existiendo en la colección con el mismo contenido
+    """
+    try:
+        resultado = chroma_client._collection.get(ids=list(chunk_ids), include=["documents"])
+    except Exception:
+        return False
+    
+    textos = dict(zip(resultado["ids"], resultado["documents"]))
+    if any(chunk_id not in textos for chunk_id in chunk_ids):
+        return False
+    
+    return huella_chunks([textos[chunk_id] for chunk_id in chunk_ids]) == huella
+
+def auditar_hit_semantico(sistema, query, embedding, entrada, similitud):
+    """
+    Recupera los chunks de la pregunta nueva y los compara con los de la
+    respuesta cacheada para detectar posibles falsos aciertos
+    """
+    resultados = recuperar_documentos(sistema["chroma_client"], query, embedding=embedding)
+    _, chunk_ids, _ = construir_contexto(resultados, verbose=False)
+    
+    nuevos, cacheados = set(chunk_ids), set(entrada["chunk_ids"])
+    union = nuevos | cacheados
+    solapamiento = len(nuevos & cacheados) / len(union) if union else 1.0
+    
+    sospechoso = sistema["cache_semantica"].registrar_auditoria(
+        query, entrada["pregunta"], similitud, solapamiento
+    )
+    if sospechoso:
+        print(f"🔎 Auditoría: posible falso acierto (solapamiento de chunks {solapamiento:.0%})")
+
+def modelo_cache_semantica(sistema):
+    """
+    Modelo con el que se indexa la caché semántica: con el enrutador la
+    respuesta puede venir de cualquier modelo, así que se agrupan bajo "router"
+    """
+    return "router" if sistema.get("router") else LLM_MODEL
 
-def consultar_con_llm(qa_chain, query):
+def generar_respuesta(sistema, query, documentos, modelo=None):
+    """
+    Genera la respuesta del LLM a partir de los chunks recuperados
+    Se usa streaming para medir el tiempo hasta el primer token
+    """
+    modelo = modelo or LLM_MODEL
+    if modelo not in sistema["llms"]:
+        sistema["llms"][modelo] = crear_llm(modelo)
+    
+    tracer = obtener_tracer()
+    with tracer.span("prompt_build"):
+        prompt = sistema["prompt"].format(
+            context=formatear_contexto(documentos),
+            question=query
+        )
+
+    fragmentos = []
+    inicio = time.perf_counter()
+    with tracer.span("llm_generation", modelo=modelo) as atributos:
+        for fragmento in sistema["llms"][modelo].stream(prompt):
+            if not fragmentos:
+                tracer.registrar("llm_ttft", (time.perf_counter() - inicio) * 1000, modelo=modelo)
+            fragmentos.append(fragmento)
+        atributos["fragmentos"] = len(fragmentos)
+    
+    return "".join(fragmentos)
+
+@trazar("consulta")
+def consultar_con_llm(sistema, query):
     """
     Realiza una consulta usando el LLM para generar respuestas
     """
@@ -81,38 +223,155 @@ def consultar_con_llm(qa_chain, query):
         print(f"\n🤖 Generando respuesta para: '{query}'")
         print("=" * 60)
         
+        metricas = sistema["metricas"]
+        metricas["consultas"] += 1
+        
+        chroma_client = sistema["chroma_client"]
+        cache_semantica = sistema.get("cache_semantica")
+        embedding = sistema["embeddings"].embed_query(query)
+        
+        # Buscar una pregunta parecida en la caché semántica
+        if cache_semantica:
+            entrada, similitud = cache_semantica.buscar(embedding, modelo_cache_semantica(sistema), firma_prompt())
+            if entrada and chunks_vigentes(chroma_client, entrada["chunk_ids"], entrada["huella_chunks"]):
+                cache_semantica.registrar_hit()
+                if cache_semantica.debe_auditar():
+                    auditar_hit_semantico(sistema, query, embedding, entrada, similitud)
+                
+                print(f"⚡ Respuesta servida desde caché semántica "
+                      f"(similitud {similitud:.3f} con '{entrada['pregunta']}'):")
+                print(entrada["respuesta"])
+                return entrada["respuesta"]
+            elif entrada:
+                cache_semantica.invalidar(entrada["id"])
+        
+        # Recuperar y empaquetar contexto
+        tracer = obtener_tracer()
+        with tracer.span("vector_search", exclusivo=True):
+            resultados = recuperar_documentos(chroma_client, query, embedding=embedding)
+        
+        # Compuerta de relevancia: sin chunks relevantes no vale la pena llamar al LLM
+        if not pasa_compuerta(resultados):
+            metricas["llm_evitadas_compuerta"] += 1
+            score = mejor_score(resultados)
+            score_txt = f"{score:.3f}" if score is not None else "N/A"
+            print(f"🚫 Ningún chunk supera el umbral de relevancia (mejor score: {score_txt})")
+            print(RESPUESTA_SIN_CONTEXTO)
+            return RESPUESTA_SIN_CONTEXTO
+        
+        with tracer.span("context_pack"):
+            empaquetados, chunk_ids, info_contexto = construir_contexto(resultados)
+        documentos = [doc for doc, _ in empaquetados]
+        
+        # Buscar en caché antes de enrutar: el modelo elegido depende de la carga del
+        # momento, así que con el enrutador la clave usa "router" como la caché semántica
+        cache = sistema.get("cache")
+        clave = None
+        if cache:
+            clave = AnswerCache.construir_clave(query, chunk_ids, modelo_cache_semantica(sistema), firma_prompt())
+            respuesta = cache.obtener(clave)
+            if respuesta is not None:
+                print(f"⚡ Respuesta servida desde caché:")
+                print(respuesta)
+                return respuesta
+        
+        # Elegir el modelo según la pregunta, el contexto y la carga del planificador
+        router = sistema.get("router")
+        decision = None
+        modelo = LLM_MODEL
+        if router:
+            decision = router.elegir(query, info_contexto["tokens_despues"])
+            modelo = decision["modelo"]
+            print(f"🧭 Modelo: {modelo} ({decision['motivo']}, "
+                  f"~{decision['latencia_estimada_ms'] / 1000:.1f}s estimados)")
+        
         # Obtener respuesta del LLM
-        response = qa_chain.invoke({"query": query})
+        metricas["llm_llamadas"] += 1
+        inicio = time.time()
+        try:
+            respuesta = generar_respuesta(sistema, query, documentos, modelo)
+        except Exception as e:
+            if decision:
+                router.registrar(decision, (time.time() - inicio) * 1000, error=str(e))
+            raise
+        if decision:
+            router.registrar(decision, (time.time() - inicio) * 1000)
+        
+        if cache:
+            cache.guardar(clave, query, chunk_ids, modelo, respuesta)
+        
+        if cache_semantica:
+            textos = {obtener_id_chunk(doc): doc.page_content for doc, _ in resultados}
+            cache_semantica.guardar(
+                query, embedding, chunk_ids, [textos[chunk_id] for chunk_id in chunk_ids],
+                modelo_cache_semantica(sistema), firma_prompt(), respuesta
+            )
         
         print(f"📝 Respuesta generada:")
-        print(response["result"])
+        print(respuesta)
         
-        return response["result"]
+        return respuesta
         
     except Exception as e:
         print(f"Error al consultar: {e}")
         return None
 
-def obtener_estadisticas(chroma_client):
+def obtener_estadisticas(sistema):
     """
     Obtiene estadísticas de la base de datos
     """
     try:
-        collection = chroma_client._collection
+        collection = sistema["chroma_client"]._collection
         count = collection.count()
         
         print(f"\n📊 Estadísticas del sistema:")
         print(f"• Documentos en BD: {count}")
         print(f"• Modelo de embeddings: {EMBEDDING_MODEL}")
-        print(f"• Modelo LLM: {LLM_MODEL}")
+        if sistema.get("router"):
+            print(f"• Modelo LLM: enrutado por consulta (por defecto {LLM_MODEL})")
+        else:
+            print(f"• Modelo LLM: {LLM_MODEL}")
         print(f"• Servidor: {OLLAMA_HOST}:{OLLAMA_PORT}")
         
+        metricas = sistema["metricas"]
+        print(f"• Consultas en esta sesión: {metricas['consultas']} "
+              f"({metricas['llm_llamadas']} llamadas al LLM, "
+              f"{metricas['llm_evitadas_compuerta']} evitadas por la compuerta de relevancia)")
+        
+        if sistema.get("cache"):
+            stats = sistema["cache"].estadisticas()
+            print(f"• Caché de respuestas: {stats['entradas']} entradas "
+                  f"({stats['hits']} hits / {stats['misses']} misses en esta sesión)")
+        
+        if sistema.get("cache_semantica"):
+            stats = sistema["cache_semantica"].estadisticas()
+            print(f"• Caché semántica: {stats['entradas']} preguntas, "
+                  f"hit ratio {stats['hit_ratio']:.1%} ({stats['hits']}/{stats['lookups']}), "
+                  f"{stats['sospechosos']}/{stats['auditados']} auditados sospechosos")
+        
         return count
         
     except Exception as e:
         print(f"Error al obtener estadísticas: {e}")
         return 0
 
+def mostrar_auditoria(cache_semantica, limite=10):
+    """
+    Muestra las últimas muestras de auditoría de la caché semántica
+    """
+    muestras = cache_semantica.muestras_auditoria(limite)
+    if not muestras:
+        print("ℹ️ No hay muestras de auditoría todavía")
+        return
+    
+    print(f"\n🔎 Últimas {len(muestras)} muestras de auditoría:")
+    for muestra in muestras:
+        marca = "⚠️ " if muestra["sospechoso"] else "✅"
+        solapamiento = muestra["solapamiento_chunks"]
+        solapamiento_txt = f"{solapamiento:.0%}" if solapamiento is not None else "N/A"
+        print(f"{marca} '{muestra['pregunta']}' ≈ '{muestra['pregunta_cacheada']}' "
+              f"(similitud {muestra['similitud']:.3f}, chunks comunes {solapamiento_txt})")
+
 def main():
     """
     Función principal
@@ -121,16 +380,16 @@ def main():
     print("Combina embeddings para búsqueda + LLM para respuestas\n")
     
     # Inicializar sistema
-    qa_chain, chroma_client = inicializar_sistema()
+    sistema = inicializar_sistema()
     
-    if not qa_chain:
+    if not sistema:
         print("❌ Error al inicializar el sistema")
         return
     
     print("✅ Sistema inicializado correctamente")
     
     # Obtener estadísticas
-    obtener_estadisticas(chroma_client)
+    obtener_estadisticas(sistema)
     
     # Ejemplos de consultas
     consultas_ejemplo = [
@@ -152,10 +411,32 @@ def main():
         if query.lower() in ['salir', 'exit', 'quit']:
             break
         
+        if query.lower() == 'stats':
+            obtener_estadisticas(sistema)
+            continue
+        
+        if query.lower() == 'auditoria' and sistema.get("cache_semantica"):
+            mostrar_auditoria(sistema["cache_semantica"])
+            continue
+        
+        if query.lower() == 'trazas':
+            obtener_tracer().imprimir_resumen()
+            continue
+        
         if query:
-            consultar_con_llm(qa_chain, query)
+            consultar_con_llm(sistema, query)
         else:
             print("Por favor ingresa una consulta válida")
 
+    # Escribe los contadores de aciertos pendientes
+    for cache in (sistema.get("cache"), sistema.get("cache_semantica")):
+        if cache:
+            cache.cerrar()
+    
+    tracer = obtener_tracer()
+    if tracer.habilitado and tracer.resumen():
+        tracer.imprimir_resumen()
+        print(f"📄 Trazas exportadas a: {tracer.exportar_json()}")
+
 if __name__ == "__main__":
     main()
@@ -4,7 +4,9 @@ Versión compatible con LangChain 0.3.27
 """
 
 from langchain_chroma import Chroma
-from langchain_ollama import OllamaEmbeddings
+
+from cliente_ollama import crear_embeddings
+from trazas import EmbeddingsTrazados, obtener_tracer
 
 # Configuración de la base de datos Chroma
 CHROMA_HOST = "localhost"
@@ -21,10 +23,10 @@ def inicializar_chroma():
     Inicializa la conexión con Chroma
     """
     try:
-        embeddings = OllamaEmbeddings(
-            model=OLLAMA_MODEL,
+        embeddings = EmbeddingsTrazados(crear_embeddings(
+            OLLAMA_MODEL,
             base_url=f"http://{OLLAMA_HOST}:{OLLAMA_PORT}"
-        )
+        ), obtener_tracer())
         
         chroma_client = Chroma(
             collection_name=COLLECTION_NAME,
@@ -36,8 +38,8 @@ def inicializar_chroma():
     except Exception as e:
         print(f"Error al inicializar Chroma: {e}")
         # Configuración alternativa
-        embeddings = OllamaEmbeddings(
-            model=OLLAMA_MODEL,
+        embeddings = crear_embeddings(
+            OLLAMA_MODEL,
             base_url=f"http://{OLLAMA_HOST}:{OLLAMA_PORT}"
         )
         chroma_client = Chroma(
@@ -52,7 +54,9 @@ def consultar_documentos(chroma_client, query, n_results=5):
     Realiza una consulta semántica en la base de datos
     """
     try:
-        results = chroma_client.similarity_search(query, k=n_results)
+        # Span exclusivo: el embedding de la consulta se mide aparte como query_embed
+        with obtener_tracer().span("vector_search", exclusivo=True, k=n_results):
+            results = chroma_client.similarity_search(query, k=n_results)
         
         print(f"\nResultados para la consulta: '{query}'")
         print("=" * 50)
@@ -131,10 +135,19 @@ def main():
         if query.lower() in ['salir', 'exit', 'quit']:
             break
         
+        if query.lower() == 'trazas':
+            obtener_tracer().imprimir_resumen()
+            continue
+        
         if query:
             consultar_documentos(chroma_client, query)
         else:
             print("Por favor ingresa una consulta válida")
 
+    tracer = obtener_tracer()
+    if tracer.habilitado and tracer.resumen():
+        tracer.imprimir_resumen()
+        print(f"📄 Trazas exportadas a: {tracer.exportar_json()}")
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,170 @@
+"""
+Construcción del contexto para el prompt del LLM
+Recorta los chunks recuperados a un presupuesto de tokens para reducir el prefill
+"""
+
+import os
+import sys
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from langchain_core.documents import Document
+
+from config import get_context_config
+from cache_respuestas import obtener_id_chunk
+
+def estimar_tokens(texto, chars_por_token=None):
+    """
+    Estima el número de tokens de un texto a partir de su longitud
+    (aproximación suficiente para comparar tamaños de prompt)
+    """
+    if chars_por_token is None:
+        chars_por_token = get_context_config()["chars_per_token"]
+    return max(1, round(len(texto) / chars_por_token)) if texto else 0
+
+def similitud_desde_distancia(distancia):
+    """
+    Convierte la distancia de Chroma en una similitud entre -1 y 1
+    El espacio "l2" de Chroma retorna la distancia euclidiana al cuadrado,
+    que para embeddings normalizados equivale a 2 - 2 * coseno
+    """
+    return 1.0 - distancia / 2.0
+
+def _longitud_solapamiento(texto_a, texto_b, minimo):
+    """
+    Retorna cuántos caracteres del final de texto_a coinciden con el
+    inicio de texto_b (0 si el solapamiento es menor que el mínimo)
+    """
+    if len(texto_a) < minimo or len(texto_b) < minimo:
+        return 0
+    
+    semilla = texto_b[:minimo]
+    inicio = texto_a.find(semilla)
+    while inicio != -1:
+        resto = texto_a[inicio:]
+        if texto_b.startswith(resto):
+            return len(resto)
+        inicio = texto_a.find(semilla, inicio + 1)
+    
+    return 0
+
+def fusionar_solapados(candidatos, minimo_solapamiento):
+    """
+    Fusiona chunks adyacentes de la misma fuente y página cuyo texto se solapa
+    Cada candidato es un dict con "texto", "metadata", "score" e "ids"
+    """
+    fusionados = list(candidatos)
+    hubo_cambios = True
+    
+    while hubo_cambios:
+        hubo_cambios = False
+        for i in range(len(fusionados)):
+            for j in range(len(fusionados)):
+                if i == j:
+                    continue
+                
+                a, b = fusionados[i], fusionados[j]
+                misma_pagina = (
+                    a["metadata"].get("source") == b["metadata"].get("source")
+                    and a["metadata"].get("page") == b["metadata"].get("page")
+                )
+                if not misma_pagina:
+                    continue
+                
+                solapamiento = _longitud_solapamiento(a["texto"], b["texto"], minimo_solapamiento)
+                if solapamiento == 0:
+                    continue
+                
+                fusionados[i] = {
+                    "texto": a["texto"] + b["texto"][solapamiento:],
+                    "metadata": a["metadata"],
+                    "score": max(a["score"], b["score"]),
+                    "ids": a["ids"] + b["ids"]
+                }
+                del fusionados[j]
+                hubo_cambios = True
+                break
+            if hubo_cambios:
+                break
+    
+    return fusionados
+
+def construir_contexto(resultados, max_tokens=None, score_minimo=None, verbose=True):
+    """
+    Construye el contexto a partir de una lista de (Document, similitud):
+    1. Descarta chunks por debajo del score mínimo
+    2. Fusiona chunks solapados de la misma página
+    3. Ordena por relevancia y recorta al presupuesto de tokens
+    
+    Retorna (documentos_empaquetados, chunk_ids, info)
+    """
+    config = get_context_config()
+    max_tokens = max_tokens if max_tokens is not None else config["max_tokens"]
+    score_minimo = score_minimo if score_minimo is not None else config["min_score"]
+    separador = "\n\n"
+    
+    tokens_antes = estimar_tokens(separador.join(doc.page_content for doc, _ in resultados))
+    
+    candidatos = [
+        {
+            "texto": doc.page_content,
+            "metadata": doc.metadata or {},
+            "score": score,
+            "ids": [obtener_id_chunk(doc)]
+        }
+        for doc, score in resultados
+        if score >= score_minimo
+    ]
+    
+    # Si nada supera el umbral se conserva el mejor chunk para no dejar el prompt vacío
+    if not candidatos and resultados:
+        doc, score = max(resultados, key=lambda r: r[1])
+        candidatos = [{
+            "texto": doc.page_content,
+            "metadata": doc.metadata or {},
+            "score": score,
+            "ids": [obtener_id_chunk(doc)]
+        }]
+    
+    candidatos = fusionar_solapados(candidatos, config["merge_min_overlap"])
+    candidatos.sort(key=lambda c: c["score"], reverse=True)
+    
+    empaquetados = []
+    chunk_ids = []
+    tokens_usados = 0
+    for candidato in candidatos:
+        tokens = estimar_tokens(candidato["texto"])
+        disponibles = max_tokens - tokens_usados
+        
+        if tokens <= disponibles:
+            texto = candidato["texto"]
+        elif disponibles >= config["min_partial_tokens"]:
+            # Recortar el último chunk para aprovechar el presupuesto restante
+            texto = candidato["texto"][:int(disponibles * config["chars_per_token"])]
+        else:
+            break
+        
+        empaquetados.append(
+            (Document(page_content=texto, metadata=candidato["metadata"]), candidato["score"])
+        )
+        chunk_ids.extend(candidato["ids"])
+        tokens_usados += estimar_tokens(texto)
+        
+        if tokens_usados >= max_tokens:
+            break
+    
+    tokens_despues = estimar_tokens(separador.join(doc.page_content for doc, _ in empaquetados))
+    info = {
+        "chunks_antes": len(resultados),
+        "chunks_despues": len(empaquetados),
+        "tokens_antes": tokens_antes,
+        "tokens_despues": tokens_despues
+    }
+    
+    if verbose:
+        ahorro = (1 - tokens_despues / tokens_antes) * 100 if tokens_antes else 0.0
+        print(f"📏 Contexto: {info['chunks_antes']} → {info['chunks_despues']} chunks, "
+              f"~{tokens_antes} → ~{tokens_despues} tokens ({ahorro:.1f}% menos)")
+    
+    return empaquetados, chunk_ids, info
@@ -5,6 +5,7 @@ Permite verificar el estado, contenido y realizar consultas de diagnóstico
 
 import sys
 import os
+import argparse
 from pathlib import Path
 from datetime import datetime
 import json
@@ -14,7 +15,14 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from config import get_ollama_config, get_chroma_config, get_models_config
 from langchain_chroma import Chroma
-from langchain_ollama import OllamaEmbeddings
+from cliente_ollama import crear_embeddings
+from escaneo import escanear, primer_registro
+from estadisticas_coleccion import obtener_estadisticas
+from catalogo_sqlite import abrir_catalogo
+from exportador_metricas import MetricsExporter, crear_servidor
+from salud import HealthChecker, imprimir_salud
+from analitica_embeddings import analizar, imprimir_informe as imprimir_analitica
+from historial_monitor import MonitorDaemon, imprimir_tendencias, imprimir_anomalias
 
 class DatabaseMonitor:
     """Clase para monitorear el estado de la base de datos Chroma"""
@@ -26,8 +34,8 @@ class DatabaseMonitor:
         self.models_config = get_models_config()
         
         # Inicializar embeddings y cliente Chroma
-        self.embeddings = OllamaEmbeddings(
-            model=self.models_config["embedding_model"],
+        self.embeddings = crear_embeddings(
+            self.models_config["embedding_model"],
             base_url=self.ollama_config["base_url"]
         )
         
@@ -36,6 +44,8 @@ class DatabaseMonitor:
             embedding_function=self.embeddings,
             persist_directory=self.config["persist_directory"]
         )
+        self.salud = None
+        self.daemon = None
     
     def get_basic_stats(self):
         """Obtiene estadísticas básicas de la base de datos"""
@@ -55,16 +65,16 @@ class DatabaseMonitor:
             
             # Verificar si hay documentos
             if count > 0:
-                # Obtener algunos documentos de muestra
-                results = self.chroma_client.get()
-                if results and results['documents']:
+                # Obtener solo el primer documento de muestra
+                primero = primer_registro(self.chroma_client)
+                if primero and primero['document']:
                     print(f"📝 Primer documento (primeros 100 chars):")
-                    print(f"   {results['documents'][0][:100]}...")
+                    print(f"   {primero['document'][:100]}...")
                     
                     # Mostrar metadatos del primer documento
-                    if results['metadatas'] and results['metadatas'][0]:
+                    if primero['metadata']:
                         print(f"🏷️  Metadatos del primer documento:")
-                        for key, value in results['metadatas'][0].items():
+                        for key, value in primero['metadata'].items():
                             print(f"   {key}: {value}")
                 
                 return True
@@ -83,66 +93,96 @@ class DatabaseMonitor:
         print("=" * 60)
         
         try:
-            results = self.chroma_client.get()
+            stats = self._leer_estadisticas()
             
-            if not results or not results['documents']:
+            if not stats["total"]:
                 print("⚠️  No hay documentos para analizar")
                 return
             
-            documents = results['documents']
-            metadatas = results['metadatas'] or []
-            ids = results['ids']
-            
-            print(f"📊 Análisis de {len(documents)} documentos:")
+            print(f"📊 Análisis de {stats['total']} documentos:")
             
             # Estadísticas de longitud de documentos
-            lengths = [len(doc) for doc in documents]
-            avg_length = sum(lengths) / len(lengths)
-            min_length = min(lengths)
-            max_length = max(lengths)
-            
-            print(f"   📏 Longitud promedio: {avg_length:.1f} caracteres")
-            print(f"   📏 Longitud mínima: {min_length} caracteres")
-            print(f"   📏 Longitud máxima: {max_length} caracteres")
+            print(f"   📏 Longitud promedio: {stats['avg_length']:.1f} caracteres")
+            print(f"   📏 Longitud mínima: {stats['min_length']} caracteres")
+            print(f"   📏 Longitud máxima: {stats['max_length']} caracteres")
             
             # Análisis de metadatos
-            if metadatas:
+            if stats["con_metadatos"]:
                 print(f"\n🏷️  Análisis de metadatos:")
                 
-                # Contar fuentes únicas
-                sources = set()
-                for metadata in metadatas:
-                    if metadata and 'source' in metadata:
-                        sources.add(metadata['source'])
-                
-                print(f"   📁 Fuentes únicas: {len(sources)}")
-                for source in sorted(sources):
+                # Fuentes únicas
+                print(f"   📁 Fuentes únicas: {len(stats['chunks_por_fuente'])}")
+                for source in sorted(stats["chunks_por_fuente"]):
                     print(f"      - {source}")
                 
-                # Contar páginas únicas
-                pages = set()
-                for metadata in metadatas:
-                    if metadata and 'page' in metadata:
-                        pages.add(metadata['page'])
-                
-                print(f"   📄 Páginas únicas: {len(pages)}")
+                # Páginas únicas
+                print(f"   📄 Páginas únicas: {len(stats['chunks_por_pagina'])}")
                 
                 # Análisis de chunks por documento
-                doc_chunks = {}
-                for metadata in metadatas:
-                    if metadata and 'source' in metadata:
-                        source = metadata['source']
-                        if source not in doc_chunks:
-                            doc_chunks[source] = 0
-                        doc_chunks[source] += 1
-                
                 print(f"\n📊 Chunks por documento:")
-                for source, count in sorted(doc_chunks.items()):
+                for source, count in sorted(stats["chunks_por_fuente"].items()):
                     print(f"   {source}: {count} chunks")
             
         except Exception as e:
             print(f"❌ Error al obtener estadísticas detalladas: {e}")
     
+    def _leer_estadisticas(self):
+        """
+        Lee las estadísticas mantenidas al escribir; si no coinciden con la
+        colección (p. ej. datos cargados con otra herramienta) se consultan con SQL
+        en chroma.sqlite3 y, si el esquema no es compatible, se recorre la colección
+        """
+        estadisticas = obtener_estadisticas()
+        if estadisticas and estadisticas.sincronizado(self.chroma_client):
+            return estadisticas.resumen()
+        
+        if estadisticas:
+            print("⚠️  Estadísticas desactualizadas (usa 'rebuild' para reconstruirlas)")
+        
+        catalogo = abrir_catalogo(self.config["persist_directory"], self.config["collection_name"])
+        if catalogo:
+            try:
+                return catalogo.resumen()
+            finally:
+                catalogo.cerrar()
+        return self._recorrer_coleccion()
+    
+    def _recorrer_coleccion(self):
+        """
+        Recorre la colección por lotes acumulando longitudes, fuentes y páginas
+        sin cargar todos los documentos en memoria
+        """
+        stats = {
+            "total": 0,
+            "con_metadatos": 0,
+            "suma_longitudes": 0,
+            "min_length": None,
+            "max_length": None,
+            "chunks_por_pagina": {},
+            "chunks_por_fuente": {}
+        }
+        
+        for registro in escanear(self.chroma_client, include=("documents", "metadatas")):
+            longitud = len(registro["document"] or "")
+            stats["total"] += 1
+            stats["suma_longitudes"] += longitud
+            stats["min_length"] = longitud if stats["min_length"] is None else min(stats["min_length"], longitud)
+            stats["max_length"] = longitud if stats["max_length"] is None else max(stats["max_length"], longitud)
+            
+            metadata = registro["metadata"]
+            if not metadata:
+                continue
+            stats["con_metadatos"] += 1
+            if 'source' in metadata:
+                source = metadata['source']
+                stats["chunks_por_fuente"][source] = stats["chunks_por_fuente"].get(source, 0) + 1
+            if 'page' in metadata:
+                page = metadata['page']
+                stats["chunks_por_pagina"][page] = stats["chunks_por_pagina"].get(page, 0) + 1
+        
+        stats["avg_length"] = stats["suma_longitudes"] / stats["total"] if stats["total"] else 0.0
+        return stats
+    
     def search_sample_queries(self):
         """Realiza búsquedas de muestra para verificar funcionamiento"""
         print("\n" + "=" * 60)
@@ -177,58 +217,31 @@ class DatabaseMonitor:
             except Exception as e:
                 print(f"   ❌ Error en búsqueda: {e}")
     
-    def check_database_health(self):
-        """Verifica la salud general de la base de datos"""
+    def check_database_health(self, forzar=False):
+        """
+        Verifica la salud general de la base de datos
+        Los sondeos corren en paralelo con plazo (salud.py) y el resultado se reutiliza
+        durante HEALTH_CACHE_TTL_S segundos salvo que se pida forzar
+        """
         print("\n" + "=" * 60)
         print("🏥 VERIFICACIÓN DE SALUD DE LA BASE DE DATOS")
         print("=" * 60)
         
+        if self.salud is None:
+            self.salud = HealthChecker(self.chroma_client)
+        resultado = self.salud.verificar(forzar=forzar)
+        imprimir_salud(resultado)
+        
+        checks = resultado["checks"]
         health_status = {
-            "connection": False,
-            "collection_exists": False,
-            "has_documents": False,
-            "embeddings_working": False,
-            "search_working": False
+            "connection": checks["chroma"]["ok"],
+            "collection_exists": checks["chroma"]["ok"],
+            "has_documents": bool(checks["chroma"].get("documentos")),
+            "embeddings_working": checks["embeddings"]["ok"],
+            "search_working": bool(checks["search"]["ok"]),
+            "llm_available": checks["llm"]["ok"]
         }
         
-        # Verificar conexión
-        try:
-            count = self.chroma_client._collection.count()
-            health_status["connection"] = True
-            health_status["collection_exists"] = True
-            health_status["has_documents"] = count > 0
-            print(f"✅ Conexión a Chroma: OK")
-            print(f"✅ Colección existe: OK")
-            print(f"✅ Documentos presentes: {'SÍ' if count > 0 else 'NO'}")
-        except Exception as e:
-            print(f"❌ Error de conexión: {e}")
-        
-        # Verificar embeddings
-        try:
-            test_text = "test"
-            vectors = self.embeddings.embed_query(test_text)
-            if len(vectors) > 0:
-                health_status["embeddings_working"] = True
-                print(f"✅ Embeddings funcionando: OK ({len(vectors)} dimensiones)")
-            else:
-                print(f"❌ Embeddings no generaron vectores")
-        except Exception as e:
-            print(f"❌ Error en embeddings: {e}")
-        
-        # Verificar búsqueda
-        if health_status["has_documents"]:
-            try:
-                results = self.chroma_client.similarity_search("test", k=1)
-                if results:
-                    health_status["search_working"] = True
-                    print(f"✅ Búsqueda funcionando: OK")
-                else:
-                    print(f"⚠️  Búsqueda no retornó resultados")
-            except Exception as e:
-                print(f"❌ Error en búsqueda: {e}")
-        else:
-            print(f"⚠️  Búsqueda no probada (sin documentos)")
-        
         # Resumen de salud
         print(f"\n📊 Estado general: {sum(health_status.values())}/{len(health_status)} OK")
         
@@ -266,27 +279,17 @@ class DatabaseMonitor:
             report["stats"]["total_documents"] = count
             
             if count > 0:
-                results = self.chroma_client.get()
-                documents = results['documents']
-                metadatas = results['metadatas'] or []
+                stats = self._leer_estadisticas()
                 
                 # Estadísticas de documentos
-                lengths = [len(doc) for doc in documents]
-                report["stats"]["avg_length"] = sum(lengths) / len(lengths)
-                report["stats"]["min_length"] = min(lengths)
-                report["stats"]["max_length"] = max(lengths)
+                report["stats"]["avg_length"] = stats["avg_length"]
+                report["stats"]["min_length"] = stats["min_length"]
+                report["stats"]["max_length"] = stats["max_length"]
                 
                 # Análisis de metadatos
-                sources = set()
-                pages = set()
-                for metadata in metadatas:
-                    if metadata and 'source' in metadata:
-                        sources.add(metadata['source'])
-                    if metadata and 'page' in metadata:
-                        pages.add(metadata['page'])
-                
-                report["stats"]["unique_sources"] = list(sources)
-                report["stats"]["unique_pages"] = len(pages)
+                report["stats"]["unique_sources"] = list(stats["chunks_por_fuente"])
+                report["stats"]["unique_pages"] = len(stats["chunks_por_pagina"])
+                report["stats"]["chunks_per_source"] = stats["chunks_por_fuente"]
             
             # Estado de salud
             report["health"] = self.check_database_health()
@@ -300,6 +303,79 @@ class DatabaseMonitor:
         except Exception as e:
             print(f"❌ Error al exportar información: {e}")
     
+    def rebuild_stats(self):
+        """Reconstruye las estadísticas incrementales recorriendo la colección"""
+        estadisticas = obtener_estadisticas()
+        if not estadisticas:
+            print("ℹ️ Las estadísticas incrementales están desactivadas (COLLECTION_STATS_ENABLED)")
+            return
+        
+        print("\n🔄 Reconstruyendo estadísticas de la colección...")
+        inicio = datetime.now()
+        total = estadisticas.reconstruir(self.chroma_client)
+        segundos = (datetime.now() - inicio).total_seconds()
+        print(f"✅ Estadísticas reconstruidas: {total} chunks en {segundos:.2f}s")
+    
+    def serve_metrics(self, host=None, port=None):
+        """Sirve métricas en formato Prometheus refrescadas en segundo plano"""
+        exportador = MetricsExporter(self.chroma_client, self.embeddings, self.config["persist_directory"])
+        exportador.iniciar()
+        if self.salud is None:
+            self.salud = HealthChecker(self.chroma_client)
+        servidor = crear_servidor(exportador, host, port, salud=self.salud)
+        
+        direccion, puerto = servidor.server_address[:2]
+        print(f"📡 Métricas en http://{direccion}:{puerto}/metrics "
+              f"(sondeo cada {exportador.intervalo_s}s)")
+        print(f"🏥 Salud en http://{direccion}:{puerto}/health "
+              f"(caché de {self.salud.ttl_s}s, plazo {self.salud.timeout_s}s)")
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            print("\n👋 Exportador de métricas detenido")
+        finally:
+            exportador.detener()
+            self.salud.detener()
+            servidor.server_close()
+    
+    def analyze_embeddings(self):
+        """Analiza los vectores: normas, degenerados, casi duplicados, atípicos y clusters"""
+        print("\n" + "=" * 60)
+        print("🧬 ANÁLISIS DEL ESPACIO DE EMBEDDINGS")
+        print("=" * 60)
+        imprimir_analitica(analizar(self.chroma_client))
+    
+    def start_daemon(self, intervalo_s=None):
+        """Arranca el muestreo en segundo plano con historial acotado (historial_monitor.py)"""
+        if self.salud is None:
+            self.salud = HealthChecker(self.chroma_client)
+        self.daemon = MonitorDaemon(self.chroma_client, self.config["persist_directory"], self.salud, intervalo_s)
+        self.daemon.iniciar()
+        print(f"🛰️  Monitor en segundo plano: muestra cada {self.daemon.intervalo_s}s, "
+              f"hasta {self.daemon.serie.capacidad} muestras ({len(self.daemon.serie)} recuperadas de "
+              f"{self.daemon.ruta_snapshot})")
+    
+    def stop_daemon(self):
+        """Detiene el muestreo y guarda el historial"""
+        if self.daemon:
+            self.daemon.detener()
+            print(f"💾 Historial guardado en {self.daemon.ruta_snapshot}")
+            self.daemon = None
+    
+    def show_trends(self, minutos=60):
+        """Muestra las tendencias del historial"""
+        if not self.daemon:
+            print("ℹ️ El historial solo se registra en modo --daemon")
+            return
+        imprimir_tendencias(self.daemon.serie, minutos * 60)
+    
+    def show_anomalies(self):
+        """Muestra las anomalías detectadas en el historial"""
+        if not self.daemon:
+            print("ℹ️ El historial solo se registra en modo --daemon")
+            return
+        imprimir_anomalias(self.daemon.serie)
+    
     def interactive_mode(self):
         """Modo interactivo para explorar la base de datos"""
         print("\n" + "=" * 60)
@@ -311,6 +387,10 @@ class DatabaseMonitor:
         print("  search <query> - Buscar documentos")
         print("  health - Verificar salud de la BD")
         print("  export - Exportar información")
+        print("  rebuild - Reconstruir estadísticas de la colección")
+        print("  vectors - Analizar los embeddings (duplicados, atípicos, clusters)")
+        print("  trend [minutos] - Tendencias del historial (modo --daemon)")
+        print("  anomalies - Anomalías recientes (modo --daemon)")
         print("  quit - Salir")
         print("=" * 60)
         
@@ -326,9 +406,18 @@ class DatabaseMonitor:
                 elif command == "detailed":
                     self.get_detailed_stats()
                 elif command == "health":
-                    self.check_database_health()
+                    self.check_database_health(forzar=True)
                 elif command == "export":
                     self.export_database_info()
+                elif command == "rebuild":
+                    self.rebuild_stats()
+                elif command == "vectors":
+                    self.analyze_embeddings()
+                elif command == "trend" or command.startswith("trend "):
+                    partes = command.split()
+                    self.show_trends(float(partes[1]) if len(partes) > 1 else 60)
+                elif command == "anomalies":
+                    self.show_anomalies()
                 elif command.startswith("search "):
                     query = command[7:]  # Remover "search "
                     print(f"\n🔍 Búsqueda: '{query}'")
@@ -349,6 +438,15 @@ class DatabaseMonitor:
 
 def main():
     """Función principal"""
+    parser = argparse.ArgumentParser(description="Monitor de la base de datos Chroma")
+    parser.add_argument("--metrics", action="store_true", help="Servir métricas en formato Prometheus")
+    parser.add_argument("--host", help="Host del servidor de métricas")
+    parser.add_argument("--port", type=int, help="Puerto del servidor de métricas")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Muestrear en segundo plano y guardar el historial (comandos trend y anomalies)")
+    parser.add_argument("--interval", type=float, help="Segundos entre muestras del modo --daemon")
+    args = parser.parse_args()
+    
     print("=" * 60)
     print("🗄️  MONITOR DE BASE DE DATOS CHROMA")
     print("=" * 60)
@@ -356,6 +454,21 @@ def main():
     try:
         monitor = DatabaseMonitor()
         
+        if args.daemon:
+            monitor.start_daemon(args.interval)
+            try:
+                if args.metrics:
+                    monitor.serve_metrics(args.host, args.port)
+                else:
+                    monitor.interactive_mode()
+            finally:
+                monitor.stop_daemon()
+            return
+        
+        if args.metrics:
+            monitor.serve_metrics(args.host, args.port)
+            return
+        
         # Ejecutar verificaciones automáticas
         monitor.get_basic_stats()
         monitor.get_detailed_stats()
@@ -9,7 +9,10 @@ from langchain_chroma import Chroma
 from langchain_core.documents import Document
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_ollama import OllamaEmbeddings
+
+from cliente_ollama import crear_embeddings
+from trazas import EmbeddingsTrazados, obtener_tracer
+from estadisticas_coleccion import obtener_estadisticas
 
 # Configuración de la base de datos Chroma
 CHROMA_HOST = "localhost"
@@ -38,11 +41,13 @@ def cargar_documentos_pdf(ruta_documentos):
     
     print(f"Encontrados {len(archivos_pdf)} archivos PDF:")
     
+    tracer = obtener_tracer()
     for archivo in archivos_pdf:
         try:
             print(f"Procesando: {archivo.name}")
-            loader = PyPDFLoader(str(archivo))
-            documentos.extend(loader.load())
+            with tracer.span("pdf_load", archivo=archivo.name):
+                loader = PyPDFLoader(str(archivo))
+                documentos.extend(loader.load())
             print(f"✓ {archivo.name} cargado exitosamente")
         except Exception as e:
             print(f"✗ Error al cargar {archivo.name}: {e}")
@@ -189,6 +194,7 @@ def dividir_documentos(documentos, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OV
     Utiliza separadores específicos para diferentes tipos de contenido
     """
     chunks_totales = []
+    tracer = obtener_tracer()
     
     for documento in documentos:
         # Analizar tipo de contenido
@@ -207,7 +213,8 @@ def dividir_documentos(documentos, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OV
         )
         
         # Dividir este documento específico
-        chunks_documento = text_splitter.split_documents([documento])
+        with tracer.span("split", tipo=tipo_contenido):
+            chunks_documento = text_splitter.split_documents([documento])
         chunks_totales.extend(chunks_documento)
         
         print(f"   - Chunks generados: {len(chunks_documento)}")
@@ -220,11 +227,12 @@ def inicializar_chroma():
     Inicializa la conexión con Chroma
     """
     try:
-        # Usar OllamaEmbeddings con el modelo nomic-embed-text
-        embeddings = OllamaEmbeddings(
-            model=OLLAMA_MODEL,
+        # Embeddings de Ollama con el modelo nomic-embed-text (uno o varios servidores)
+        # (envuelto para medir el tiempo de embeddings por separado de la inserción)
+        embeddings = EmbeddingsTrazados(crear_embeddings(
+            OLLAMA_MODEL,
             base_url=f"http://{OLLAMA_HOST}:{OLLAMA_PORT}"
-        )
+        ), obtener_tracer())
         
         # Inicializar Chroma con configuración simplificada
         chroma_client = Chroma(
@@ -239,8 +247,8 @@ def inicializar_chroma():
         print("Intentando con configuración alternativa...")
         
         # Configuración alternativa sin persist_directory
-        embeddings = OllamaEmbeddings(
-            model=OLLAMA_MODEL,
+        embeddings = crear_embeddings(
+            OLLAMA_MODEL,
             base_url=f"http://{OLLAMA_HOST}:{OLLAMA_PORT}"
         )
         chroma_client = Chroma(
@@ -256,9 +264,18 @@ def vectorizar_documentos(chroma_client, chunks):
     """
     try:
         # Agregar documentos a la base de datos
-        chroma_client.add_documents(chunks)
+        # (span exclusivo: descuenta el tiempo de los embeddings calculados dentro)
+        with obtener_tracer().span("upsert", exclusivo=True, chunks=len(chunks)):
+            ids = chroma_client.add_documents(chunks)
         print(f"✓ {len(chunks)} chunks vectorizados exitosamente")
         
+        # Actualizar las estadísticas de la colección con los chunks insertados
+        estadisticas = obtener_estadisticas()
+        if estadisticas:
+            estadisticas.registrar_alta(
+                ids, [chunk.metadata for chunk in chunks], [chunk.page_content for chunk in chunks]
+            )
+        
         # Intentar persistir los cambios (puede no estar disponible en todas las versiones)
         try:
             chroma_client.persist()
@@ -315,5 +332,10 @@ def main():
     print(f"Base de datos: {CHROMA_HOST}:{CHROMA_PORT}")
     print(f"Modelo utilizado: {OLLAMA_MODEL}")
 
+    tracer = obtener_tracer()
+    if tracer.habilitado:
+        tracer.imprimir_resumen()
+        print(f"\n📄 Trazas exportadas a: {tracer.exportar_json()}")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,259 @@
+"""
+Enrutador de modelos para el sistema RAG
+Elige el LLM de cada consulta según la complejidad de la pregunta, el tamaño
+del contexto y la latencia objetivo; baja a un modelo más rápido si la cola
+del planificador está saturada y registra cada decisión para ajustar la política
+"""
+
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import urllib.request
+from collections import defaultdict, deque
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import get_router_config, get_scheduler_config
+
+# Palabras que suelen indicar preguntas que requieren razonamiento o síntesis
+MARCADORES_COMPLEJIDAD = [
+    "compara", "comparación", "diferencia", "diferencias", "ventajas", "desventajas",
+    "por qué", "porqué", "explica", "analiza", "relación", "impacto", "evalúa",
+    "resume", "resumen", "cómo funciona", "pros", "contras", "versus", " vs"
+]
+
+# Peso de la corrección aprendida a partir de las latencias observadas
+PESO_CORRECCION = 0.3
+
+def estimar_complejidad(pregunta):
+    """
+    Estima la complejidad de una pregunta entre 0 (factual corta) y 1 (análisis)
+    a partir de su longitud, marcadores de razonamiento y número de preguntas
+    """
+    texto = pregunta.lower()
+    palabras = re.findall(r"\w+", texto)
+    
+    puntaje = min(len(palabras) / 30.0, 1.0) * 0.4
+    marcadores = sum(1 for m in MARCADORES_COMPLEJIDAD if m in texto)
+    puntaje += min(marcadores / 2.0, 1.0) * 0.4
+    preguntas = max(texto.count("?"), 1)
+    conjunciones = len(re.findall(r"\b(y|además|también)\b", texto))
+    puntaje += min((preguntas - 1 + conjunciones * 0.5) / 2.0, 1.0) * 0.2
+    
+    return round(min(puntaje, 1.0), 3)
+
+def profundidad_cola_planificador(timeout_s=0.3):
+    """
+    Consulta /metrics del planificador y retorna la profundidad de la cola
+    (None si el planificador no está activo o no responde)
+    """
+    config = get_scheduler_config()
+    if not config["enabled"]:
+        return None
+    try:
+        with urllib.request.urlopen(f"{config['url']}/metrics", timeout=timeout_s) as respuesta:
+            return json.loads(respuesta.read())["profundidad_cola"]
+    except Exception:
+        return None
+
+class ModelRouter:
+    """Selecciona el modelo por consulta y registra decisiones y latencias"""
+    
+    def __init__(self, modelos=None, latencia_objetivo_ms=None, profundidad_fallback=None, ruta_log=None,
+                 exploracion=None):
+        """Inicializa los modelos disponibles y carga las correcciones del registro"""
+        config = get_router_config()
+        self.modelos = modelos or config["models"]
+        self.latencia_objetivo_ms = latencia_objetivo_ms or config["latency_target_ms"]
+        self.profundidad_fallback = profundidad_fallback or config["queue_fallback_depth"]
+        self.ruta_log = ruta_log or config["log_path"]
+        self.max_registro = config["log_max_entries"]
+        self.limite_correccion = config["correction_limit"]
+        self.exploracion = config["exploration_rate"] if exploracion is None else exploracion
+        
+        # Factor observado/estimado por modelo (1.0 = la estimación es exacta)
+        self.correcciones = {m["name"]: 1.0 for m in self.modelos}
+        # Modelos que ya respondieron en este proceso (la primera llamada incluye la carga del modelo)
+        self._calentados = set()
+        self._lock = threading.Lock()
+        self._cargar_correcciones()
+    
+    def _cargar_correcciones(self):
+        """
+        Reconstruye los factores de corrección a partir de las últimas decisiones
+        del registro (y lo recorta a ese tamaño si ha crecido de más)
+        """
+        decisiones = leer_registro(self.ruta_log, ultimas=self.max_registro, recortar=True)
+        for decision in decisiones:
+            if decision.get("error") or decision.get("calentamiento") or not decision.get("latencia_real_ms"):
+                continue
+            if decision.get("latencia_estimada_base_ms"):
+                self._actualizar_correccion(
+                    decision["modelo"], decision["latencia_real_ms"], decision["latencia_estimada_base_ms"]
+                )
+    
+    def _actualizar_correccion(self, modelo, real_ms, estimada_base_ms):
+        if modelo not in self.correcciones or estimada_base_ms <= 0:
+            return
+        # Una muestra atípica (carga en frío, pausa del servidor) no puede mover la corrección más del límite
+        ratio = min(max(real_ms / estimada_base_ms, 1 / self.limite_correccion), self.limite_correccion)
+        self.correcciones[modelo] = (1 - PESO_CORRECCION) * self.correcciones[modelo] + PESO_CORRECCION * ratio
+    
+    def _estimacion_base(self, modelo, tokens_contexto):
+        return modelo["base_ms"] + modelo["ms_per_1k_tokens"] * tokens_contexto / 1000.0
+    
+    def estimar_latencia(self, nombre, tokens_contexto):
+        """Latencia estimada (ms) de un modelo con la corrección aprendida"""
+        modelo = next(m for m in self.modelos if m["name"] == nombre)
+        return self._estimacion_base(modelo, tokens_contexto) * self.correcciones[nombre]
+    
+    def elegir(self, pregunta, tokens_contexto, profundidad_cola=None):
+        """
+        Elige el modelo para una consulta y retorna la decisión como dict
+        1. La complejidad fija el nivel deseado (más complejo = modelo más capaz)
+        2. Si la cola está saturada se baja un nivel
+        3. Se baja de nivel mientras la latencia estimada supere el objetivo
+        """
+        complejidad = estimar_complejidad(pregunta)
+        if profundidad_cola is None:
+            profundidad_cola = profundidad_cola_planificador()
+        
+        ultimo = len(self.modelos) - 1
+        nivel_deseado = min(int(complejidad * len(self.modelos)), ultimo)
+        nivel = nivel_deseado
+        motivos = [f"complejidad {complejidad:.2f}"]
+        
+        if profundidad_cola is not None and profundidad_cola >= self.profundidad_fallback and nivel > 0:
+            nivel -= 1
+            motivos.append(f"cola profunda ({profundidad_cola})")
+        
+        nivel_sin_latencia = nivel
+        while nivel > 0 and self.estimar_latencia(self.modelos[nivel]["name"], tokens_contexto) > self.latencia_objetivo_ms:
+            nivel -= 1
+            motivos.append("latencia objetivo")
+        
+        # De vez en cuando se usa el modelo degradado para seguir midiéndolo: si solo
+        # se midiera el elegido, una corrección pesimista no se corregiría nunca
+        if nivel < nivel_sin_latencia and random.random() < self.exploracion:
+            nivel = nivel_sin_latencia
+            motivos.append("exploración")
+        
+        modelo = self.modelos[nivel]
+        return {
+            "timestamp": time.time(),
+            "pregunta_hash": hashlib.sha256(pregunta.encode("utf-8")).hexdigest()[:16],
+            "longitud_pregunta": len(pregunta),
+            "complejidad": complejidad,
+            "tokens_contexto": tokens_contexto,
+            "profundidad_cola": profundidad_cola,
+            "modelo_deseado": self.modelos[nivel_deseado]["name"],
+            "modelo": modelo["name"],
+            "motivo": ", ".join(motivos),
+            "latencia_objetivo_ms": self.latencia_objetivo_ms,
+            "latencia_estimada_ms": round(self.estimar_latencia(modelo["name"], tokens_contexto), 1),
+            "latencia_estimada_base_ms": round(self._estimacion_base(modelo, tokens_contexto), 1)
+        }
+    
+    def registrar(self, decision, latencia_real_ms, error=None):
+        """
+        Guarda la decisión con la latencia observada y actualiza la corrección del modelo
+        La primera respuesta de cada modelo en el proceso se registra como calentamiento y no corrige
+        """
+        decision = dict(decision, latencia_real_ms=round(latencia_real_ms, 1), error=error)
+        with self._lock:
+            if error is None and decision["modelo"] not in self._calentados:
+                self._calentados.add(decision["modelo"])
+                decision["calentamiento"] = True
+            elif error is None:
+                self._actualizar_correccion(
+                    decision["modelo"], latencia_real_ms, decision["latencia_estimada_base_ms"]
+                )
+            with open(self.ruta_log, "a", encoding="utf-8") as f:
+                f.write(json.dumps(decision, ensure_ascii=False) + "\n")
+        return decision
+
+def leer_registro(ruta_log, ultimas=None, recortar=False):
+    """
+    Lee las decisiones registradas (ignora líneas corruptas)
+    Con ultimas solo retorna las más recientes; con recortar además reescribe
+    el registro con ellas si tenía más
+    """
+    if not os.path.exists(ruta_log):
+        return []
+    lineas = deque(maxlen=ultimas)
+    total = 0
+    with open(ruta_log, encoding="utf-8") as f:
+        for linea in f:
+            lineas.append(linea)
+            total += 1
+    
+    if recortar and ultimas and total > ultimas:
+        temporal = f"{ruta_log}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            f.writelines(lineas)
+        os.replace(temporal, ruta_log)
+    
+    decisiones = []
+    for linea in lineas:
+        try:
+            decisiones.append(json.loads(linea))
+        except ValueError:
+            continue
+    return decisiones
+
+def resumir_registro(ruta_log=None):
+    """Agrupa las decisiones por modelo: latencias, error de estimación y cumplimiento del objetivo"""
+    ruta_log = ruta_log or get_router_config()["log_path"]
+    por_modelo = defaultdict(list)
+    for decision in leer_registro(ruta_log):
+        if decision.get("latencia_real_ms") is not None and not decision.get("error"):
+            por_modelo[decision["modelo"]].append(decision)
+    
+    resumen = {}
+    for modelo, decisiones in por_modelo.items():
+        reales = sorted(d["latencia_real_ms"] for d in decisiones)
+        errores = [d["latencia_real_ms"] / d["latencia_estimada_ms"] for d in decisiones if d["latencia_estimada_ms"]]
+        resumen[modelo] = {
+            "consultas": len(decisiones),
+            "p50_ms": reales[len(reales) // 2],
+            "p95_ms": reales[min(len(reales) - 1, int(len(reales) * 0.95))],
+            "real_vs_estimada": sum(errores) / len(errores) if errores else None,
+            "dentro_objetivo": sum(d["latencia_real_ms"] <= d["latencia_objetivo_ms"] for d in decisiones) / len(decisiones),
+            "degradadas": sum(d["modelo"] != d["modelo_deseado"] for d in decisiones)
+        }
+    return resumen
+
+def main():
+    """Muestra el resumen del registro de decisiones del enrutador"""
+    config = get_router_config()
+    print("=" * 60)
+    print("🧭 ENRUTADOR DE MODELOS - RESUMEN DE DECISIONES")
+    print("=" * 60)
+    print(f"🎯 Latencia objetivo: {config['latency_target_ms']}ms")
+    print(f"📄 Registro: {config['log_path']}")
+    
+    resumen = resumir_registro(config["log_path"])
+    if not resumen:
+        print("⚠️  No hay decisiones registradas todavía")
+        return
+    
+    router = ModelRouter()
+    for modelo, datos in resumen.items():
+        print(f"\n🤖 {modelo}: {datos['consultas']} consultas")
+        print(f"   - Latencia real: p50 {datos['p50_ms']:.0f}ms, p95 {datos['p95_ms']:.0f}ms")
+        if datos["real_vs_estimada"] is not None:
+            print(f"   - Real / estimada: {datos['real_vs_estimada']:.2f} "
+                  f"(corrección actual {router.correcciones.get(modelo, 1.0):.2f})")
+        print(f"   - Dentro del objetivo: {datos['dentro_objetivo']:.0%}")
+        print(f"   - Degradadas desde un modelo mayor: {datos['degradadas']}")
+    
+    print("\n💡 Ajusta base_ms / ms_per_1k_tokens en MODEL_ROUTER_MODELS si real / estimada se aleja de 1.0")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Recorrido paginado de la colección de Chroma
+Lee la colección en lotes de tamaño fijo y solo con los campos pedidos
+(por ejemplo solo metadatos), para que la memoria no dependa del tamaño de la colección
+"""
+
+import os
+import sys
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import get_scan_config
+
+# Campos que Chroma acepta en include (los IDs siempre se retornan)
+CAMPOS_VALIDOS = ("documents", "metadatas", "embeddings")
+
+def obtener_coleccion(cliente):
+    """Acepta un cliente Chroma de LangChain o una colección de chromadb"""
+    return getattr(cliente, "_collection", cliente)
+
+def _validar_campos(include):
+    campos = list(include or [])
+    invalidos = [c for c in campos if c not in CAMPOS_VALIDOS]
+    if invalidos:
+        raise ValueError(f"Campos no válidos: {invalidos} (usar {', '.join(CAMPOS_VALIDOS)})")
+    return campos
+
+def iterar_lotes(cliente, include=("metadatas",), tamano_lote=None, where=None, limite=None):
+    """
+    Recorre la colección en lotes de tamano_lote registros
+    Cada lote es un dict como el de collection.get(): "ids" y los campos pedidos
+    """
+    coleccion = obtener_coleccion(cliente)
+    campos = _validar_campos(include)
+    tamano_lote = tamano_lote or get_scan_config()["batch_size"]
+    
+    offset = 0
+    while limite is None or offset < limite:
+        pedir = tamano_lote if limite is None else min(tamano_lote, limite - offset)
+        kwargs = {"limit": pedir, "offset": offset, "include": campos}
+        if where:
+            kwargs["where"] = where
+        lote = coleccion.get(**kwargs)
+        
+        ids = lote.get("ids") or []
+        if not ids:
+            return
+        yield lote
+        
+        offset += len(ids)
+        if len(ids) < pedir:
+            return
+
+def escanear(cliente, include=("metadatas",), tamano_lote=None, where=None, limite=None):
+    """
+    Recorre la colección registro a registro
+    Cada registro es un dict con "id" y los campos pedidos en singular
+    ("document", "metadata", "embedding")
+    """
+    for lote in iterar_lotes(cliente, include, tamano_lote, where, limite):
+        for i, id_registro in enumerate(lote["ids"]):
+            registro = {"id": id_registro}
+            for campo in include:
+                valores = lote.get(campo)
+                registro[campo[:-1]] = valores[i] if valores is not None else None
+            yield registro
+
+def primer_registro(cliente, include=("documents", "metadatas")):
+    """Retorna el primer registro de la colección (o None si está vacía)"""
+    return next(escanear(cliente, include, tamano_lote=1, limite=1), None)
+
+def contar_metadatos(cliente, campo, tamano_lote=None):
+    """Cuenta cuántos registros tiene cada valor de un campo de metadatos"""
+    conteo = {}
+    for registro in escanear(cliente, include=("metadatas",), tamano_lote=tamano_lote):
+        metadata = registro["metadata"]
+        if metadata and campo in metadata:
+            conteo[metadata[campo]] = conteo.get(metadata[campo], 0) + 1
+    return conteo
@@ -0,0 +1,232 @@
+"""
+Estadísticas de la colección mantenidas al escribir
+Guarda en un SQLite auxiliar los chunks por fuente, por página y las longitudes,
+actualizándolos al vectorizar y al eliminar, para leerlas sin recorrer la colección
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import get_collection_stats_config, get_chroma_config
+from escaneo import iterar_lotes, obtener_coleccion
+
+class CollectionStats:
+    """Estadísticas incrementales de la colección persistidas en SQLite"""
+    
+    def __init__(self, path=None):
+        """Abre (o crea) el archivo de estadísticas"""
+        self.path = path or get_collection_stats_config()["path"]
+        directorio = os.path.dirname(self.path)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                id TEXT PRIMARY KEY,
+                source TEXT,
+                page INTEGER,
+                longitud INTEGER NOT NULL,
+                con_metadatos INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS fuentes (
+                source TEXT PRIMARY KEY,
+                chunks INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS paginas (
+                page INTEGER PRIMARY KEY,
+                chunks INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS longitudes (
+                longitud INTEGER PRIMARY KEY,
+                chunks INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS totales (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                chunks INTEGER NOT NULL,
+                caracteres INTEGER NOT NULL,
+                con_metadatos INTEGER NOT NULL,
+                actualizado REAL NOT NULL
+            );
+            INSERT OR IGNORE INTO totales (id, chunks, caracteres, con_metadatos, actualizado)
+                VALUES (1, 0, 0, 0, 0);
+        """)
+        self._conn.commit()
+    
+    def _sumar(self, tabla, campo, valor, delta):
+        """Suma delta al contador de una fila y la elimina si llega a cero"""
+        self._conn.execute(
+            f"INSERT INTO {tabla} ({campo}, chunks) VALUES (?, ?) "
+            f"ON CONFLICT({campo}) DO UPDATE SET chunks = chunks + excluded.chunks",
+            (valor, delta)
+        )
+        self._conn.execute(f"DELETE FROM {tabla} WHERE {campo} = ? AND chunks <= 0", (valor,))
+    
+    def _aplicar(self, source, page, longitud, con_metadatos, signo):
+        if source is not None:
+            self._sumar("fuentes", "source", source, signo)
+        if page is not None:
+            self._sumar("paginas", "page", page, signo)
+        self._sumar("longitudes", "longitud", longitud, signo)
+        self._conn.execute(
+            "UPDATE totales SET chunks = chunks + ?, caracteres = caracteres + ?, "
+            "con_metadatos = con_metadatos + ?, actualizado = ? WHERE id = 1",
+            (signo, signo * longitud, signo * con_metadatos, time.time())
+        )
+    
+    def _quitar(self, chunk_id):
+        fila = self._conn.execute(
+            "SELECT source, page, longitud, con_metadatos FROM chunks WHERE id = ?", (chunk_id,)
+        ).fetchone()
+        if fila is None:
+            return False
+        self._aplicar(*fila, signo=-1)
+        self._conn.execute("DELETE FROM chunks WHERE id = ?", (chunk_id,))
+        return True
+    
+    def registrar_alta(self, ids, metadatas, documentos):
+        """Suma los chunks insertados (si un ID ya existía se reemplaza su aportación)"""
+        with self._lock:
+            for chunk_id, metadata, documento in zip(ids, metadatas, documentos):
+                self._quitar(chunk_id)
+                metadata = metadata or {}
+                source = metadata.get("source")
+                page = metadata.get("page")
+                longitud = len(documento or "")
+                con_metadatos = 1 if metadata else 0
+                
+                self._conn.execute(
+                    "INSERT INTO chunks (id, source, page, longitud, con_metadatos) VALUES (?, ?, ?, ?, ?)",
+                    (chunk_id, source, page, longitud, con_metadatos)
+                )
+                self._aplicar(source, page, longitud, con_metadatos, signo=1)
+            self._conn.commit()
+    
+    def registrar_baja(self, ids):
+        """Resta los chunks eliminados y retorna cuántos estaban registrados"""
+        with self._lock:
+            quitados = sum(1 for chunk_id in ids if self._quitar(chunk_id))
+            self._conn.commit()
+        return quitados
+    
+    def limpiar(self):
+        """Deja las estadísticas vacías (p. ej. al eliminar la colección)"""
+        with self._lock:
+            for tabla in ("chunks", "fuentes", "paginas", "longitudes"):
+                self._conn.execute(f"DELETE FROM {tabla}")
+            self._conn.execute(
+                "UPDATE totales SET chunks = 0, caracteres = 0, con_metadatos = 0, actualizado = ? WHERE id = 1",
+                (time.time(),)
+            )
+            self._conn.commit()
+    
+    def resumen(self):
+        """
+        Retorna totales, longitud mínima/promedio/máxima y chunks por fuente y página
+        Los totales y extremos se leen de filas indexadas; las distribuciones
+        crecen con el número de fuentes y páginas, no con el de chunks
+        """
+        with self._lock:
+            total, caracteres, con_metadatos, actualizado = self._conn.execute(
+                "SELECT chunks, caracteres, con_metadatos, actualizado FROM totales WHERE id = 1"
+            ).fetchone()
+            minimo = self._conn.execute("SELECT MIN(longitud) FROM longitudes").fetchone()[0]
+            maximo = self._conn.execute("SELECT MAX(longitud) FROM longitudes").fetchone()[0]
+            fuentes = dict(self._conn.execute("SELECT source, chunks FROM fuentes").fetchall())
+            paginas = dict(self._conn.execute("SELECT page, chunks FROM paginas").fetchall())
+        
+        return {
+            "total": total,
+            "con_metadatos": con_metadatos,
+            "avg_length": caracteres / total if total else 0.0,
+            "min_length": minimo,
+            "max_length": maximo,
+            "chunks_por_fuente": fuentes,
+            "chunks_por_pagina": paginas,
+            "actualizado": actualizado
+        }
+    
+    def sincronizado(self, cliente):
+        """Indica si el total registrado coincide con el conteo real de la colección"""
+        with self._lock:
+            total = self._conn.execute("SELECT chunks FROM totales WHERE id = 1").fetchone()[0]
+        return total == obtener_coleccion(cliente).count()
+    
+    def reconstruir(self, cliente, tamano_lote=None):
+        """Recalcula las estadísticas recorriendo la colección por lotes"""
+        self.limpiar()
+        total = 0
+        for lote in iterar_lotes(cliente, include=("documents", "metadatas"), tamano_lote=tamano_lote):
+            self.registrar_alta(lote["ids"], lote["metadatas"], lote["documents"])
+            total += len(lote["ids"])
+        return total
+    
+    def cerrar(self):
+        """Cierra la conexión a SQLite"""
+        with self._lock:
+            self._conn.close()
+
+_estadisticas = None
+
+def obtener_estadisticas():
+    """Retorna las estadísticas compartidas del proceso (None si están desactivadas)"""
+    global _estadisticas
+    if not get_collection_stats_config()["enabled"]:
+        return None
+    if _estadisticas is None:
+        _estadisticas = CollectionStats()
+    return _estadisticas
+
+def cerrar_estadisticas():
+    """Cierra las estadísticas compartidas (p. ej. antes de borrar el directorio de datos)"""
+    global _estadisticas
+    if _estadisticas is not None:
+        _estadisticas.cerrar()
+        _estadisticas = None
+
+def main():
+    """Muestra o reconstruye las estadísticas de la colección"""
+    import chromadb
+    
+    parser = argparse.ArgumentParser(description="Estadísticas incrementales de la colección")
+    parser.add_argument("comando", choices=["show", "rebuild"], nargs="?", default="show")
+    args = parser.parse_args()
+    
+    config = get_chroma_config()
+    coleccion = chromadb.PersistentClient(path=config["persist_directory"]).get_or_create_collection(
+        config["collection_name"]
+    )
+    stats = CollectionStats()
+    
+    print("=" * 60)
+    print("📊 ESTADÍSTICAS DE LA COLECCIÓN")
+    print("=" * 60)
+    
+    if args.comando == "rebuild":
+        inicio = time.time()
+        total = stats.reconstruir(coleccion)
+        print(f"🔄 Estadísticas reconstruidas: {total} chunks en {time.time() - inicio:.2f}s")
+    elif not stats.sincronizado(coleccion):
+        print(f"⚠️  Las estadísticas no coinciden con la colección ({coleccion.count()} chunks)")
+        print("💡 Ejecuta: python estadisticas_coleccion.py rebuild")
+    
+    resumen = stats.resumen()
+    print(f"📄 Chunks: {resumen['total']}")
+    if resumen["total"]:
+        print(f"📏 Longitud: mín {resumen['min_length']}, promedio {resumen['avg_length']:.1f}, "
+              f"máx {resumen['max_length']} caracteres")
+        print(f"📄 Páginas únicas: {len(resumen['chunks_por_pagina'])}")
+        print(f"📁 Chunks por fuente:")
+        for source, chunks in sorted(resumen["chunks_por_fuente"].items()):
+            print(f"   - {os.path.basename(source)}: {chunks}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+"""
+Exportación e importación columnar de colecciones
+Vuelca IDs, textos, metadatos y vectores por lotes a un único archivo compacto,
+independiente de los archivos internos de Chroma (HNSW, esquema de SQLite), y lo
+carga en otra base sin volver a calcular embeddings (no usa Ollama).
+
+Formato (.chromacol):
+    MAGIA | grupo 1 | grupo 2 | ... | pie (JSON + zlib) | longitud del pie (uint64) | MAGIA
+Cada grupo de filas guarda las columnas ids, documents, metadatas y embeddings
+comprimidas con zlib por separado; el pie tiene la colección, su configuración HNSW,
+la dimensión, el tipo de los vectores (float32 o float16) y, por grupo, el
+desplazamiento, la longitud y el CRC32 de cada columna
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from compactacion import parametros_coleccion
+from config import get_chroma_config, get_collection_export_config
+from escaneo import iterar_lotes, obtener_coleccion
+from estadisticas_coleccion import obtener_estadisticas
+
+MAGIA = b"CHRCOL01"
+VERSION_FORMATO = 1
+EXTENSION = ".chromacol"
+
+# Tipos de los vectores en disco (little-endian); al importar siempre se pasan a float32
+TIPOS_VECTOR = {"float32": "<f4", "float16": "<f2"}
+
+def _con_anticipacion(iterable):
+    """
+    Pide el siguiente elemento en otro hilo mientras se procesa el actual: la lectura
+    de Chroma (o del archivo) se solapa con la compresión y la escritura
+    """
+    iterador = iter(iterable)
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="anticipacion") as ejecutor:
+        siguiente = ejecutor.submit(next, iterador, None)
+        while True:
+            elemento = siguiente.result()
+            if elemento is None:
+                return
+            siguiente = ejecutor.submit(next, iterador, None)
+            yield elemento
+
+# ----------------------------------------------------------------------
+# Codificación de columnas
+# ----------------------------------------------------------------------
+
+def _codificar_textos(valores):
+    """Columna de textos: máscara de nulos (uint8), desplazamientos (int64) y UTF-8 concatenado"""
+    nulos = np.fromiter((valor is None for valor in valores), dtype=np.uint8, count=len(valores))
+    datos = [(valor or "").encode("utf-8") for valor in valores]
+    desplazamientos = np.zeros(len(datos) + 1, dtype="<i8")
+    np.cumsum([len(dato) for dato in datos], out=desplazamientos[1:])
+    return nulos.tobytes() + desplazamientos.tobytes() + b"".join(datos)
+
+def _decodificar_textos(bytes_, filas):
+    nulos = np.frombuffer(bytes_, dtype=np.uint8, count=filas)
+    desplazamientos = np.frombuffer(bytes_, dtype="<i8", count=filas + 1, offset=filas).tolist()
+    datos = memoryview(bytes_)[filas + (filas + 1) * 8:]
+    return [
+        None if nulos[i] else str(datos[desplazamientos[i]:desplazamientos[i + 1]], "utf-8")
+        for i in range(filas)
+    ]
+
+def _codificar_lote(lote, tipo_vector):
+    vectores = np.asarray(lote["embeddings"], dtype=np.float32)
+    en_disco = vectores.astype(TIPOS_VECTOR[tipo_vector])
+    if not np.isfinite(en_disco).all():
+        raise ValueError(f"Hay vectores fuera del rango de {tipo_vector}; exporta sin --float16")
+    metadatas = [
+        None if metadata is None else json.dumps(metadata, ensure_ascii=False)
+        for metadata in lote["metadatas"]
+    ]
+    return {
+        "ids": _codificar_textos(lote["ids"]),
+        "documents": _codificar_textos(lote["documents"]),
+        "metadatas": _codificar_textos(metadatas),
+        "embeddings": en_disco.tobytes()
+    }, vectores.shape[1]
+
+def _decodificar_lote(columnas, filas, dimension, tipo_vector):
+    vectores = np.frombuffer(columnas["embeddings"], dtype=TIPOS_VECTOR[tipo_vector]).reshape(filas, dimension)
+    return {
+        "ids": _decodificar_textos(columnas["ids"], filas),
+        "documents": _decodificar_textos(columnas["documents"], filas),
+        "metadatas": [
+            None if metadata is None else json.loads(metadata)
+            for metadata in _decodificar_textos(columnas["metadatas"], filas)
+        ],
+        "embeddings": vectores.astype(np.float32)
+    }
+
+# ----------------------------------------------------------------------
+# Exportación
+# ----------------------------------------------------------------------
+
+def exportar(cliente, ruta, float16=None, tamano_lote=None, nivel=None):
+    """
+    Escribe la colección en `ruta` grupo a grupo (en memoria solo hay un lote);
+    el archivo aparece completo o no aparece (se escribe en .tmp y se renombra)
+    """
+    config = get_collection_export_config()
+    float16 = config["float16"] if float16 is None else float16
+    tamano_lote = tamano_lote or config["batch_size"]
+    nivel = config["compression_level"] if nivel is None else nivel
+    tipo_vector = "float16" if float16 else "float32"
+    coleccion = obtener_coleccion(cliente)
+    
+    inicio = time.perf_counter()
+    grupos = []
+    dimension = None
+    temporal = f"{ruta}.tmp"
+    try:
+        with open(temporal, "wb") as f:
+            f.write(MAGIA)
+            lotes = iterar_lotes(coleccion, include=("embeddings", "documents", "metadatas"),
+                                 tamano_lote=tamano_lote)
+            for lote in _con_anticipacion(lotes):
+                columnas, dimension = _codificar_lote(lote, tipo_vector)
+                ubicaciones = {}
+                for nombre, datos in columnas.items():
+                    comprimido = zlib.compress(datos, nivel)
+                    ubicaciones[nombre] = [f.tell(), len(comprimido), zlib.crc32(comprimido)]
+                    f.write(comprimido)
+                grupos.append({"filas": len(lote["ids"]), "columnas": ubicaciones})
+            
+            cabecera = {
+                "formato": VERSION_FORMATO,
+                "coleccion": coleccion.name,
+                "parametros": parametros_coleccion(coleccion),
+                "dimension": dimension,
+                "tipo_vector": tipo_vector,
+                "filas": sum(grupo["filas"] for grupo in grupos),
+                "exportado": datetime.now().isoformat(timespec="seconds"),
+                "grupos": grupos
+            }
+            pie = zlib.compress(json.dumps(cabecera, ensure_ascii=False).encode("utf-8"))
+            f.write(pie)
+            f.write(struct.pack("<Q", len(pie)))
+            f.write(MAGIA)
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    
+    return {
+        "ruta": ruta,
+        "coleccion": coleccion.name,
+        "filas": cabecera["filas"],
+        "grupos": len(grupos),
+        "dimension": dimension,
+        "tipo_vector": tipo_vector,
+        "bytes": os.path.getsize(ruta),
+        "segundos": time.perf_counter() - inicio
+    }
+
+# ----------------------------------------------------------------------
+# Lectura e importación
+# ----------------------------------------------------------------------
+
+def leer_cabecera(ruta):
+    """Lee el pie del archivo (colección, parámetros y ubicación de cada grupo)"""
+    with open(ruta, "rb") as f:
+        if f.read(len(MAGIA)) != MAGIA:
+            raise ValueError(f"{ruta} no es una exportación de colección")
+        f.seek(-(8 + len(MAGIA)), os.SEEK_END)
+        longitud = struct.unpack("<Q", f.read(8))[0]
+        if f.read(len(MAGIA)) != MAGIA:
+            raise ValueError(f"{ruta} está incompleto (falta el pie)")
+        f.seek(-(8 + len(MAGIA) + longitud), os.SEEK_END)
+        cabecera = json.loads(zlib.decompress(f.read(longitud)).decode("utf-8"))
+    if cabecera["formato"] > VERSION_FORMATO:
+        raise ValueError(f"Formato {cabecera['formato']} no soportado (hasta {VERSION_FORMATO})")
+    return cabecera
+
+def iterar_grupos(ruta, cabecera=None):
+    """Recorre el archivo grupo a grupo; cada grupo es un dict como el de collection.get()"""
+    cabecera = cabecera or leer_cabecera(ruta)
+    with open(ruta, "rb") as f:
+        for numero, grupo in enumerate(cabecera["grupos"], 1):
+            columnas = {}
+            for nombre, (desplazamiento, longitud, crc) in grupo["columnas"].items():
+                f.seek(desplazamiento)
+                comprimido = f.read(longitud)
+                if zlib.crc32(comprimido) != crc:
+                    raise ValueError(f"Columna {nombre} dañada en el grupo {numero}")
+                columnas[nombre] = zlib.decompress(comprimido)
+            yield _decodificar_lote(columnas, grupo["filas"], cabecera["dimension"], cabecera["tipo_vector"])
+
+def importar(ruta, persist_directory=None, nombre=None, reemplazar=False, tamano_lote=None):
+    """
+    Crea la colección con la configuración exportada y carga los grupos con add()
+    usando los vectores del archivo. La carga se hace bajo un nombre temporal; solo
+    si termina completa se borra la colección anterior (con reemplazar) y se renombra
+    """
+    import chromadb
+    
+    cabecera = leer_cabecera(ruta)
+    chroma_config = get_chroma_config()
+    persist_directory = persist_directory or chroma_config["persist_directory"]
+    nombre = nombre or cabecera["coleccion"]
+    temporal = f"{nombre}.importando"
+    
+    inicio = time.perf_counter()
+    cliente = chromadb.PersistentClient(path=persist_directory)
+    existentes = {coleccion.name for coleccion in cliente.list_collections()}
+    if nombre in existentes and not reemplazar:
+        raise ValueError(f"La colección '{nombre}' ya existe en {persist_directory} (usar --reemplazar)")
+    if temporal in existentes:
+        cliente.delete_collection(temporal)
+    coleccion = cliente.create_collection(temporal, embedding_function=None, **cabecera["parametros"])
+    
+    lote = min(tamano_lote or get_collection_export_config()["batch_size"], cliente.get_max_batch_size())
+    try:
+        for grupo in _con_anticipacion(iterar_grupos(ruta, cabecera)):
+            for i in range(0, len(grupo["ids"]), lote):
+                coleccion.add(
+                    ids=grupo["ids"][i:i + lote],
+                    embeddings=grupo["embeddings"][i:i + lote],
+                    documents=grupo["documents"][i:i + lote],
+                    metadatas=grupo["metadatas"][i:i + lote]
+                )
+        
+        total = coleccion.count()
+        if total != cabecera["filas"]:
+            raise ValueError(f"Se importaron {total} chunks de {cabecera['filas']}")
+    except Exception:
+        cliente.delete_collection(temporal)
+        raise
+    
+    if nombre in existentes:
+        cliente.delete_collection(nombre)
+    coleccion.modify(name=nombre)
+    
+    # Las estadísticas incrementales son de la colección configurada: se recalculan
+    # con textos y metadatos (sin vectores)
+    if (os.path.abspath(persist_directory) == os.path.abspath(chroma_config["persist_directory"])
+            and nombre == chroma_config["collection_name"]):
+        estadisticas = obtener_estadisticas()
+        if estadisticas:
+            estadisticas.reconstruir(coleccion)
+    
+    return {
+        "ruta": ruta,
+        "directorio": persist_directory,
+        "coleccion": nombre,
+        "filas": total,
+        "tipo_vector": cabecera["tipo_vector"],
+        "bytes": os.path.getsize(ruta),
+        "segundos": time.perf_counter() - inicio
+    }
+
+def _mb(bytes_):
+    return bytes_ / (1024 * 1024)
+
+def imprimir_resultado(resultado, accion):
+    """Muestra el resultado de exportar() o importar()"""
+    segundos = max(resultado["segundos"], 1e-9)
+    print(f"✅ {accion} '{resultado['coleccion']}': {resultado['filas']} chunks en {resultado['segundos']:.2f}s "
+          f"({resultado['filas'] / segundos:.0f} chunks/s)")
+    print(f"   - Archivo: {resultado['ruta']} ({_mb(resultado['bytes']):.2f} MB, vectores {resultado['tipo_vector']})")
+    if "directorio" in resultado:
+        print(f"   - Destino: {resultado['directorio']}")
+
+def imprimir_cabecera(ruta):
+    """Muestra el contenido de un archivo exportado sin leer los grupos"""
+    cabecera = leer_cabecera(ruta)
+    print(f"📦 {ruta} ({_mb(os.path.getsize(ruta)):.2f} MB)")
+    print(f"   - Colección: {cabecera['coleccion']} ({cabecera['filas']} chunks, {len(cabecera['grupos'])} grupos)")
+    print(f"   - Vectores: {cabecera['dimension']} dimensiones en {cabecera['tipo_vector']}")
+    hnsw = (cabecera["parametros"].get("configuration") or {}).get("hnsw")
+    if hnsw:
+        print(f"   - HNSW: " + ", ".join(f"{clave}={valor}" for clave, valor in hnsw.items()))
+    print(f"   - Exportado: {cabecera['exportado']}")
+
+def main():
+    """Exporta, importa o describe una colección en formato columnar"""
+    config = get_collection_export_config()
+    chroma_config = get_chroma_config()
+    parser = argparse.ArgumentParser(description="Exportación/importación columnar de colecciones")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+    exportar_parser = subcomandos.add_parser("exportar", help="Exportar la colección a un archivo")
+    exportar_parser.add_argument("--salida", help=f"Archivo de salida (por defecto <colección>{EXTENSION})")
+    exportar_parser.add_argument("--coleccion", default=chroma_config["collection_name"])
+    exportar_parser.add_argument("--float16", action="store_true", default=config["float16"],
+                                 help="Guardar los vectores en float16")
+    importar_parser = subcomandos.add_parser("importar", help="Cargar un archivo exportado (sin Ollama)")
+    importar_parser.add_argument("archivo")
+    importar_parser.add_argument("--coleccion", help="Nombre de destino (por defecto el exportado)")
+    importar_parser.add_argument("--destino", help="Directorio de persistencia de destino")
+    importar_parser.add_argument("--reemplazar", action="store_true", help="Reemplazar la colección si existe")
+    info_parser = subcomandos.add_parser("info", help="Describir un archivo exportado")
+    info_parser.add_argument("archivo")
+    args = parser.parse_args()
+    
+    print("=" * 60)
+    print("📤 EXPORTACIÓN COLUMNAR DE COLECCIONES")
+    print("=" * 60)
+    
+    try:
+        if args.comando == "exportar":
+            import chromadb
+            
+            cliente = chromadb.PersistentClient(path=chroma_config["persist_directory"])
+            coleccion = cliente.get_collection(args.coleccion)
+            resultado = exportar(coleccion, args.salida or f"{args.coleccion}{EXTENSION}", float16=args.float16)
+            imprimir_resultado(resultado, "Exportada")
+        elif args.comando == "importar":
+            resultado = importar(args.archivo, args.destino, args.coleccion, args.reemplazar)
+            imprimir_resultado(resultado, "Importada")
+        else:
+            imprimir_cabecera(args.archivo)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Exportador de métricas del monitor en formato Prometheus
+Un hilo en segundo plano sondea la colección sin recorrerla (count, tamaño en
+disco por segmento, un embedding y una búsqueda de 1 resultado) y un servidor
+HTTP local sirve el último estado en /metrics (y el chequeo de salud en /health)
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import get_chroma_config, get_metrics_config
+from cache_respuestas import leer_contadores
+from escaneo import obtener_coleccion, primer_registro
+from estadisticas_coleccion import obtener_estadisticas
+from trazas import BUCKETS_MS, Histograma
+
+TEXTO_SONDEO = "health check"
+
+def tamano_por_segmento(directorio):
+    """
+    Bytes en disco por entrada del directorio de persistencia: cada subdirectorio
+    es un segmento (índice HNSW) y cada archivo suelto (chroma.sqlite3, estadísticas) otro
+    """
+    tamanos = {}
+    if not os.path.isdir(directorio):
+        return tamanos
+    for entrada in os.scandir(directorio):
+        if entrada.is_file():
+            tamanos[entrada.name] = entrada.stat().st_size
+        elif entrada.is_dir():
+            total = 0
+            for raiz, _, archivos in os.walk(entrada.path):
+                for archivo in archivos:
+                    try:
+                        total += os.path.getsize(os.path.join(raiz, archivo))
+                    except OSError:
+                        continue
+            tamanos[entrada.name] = total
+    return tamanos
+
+def _etiquetas(**etiquetas):
+    if not etiquetas:
+        return ""
+    pares = []
+    for nombre, valor in etiquetas.items():
+        valor = str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pares.append(f'{nombre}="{valor}"')
+    return "{" + ",".join(pares) + "}"
+
+class MetricsExporter:
+    """Sondea la base de datos periódicamente y expone el estado en texto de Prometheus"""
+    
+    def __init__(self, chroma_client, embeddings=None, persist_directory=None, intervalo_s=None,
+                 sondear_embeddings=None):
+        """Recibe el cliente Chroma (LangChain o chromadb) y opcionalmente el modelo de embeddings"""
+        config = get_metrics_config()
+        self.coleccion = obtener_coleccion(chroma_client)
+        self.embeddings = embeddings
+        self.persist_directory = persist_directory or get_chroma_config()["persist_directory"]
+        self.intervalo_s = intervalo_s or config["refresh_s"]
+        self.sondear_embeddings = config["probe_embeddings"] if sondear_embeddings is None else sondear_embeddings
+        
+        self.histogramas = {"query_embed": Histograma(), "vector_search": Histograma()}
+        self.estado = {}
+        self.sondeos = 0
+        self.fallos = 0
+        self._vector_sondeo = None
+        self._lock = threading.Lock()
+        self._detenido = threading.Event()
+        self._hilo = None
+    
+    def _registrar(self, etapa, duracion_ms):
+        with self._lock:
+            self.histogramas[etapa].registrar(duracion_ms)
+    
+    def _vector_para_busqueda(self):
+        """Vector de la consulta de sondeo: el embedding del texto o, sin Ollama, uno guardado"""
+        if self.embeddings is not None and self.sondear_embeddings:
+            inicio = time.perf_counter()
+            vector = self.embeddings.embed_query(TEXTO_SONDEO)
+            self._registrar("query_embed", (time.perf_counter() - inicio) * 1000)
+            return vector
+        if self._vector_sondeo is None:
+            registro = primer_registro(self.coleccion, include=("embeddings",))
+            self._vector_sondeo = list(registro["embedding"]) if registro else None
+        return self._vector_sondeo
+    
+    def sondear(self):
+        """Actualiza el estado con un sondeo barato (no recorre la colección)"""
+        estado = {
+            "salud": {"chroma": 0, "has_documents": 0, "embeddings": 0, "search": 0},
+            "documentos": None,
+            "disco": tamano_por_segmento(self.persist_directory),
+            "estadisticas": None,
+            "cache": leer_contadores()
+        }
+        fallo = False
+        
+        try:
+            estado["documentos"] = self.coleccion.count()
+            estado["salud"]["chroma"] = 1
+            estado["salud"]["has_documents"] = int(estado["documentos"] > 0)
+        except Exception:
+            fallo = True
+        
+        vector = None
+        try:
+            vector = self._vector_para_busqueda()
+            if vector is not None and self.embeddings is not None and self.sondear_embeddings:
+                estado["salud"]["embeddings"] = 1
+        except Exception:
+            fallo = True
+        
+        if vector is not None and estado["documentos"]:
+            try:
+                inicio = time.perf_counter()
+                self.coleccion.query(query_embeddings=[vector], n_results=1, include=[])
+                self._registrar("vector_search", (time.perf_counter() - inicio) * 1000)
+                estado["salud"]["search"] = 1
+            except Exception:
+                fallo = True
+        
+        estadisticas = obtener_estadisticas()
+        if estadisticas and estado["documentos"] is not None:
+            try:
+                sincronizado = estadisticas.sincronizado(self.coleccion)
+                resumen = estadisticas.resumen() if sincronizado else None
+                estado["estadisticas"] = {
+                    "sincronizado": int(sincronizado),
+                    "fuentes": len(resumen["chunks_por_fuente"]) if resumen else None,
+                    "paginas": len(resumen["chunks_por_pagina"]) if resumen else None
+                }
+            except Exception:
+                fallo = True
+        
+        estado["timestamp"] = time.time()
+        with self._lock:
+            self.estado = estado
+            self.sondeos += 1
+            self.fallos += int(fallo)
+        return estado
+    
+    def _bucle(self):
+        while not self._detenido.is_set():
+            try:
+                self.sondear()
+            except Exception:
+                with self._lock:
+                    self.fallos += 1
+            self._detenido.wait(self.intervalo_s)
+    
+    def iniciar(self):
+        """Arranca el sondeo en segundo plano"""
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._bucle, name="sondeo-metricas", daemon=True)
+            self._hilo.start()
+    
+    def detener(self):
+        """Detiene el sondeo"""
+        self._detenido.set()
+    
+    def _renderizar_histograma(self, lineas, nombre, etapa, histograma):
+        acumulado = 0
+        for limite, cantidad in zip(BUCKETS_MS, histograma.buckets):
+            acumulado += cantidad
+            lineas.append(f"{nombre}_bucket{_etiquetas(stage=etapa, le=limite / 1000)} {acumulado}")
+        lineas.append(f"{nombre}_bucket{_etiquetas(stage=etapa, le='+Inf')} {histograma.total}")
+        lineas.append(f"{nombre}_sum{_etiquetas(stage=etapa)} {histograma.suma_ms / 1000:.6f}")
+        lineas.append(f"{nombre}_count{_etiquetas(stage=etapa)} {histograma.total}")
+    
+    def renderizar(self):
+        """Retorna el último estado en formato de texto de Prometheus"""
+        with self._lock:
+            estado = dict(self.estado)
+            sondeos, fallos = self.sondeos, self.fallos
+            coleccion = self.coleccion.name
+        lineas = []
+        
+        def metrica(nombre, tipo, ayuda, muestras):
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+            for etiquetas, valor in muestras:
+                lineas.append(f"{nombre}{_etiquetas(**etiquetas)} {valor}")
+        
+        if estado.get("documentos") is not None:
+            metrica("rag_collection_documents", "gauge", "Chunks en la colección",
+                    [({"collection": coleccion}, estado["documentos"])])
+        
+        metrica("rag_disk_bytes", "gauge", "Bytes en disco por segmento del directorio de persistencia",
+                [({"segment": segmento}, tamano) for segmento, tamano in sorted(estado.get("disco", {}).items())])
+        
+        lineas.append("# HELP rag_probe_duration_seconds Latencia del sondeo por etapa")
+        lineas.append("# TYPE rag_probe_duration_seconds histogram")
+        with self._lock:
+            for etapa, histograma in self.histogramas.items():
+                self._renderizar_histograma(lineas, "rag_probe_duration_seconds", etapa, histograma)
+        
+        cache = estado.get("cache", {})
+        hits = {"respuestas": cache.get("respuestas_hits", 0), "semantica": cache.get("semantica_hits", 0)}
+        consultas = {
+            "respuestas": cache.get("respuestas_hits", 0) + cache.get("respuestas_misses", 0),
+            "semantica": cache.get("semantica_lookups", 0)
+        }
+        metrica("rag_cache_hits_total", "counter", "Aciertos acumulados de la caché",
+                [({"cache": nombre}, valor) for nombre, valor in hits.items()])
+        metrica("rag_cache_lookups_total", "counter", "Consultas acumuladas a la caché",
+                [({"cache": nombre}, valor) for nombre, valor in consultas.items()])
+        metrica("rag_cache_hit_ratio", "gauge", "Tasa de aciertos acumulada de la caché",
+                [({"cache": nombre}, round(hits[nombre] / consultas[nombre], 6) if consultas[nombre] else 0)
+                 for nombre in hits])
+        
+        metrica("rag_health", "gauge", "Resultado del último sondeo (1 = OK)",
+                [({"check": nombre}, valor) for nombre, valor in estado.get("salud", {}).items()])
+        
+        estadisticas = estado.get("estadisticas")
+        if estadisticas:
+            metrica("rag_collection_stats_in_sync", "gauge",
+                    "Las estadísticas incrementales coinciden con la colección",
+                    [({}, estadisticas["sincronizado"])])
+            if estadisticas["fuentes"] is not None:
+                metrica("rag_collection_sources", "gauge", "Documentos fuente en la colección",
+                        [({}, estadisticas["fuentes"])])
+                metrica("rag_collection_pages", "gauge", "Páginas distintas en la colección",
+                        [({}, estadisticas["paginas"])])
+        
+        metrica("rag_probes_total", "counter", "Sondeos realizados", [({}, sondeos)])
+        metrica("rag_probe_failures_total", "counter", "Sondeos con algún error", [({}, fallos)])
+        if estado.get("timestamp"):
+            metrica("rag_last_probe_timestamp_seconds", "gauge", "Hora del último sondeo",
+                    [({}, f"{estado['timestamp']:.3f}")])
+        return "\n".join(lineas) + "\n"
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Sirve /metrics con el estado del exportador y /health con el chequeo de salud"""
+    
+    exportador = None
+    salud = None
+    
+    def log_message(self, format, *args):
+        """Silencia el log por petición del servidor HTTP"""
+        pass
+    
+    def _responder(self, codigo, cuerpo, tipo):
+        self.send_response(codigo)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def do_GET(self):
+        ruta = self.path.split("?")[0]
+        if ruta == "/metrics":
+            cuerpo = self.exportador.renderizar().encode("utf-8")
+            self._responder(200, cuerpo, "text/plain; version=0.0.4; charset=utf-8")
+        elif ruta == "/health" and self.salud is not None:
+            resultado = self.salud.verificar()
+            cuerpo = json.dumps(resultado, ensure_ascii=False).encode("utf-8")
+            self._responder(200 if resultado["ok"] else 503, cuerpo, "application/json; charset=utf-8")
+        else:
+            self.send_error(404)
+
+def crear_servidor(exportador, host=None, port=None, salud=None):
+    """Crea (sin arrancar) el servidor HTTP de métricas; con salud (HealthChecker) sirve también /health"""
+    config = get_metrics_config()
+    handler = type("MetricsHandlerConfigurado", (MetricsHandler,), {"exportador": exportador, "salud": salud})
+    servidor = ThreadingHTTPServer((host or config["host"], port if port is not None else config["port"]), handler)
+    servidor.daemon_threads = True
+    return servidor
@@ -0,0 +1,284 @@
+"""
+Historial del monitor en segundo plano
+Muestrea métricas baratas (documentos, bytes en disco, latencia de Chroma y de una
+búsqueda de 1 resultado) en un buffer circular de tamaño fijo, guarda copias
+comprimidas en disco y calcula tendencias y anomalías sobre las muestras recientes
+"""
+
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import get_chroma_config, get_monitor_history_config
+from exportador_metricas import tamano_por_segmento
+from salud import HealthChecker
+
+# Una fila por muestra; los valores que no se pudieron medir quedan en -1 / NaN
+CAMPOS_MUESTRA = np.dtype([
+    ("timestamp", "f8"),
+    ("documentos", "i8"),
+    ("disco_bytes", "i8"),
+    ("chroma_ms", "f4"),
+    ("busqueda_ms", "f4"),
+    ("sano", "u1")
+])
+
+class SerieCircular:
+    """Buffer circular de muestras: al llenarse, cada muestra nueva reemplaza a la más antigua"""
+    
+    def __init__(self, capacidad):
+        self.capacidad = capacidad
+        self._datos = np.zeros(capacidad, dtype=CAMPOS_MUESTRA)
+        self._siguiente = 0
+        self._total = 0
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return min(self._total, self.capacidad)
+    
+    def agregar(self, **valores):
+        """Agrega una muestra (los campos que falten quedan como no medidos)"""
+        fila = np.zeros(1, dtype=CAMPOS_MUESTRA)[0]
+        fila["documentos"] = fila["disco_bytes"] = -1
+        fila["chroma_ms"] = fila["busqueda_ms"] = np.nan
+        for campo, valor in valores.items():
+            fila[campo] = valor
+        with self._lock:
+            self._datos[self._siguiente] = fila
+            self._siguiente = (self._siguiente + 1) % self.capacidad
+            self._total += 1
+    
+    def datos(self):
+        """Copia de las muestras en orden cronológico"""
+        with self._lock:
+            if self._total < self.capacidad:
+                return self._datos[:self._total].copy()
+            return np.concatenate((self._datos[self._siguiente:], self._datos[:self._siguiente]))
+    
+    def ventana(self, desde, hasta=None):
+        """Muestras con desde <= timestamp < hasta"""
+        datos = self.datos()
+        mascara = datos["timestamp"] >= desde
+        if hasta is not None:
+            mascara &= datos["timestamp"] < hasta
+        return datos[mascara]
+    
+    def guardar(self, ruta):
+        """Escribe las muestras comprimidas; el archivo se reemplaza de forma atómica"""
+        temporal = f"{ruta}.tmp"
+        with open(temporal, "wb") as f:
+            np.savez_compressed(f, muestras=self.datos())
+        os.replace(temporal, ruta)
+    
+    @classmethod
+    def cargar(cls, ruta, capacidad):
+        """Crea la serie con las últimas `capacidad` muestras guardadas (vacía si no hay archivo)"""
+        serie = cls(capacidad)
+        if os.path.exists(ruta):
+            with np.load(ruta) as archivo:
+                muestras = archivo["muestras"]
+            if muestras.dtype == CAMPOS_MUESTRA:
+                muestras = muestras[-capacidad:]
+                serie._datos[:len(muestras)] = muestras
+                serie._total = len(muestras)
+                serie._siguiente = len(muestras) % capacidad
+        return serie
+
+class MonitorDaemon:
+    """Muestrea la base de datos en un hilo y mantiene el historial acotado"""
+    
+    def __init__(self, chroma_client, persist_directory=None, salud=None, intervalo_s=None,
+                 capacidad=None, ruta_snapshot=None):
+        """Recibe el cliente Chroma; reutiliza el HealthChecker del monitor si se pasa"""
+        config = get_monitor_history_config()
+        self.persist_directory = persist_directory or get_chroma_config()["persist_directory"]
+        self.salud = salud or HealthChecker(chroma_client)
+        self.intervalo_s = intervalo_s or config["sample_interval_s"]
+        self.ruta_snapshot = ruta_snapshot or config["snapshot_path"]
+        self.cada_snapshot_s = config["snapshot_every_s"]
+        self.serie = SerieCircular.cargar(self.ruta_snapshot, capacidad or config["history_size"])
+        
+        self._ultimo_snapshot = time.monotonic()
+        self._detenido = threading.Event()
+        self._hilo = None
+    
+    def muestrear(self):
+        """Toma una muestra: los sondeos de salud (con plazo) y el tamaño en disco"""
+        resultado = self.salud.verificar(forzar=True)
+        chroma = resultado["checks"]["chroma"]
+        busqueda = resultado["checks"]["search"]
+        valores = {
+            "timestamp": resultado["timestamp"],
+            "disco_bytes": sum(tamano_por_segmento(self.persist_directory).values()),
+            "sano": int(resultado["ok"])
+        }
+        if chroma["ok"]:
+            valores["documentos"] = chroma["documentos"]
+            valores["chroma_ms"] = chroma["ms"]
+        if busqueda["ok"]:
+            valores["busqueda_ms"] = busqueda["ms"]
+        self.serie.agregar(**valores)
+        return valores
+    
+    def _bucle(self):
+        while not self._detenido.is_set():
+            try:
+                self.muestrear()
+            except Exception as e:
+                print(f"⚠️  Error al muestrear: {e}")
+            if time.monotonic() - self._ultimo_snapshot >= self.cada_snapshot_s:
+                self.guardar()
+            self._detenido.wait(self.intervalo_s)
+    
+    def guardar(self):
+        """Guarda el historial en disco"""
+        try:
+            self.serie.guardar(self.ruta_snapshot)
+        except OSError as e:
+            print(f"⚠️  No se pudo guardar el historial: {e}")
+        self._ultimo_snapshot = time.monotonic()
+    
+    def iniciar(self):
+        """Arranca el muestreo en segundo plano"""
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._bucle, name="monitor-historial", daemon=True)
+            self._hilo.start()
+    
+    def detener(self):
+        """Detiene el muestreo y guarda el historial"""
+        self._detenido.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=self.salud.timeout_s + 1)
+        self.guardar()
+
+def _p95(valores):
+    valores = valores[~np.isnan(valores)]
+    return float(np.percentile(valores, 95)) if len(valores) else None
+
+def tendencias(serie, ventana_s, ahora=None):
+    """Resumen de cada métrica en los últimos ventana_s segundos"""
+    ahora = ahora or time.time()
+    muestras = serie.ventana(ahora - ventana_s)
+    if len(muestras) == 0:
+        return None
+    
+    horas = max((muestras["timestamp"][-1] - muestras["timestamp"][0]) / 3600, 1e-9)
+    resumen = {"muestras": len(muestras), "sano": float(muestras["sano"].mean())}
+    for campo in ("documentos", "disco_bytes"):
+        medidos = muestras[campo][muestras[campo] >= 0]
+        if len(medidos):
+            resumen[campo] = {
+                "actual": int(medidos[-1]),
+                "min": int(medidos.min()),
+                "max": int(medidos.max()),
+                "por_hora": float(medidos[-1] - medidos[0]) / horas if len(medidos) > 1 else 0.0
+            }
+    for campo in ("chroma_ms", "busqueda_ms"):
+        valores = muestras[campo][~np.isnan(muestras[campo])]
+        if len(valores):
+            resumen[campo] = {
+                "p50": float(np.percentile(valores, 50)),
+                "p95": float(np.percentile(valores, 95)),
+                "max": float(valores.max())
+            }
+    return resumen
+
+def detectar_anomalias(serie, config=None, ahora=None):
+    """
+    Compara la ventana reciente con la de referencia inmediatamente anterior:
+    regresión del p95 de búsqueda, sondeos fallidos y caídas en el número de documentos
+    """
+    config = config or get_monitor_history_config()
+    ahora = ahora or time.time()
+    inicio_reciente = ahora - config["anomaly_window_s"]
+    reciente = serie.ventana(inicio_reciente)
+    referencia = serie.ventana(inicio_reciente - config["baseline_window_s"], inicio_reciente)
+    anomalias = []
+    if len(reciente) == 0:
+        return anomalias
+    
+    p95_reciente = _p95(reciente["busqueda_ms"])
+    p95_referencia = _p95(referencia["busqueda_ms"]) if len(referencia) else None
+    if p95_reciente is not None and p95_referencia is not None:
+        if (p95_reciente > p95_referencia * config["p95_regression_factor"]
+                and p95_reciente - p95_referencia >= config["p95_min_delta_ms"]):
+            anomalias.append(
+                f"p95 de búsqueda {p95_reciente:.1f}ms frente a {p95_referencia:.1f}ms "
+                f"en la ventana de referencia ({p95_reciente / p95_referencia:.1f}x)"
+            )
+    
+    fallidas = int((reciente["sano"] == 0).sum())
+    if fallidas:
+        anomalias.append(f"{fallidas} de {len(reciente)} muestras recientes con servicios caídos")
+    
+    documentos = reciente["documentos"][reciente["documentos"] >= 0]
+    if len(referencia):
+        anteriores = referencia["documentos"][referencia["documentos"] >= 0]
+        documentos = np.concatenate((anteriores[-1:], documentos))
+    if len(documentos) > 1 and documentos.min() < documentos[0]:
+        anomalias.append(f"El número de documentos bajó de {documentos[0]} a {documentos.min()}")
+    return anomalias
+
+def imprimir_tendencias(serie, ventana_s):
+    """Muestra las tendencias de la ventana"""
+    resumen = tendencias(serie, ventana_s)
+    print(f"\n📈 Tendencias de los últimos {ventana_s / 60:.0f} minutos")
+    if resumen is None:
+        print("   ℹ️ Todavía no hay muestras en esa ventana")
+        return
+    
+    print(f"   - Muestras: {resumen['muestras']} (sanas: {resumen['sano']:.0%})")
+    if "documentos" in resumen:
+        documentos = resumen["documentos"]
+        print(f"   - Documentos: {documentos['actual']} (mín {documentos['min']}, máx {documentos['max']}, "
+              f"{documentos['por_hora']:+.1f}/hora)")
+    if "disco_bytes" in resumen:
+        disco = resumen["disco_bytes"]
+        print(f"   - Disco: {disco['actual'] / (1024 * 1024):.2f} MB "
+              f"({disco['por_hora'] / (1024 * 1024):+.2f} MB/hora)")
+    for campo, etiqueta in (("chroma_ms", "count() de Chroma"), ("busqueda_ms", "Búsqueda")):
+        if campo in resumen:
+            latencia = resumen[campo]
+            print(f"   - {etiqueta}: p50 {latencia['p50']:.1f}ms, p95 {latencia['p95']:.1f}ms, "
+                  f"máx {latencia['max']:.1f}ms")
+
+def imprimir_anomalias(serie, config=None):
+    """Muestra las anomalías detectadas"""
+    anomalias = detectar_anomalias(serie, config)
+    if anomalias:
+        print(f"\n🚨 Anomalías:")
+        for anomalia in anomalias:
+            print(f"   - {anomalia}")
+    else:
+        print(f"\n✅ Sin anomalías en la ventana reciente")
+    return anomalias
+
+def main():
+    """Muestra tendencias y anomalías desde la copia en disco del historial"""
+    import argparse
+    
+    config = get_monitor_history_config()
+    parser = argparse.ArgumentParser(description="Tendencias del historial del monitor")
+    parser.add_argument("--ventana", type=float, default=60, help="Ventana de tendencias en minutos")
+    args = parser.parse_args()
+    
+    print("=" * 60)
+    print("📈 HISTORIAL DEL MONITOR")
+    print("=" * 60)
+    
+    if not os.path.exists(config["snapshot_path"]):
+        print(f"ℹ️ No existe {config['snapshot_path']} (python database_monitor.py --daemon)")
+        return
+    serie = SerieCircular.cargar(config["snapshot_path"], config["history_size"])
+    print(f"📦 {len(serie)} muestras en {config['snapshot_path']}")
+    imprimir_tendencias(serie, args.ventana * 60)
+    imprimir_anomalias(serie, config)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+Inspector de los segmentos HNSW de Chroma
+Lee header.bin, data_level0.bin y link_lists.bin de cada directorio
+de segmento y reporta elementos, dimensión, M, distribución de niveles, grado
+medio, fracción de borrados y memoria estimada, con una recomendación de reconstrucción
+"""
+
+import os
+import struct
+import sys
+
+import numpy as np
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import get_chroma_config, get_hnsw_inspection_config
+from catalogo_sqlite import abrir_catalogo
+
+# Cabecera de hnswlib tal como la persiste Chroma (header.bin, little-endian):
+# persist_version, offsetLevel0, max_elements, cur_element_count, size_data_per_element,
+# label_offset, offsetData, maxlevel, enterpoint_node, maxM, maxM0, M, mult, ef_construction
+FORMATO_CABECERA = "<iQQQQQQiiQQQdQ"
+TAMANO_CABECERA = struct.calcsize(FORMATO_CABECERA)
+CAMPOS_CABECERA = (
+    "persist_version", "offset_level0", "max_elements", "cur_element_count", "size_data_per_element",
+    "label_offset", "offset_data", "maxlevel", "enterpoint_node", "maxM", "maxM0", "M", "mult",
+    "ef_construction"
+)
+VERSIONES_SOPORTADAS = (1,)
+
+# Marca de borrado en el tercer byte de la cabecera de la lista de enlaces (hnswlib DELETE_MARK)
+MARCA_BORRADO = 0x01
+
+# Bytes aproximados por elemento de las estructuras auxiliares de hnswlib en memoria
+# (mutex por elemento, nivel, tabla etiqueta -> id y lista de visitados)
+BYTES_AUXILIARES_POR_CAPACIDAD = 40 + 4 + 2
+BYTES_ETIQUETA_POR_ELEMENTO = 40
+
+def leer_cabecera(directorio):
+    """Lee header.bin y retorna sus campos como dict (None si no existe)"""
+    ruta = os.path.join(directorio, "header.bin")
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, "rb") as f:
+        datos = f.read(TAMANO_CABECERA)
+    if len(datos) < TAMANO_CABECERA:
+        raise ValueError(f"header.bin incompleto ({len(datos)} bytes)")
+    cabecera = dict(zip(CAMPOS_CABECERA, struct.unpack(FORMATO_CABECERA, datos)))
+    if cabecera["persist_version"] not in VERSIONES_SOPORTADAS:
+        raise ValueError(f"Versión de persistencia {cabecera['persist_version']} no soportada")
+    return cabecera
+
+def _tamano_directorio(directorio):
+    return sum(
+        os.path.getsize(os.path.join(directorio, nombre))
+        for nombre in os.listdir(directorio)
+        if os.path.isfile(os.path.join(directorio, nombre))
+    )
+
+def _leer_enlaces(ruta, elementos, tamano_enlaces):
+    """
+    Recorre link_lists.bin: por cada elemento, el tamaño (uint32) de sus listas de
+    niveles superiores seguido de un bloque de tamano_enlaces bytes por nivel
+    Retorna (bytes de enlaces, {nivel: elementos}, grado de cada bloque)
+    """
+    with open(ruta, "rb") as f:
+        datos = f.read()
+    
+    niveles = {}
+    grados = []
+    bytes_enlaces = 0
+    posicion = 0
+    for _ in range(elementos):
+        if posicion + 4 > len(datos):
+            raise ValueError("link_lists.bin más corto de lo que indica la cabecera")
+        (tamano,) = struct.unpack_from("<I", datos, posicion)
+        posicion += 4
+        nivel = tamano // tamano_enlaces
+        niveles[nivel] = niveles.get(nivel, 0) + 1
+        for bloque in range(nivel):
+            (cabecera,) = struct.unpack_from("<I", datos, posicion + bloque * tamano_enlaces)
+            grados.append(cabecera & 0xFFFF)
+        bytes_enlaces += tamano
+        posicion += tamano
+    return bytes_enlaces, niveles, grados
+
+def inspeccionar_segmento(directorio):
+    """
+    Analiza un directorio de segmento HNSW
+    data_level0.bin se lee con memmap: solo se tocan las cabeceras de las listas de enlaces
+    """
+    cabecera = leer_cabecera(directorio)
+    if cabecera is None:
+        return None
+    
+    elementos = cabecera["cur_element_count"]
+    capacidad = cabecera["max_elements"]
+    tamano_elemento = cabecera["size_data_per_element"]
+    tamano_enlaces = cabecera["maxM"] * 4 + 4
+    bytes_datos = cabecera["label_offset"] - cabecera["offset_data"]
+    
+    informe = {
+        "directorio": directorio,
+        "bytes_en_disco": _tamano_directorio(directorio),
+        "elementos": elementos,
+        "capacidad": capacidad,
+        "dimension": bytes_datos // 4,
+        "M": cabecera["M"],
+        "max_grado_nivel0": cabecera["maxM0"],
+        "ef_construction": cabecera["ef_construction"],
+        "nivel_maximo": cabecera["maxlevel"],
+        "niveles": {},
+        "grado_medio_nivel0": 0.0,
+        "grado_medio_superior": 0.0,
+        "borrados": 0,
+        "fraccion_borrados": 0.0
+    }
+    
+    ruta_nivel0 = os.path.join(directorio, "data_level0.bin")
+    if elementos and os.path.exists(ruta_nivel0):
+        nivel0 = np.memmap(ruta_nivel0, dtype=np.uint8, mode="r", shape=(capacidad, tamano_elemento))
+        cabeceras = np.array(nivel0[:elementos, :4])
+        grados = cabeceras[:, 0].astype(np.uint32) | (cabeceras[:, 1].astype(np.uint32) << 8)
+        borrados = (cabeceras[:, 2] & MARCA_BORRADO) != 0
+        vivos = ~borrados
+        informe["borrados"] = int(borrados.sum())
+        informe["fraccion_borrados"] = round(informe["borrados"] / elementos, 4)
+        informe["grado_medio_nivel0"] = round(float(grados[vivos].mean()) if vivos.any() else 0.0, 2)
+        del nivel0
+    
+    ruta_enlaces = os.path.join(directorio, "link_lists.bin")
+    bytes_enlaces = 0
+    if elementos and os.path.exists(ruta_enlaces):
+        bytes_enlaces, niveles, grados_superiores = _leer_enlaces(ruta_enlaces, elementos, tamano_enlaces)
+        informe["niveles"] = niveles
+        if grados_superiores:
+            informe["grado_medio_superior"] = round(sum(grados_superiores) / len(grados_superiores), 2)
+    
+    informe["memoria_estimada_bytes"] = (
+        capacidad * tamano_elemento
+        + bytes_enlaces
+        + capacidad * BYTES_AUXILIARES_POR_CAPACIDAD
+        + elementos * BYTES_ETIQUETA_POR_ELEMENTO
+    )
+    return informe
+
+def recomendar(informe, umbrales=None):
+    """Lista de motivos para reconstruir el índice (vacía si no compensa)"""
+    umbrales = umbrales or get_hnsw_inspection_config()
+    motivos = []
+    if informe["fraccion_borrados"] >= umbrales["rebuild_deleted_ratio"]:
+        motivos.append(
+            f"{informe['fraccion_borrados']:.0%} de elementos borrados siguen ocupando memoria y "
+            f"se recorren en cada búsqueda"
+        )
+    vivos = informe["elementos"] - informe["borrados"]
+    if vivos > informe["max_grado_nivel0"]:
+        minimo = informe["max_grado_nivel0"] * umbrales["min_degree_ratio"]
+        if informe["grado_medio_nivel0"] < minimo:
+            motivos.append(
+                f"grado medio en nivel 0 de {informe['grado_medio_nivel0']:.1f} "
+                f"(< {minimo:.0f}): grafo mal conectado, el recall puede caer"
+            )
+    return motivos
+
+def inspeccionar(persist_directory=None, collection_name=None):
+    """
+    Inspecciona todos los directorios de segmento de persist_directory
+    Con el catálogo SQL se identifica el segmento de la colección, los huérfanos
+    (de colecciones eliminadas) y las operaciones aún no aplicadas al índice
+    """
+    config = get_chroma_config()
+    persist_directory = persist_directory or config["persist_directory"]
+    collection_name = collection_name or config["collection_name"]
+    
+    conocidos, segmento_coleccion, pendientes = None, None, None
+    catalogo = abrir_catalogo(persist_directory, collection_name)
+    if catalogo:
+        try:
+            conocidos = catalogo.segmentos_conocidos()
+            segmento_coleccion = catalogo.segmento_vectorial()
+            pendientes = catalogo.pendientes_de_indexar()
+        finally:
+            catalogo.cerrar()
+    
+    segmentos = []
+    for entrada in sorted(os.scandir(persist_directory), key=lambda e: e.name):
+        if not entrada.is_dir():
+            continue
+        try:
+            informe = inspeccionar_segmento(entrada.path)
+        except (ValueError, OSError) as e:
+            informe = {"directorio": entrada.path, "error": str(e)}
+        if informe is None:
+            continue
+        informe["segmento"] = entrada.name
+        informe["huerfano"] = conocidos is not None and entrada.name not in conocidos
+        informe["de_la_coleccion"] = entrada.name == segmento_coleccion
+        if informe["de_la_coleccion"]:
+            informe["pendientes_de_indexar"] = pendientes
+        if "error" not in informe:
+            informe["motivos_reconstruccion"] = recomendar(informe)
+        segmentos.append(informe)
+    return segmentos
+
+def _mb(bytes_):
+    return bytes_ / (1024 * 1024)
+
+def imprimir_informe(segmentos):
+    """Muestra el análisis de cada segmento y la recomendación"""
+    if not segmentos:
+        print("ℹ️ No hay segmentos HNSW en el directorio de persistencia")
+        return
+    
+    for informe in segmentos:
+        etiqueta = " (colección actual)" if informe.get("de_la_coleccion") else ""
+        print(f"\n📦 Segmento {informe['segmento']}{etiqueta}")
+        if "error" in informe:
+            print(f"   ❌ No se pudo leer: {informe['error']}")
+            continue
+        if informe["huerfano"]:
+            print(f"   🗑️  Huérfano: no pertenece a ninguna colección; "
+                  f"se pueden recuperar {_mb(informe['bytes_en_disco']):.2f} MB (python compactacion.py)")
+            continue
+        
+        print(f"   - Elementos: {informe['elementos']} de {informe['capacidad']} reservados "
+              f"({informe['dimension']} dimensiones)")
+        print(f"   - M: {informe['M']} (máx. {informe['max_grado_nivel0']} en nivel 0), "
+              f"ef_construction: {informe['ef_construction']}")
+        if informe["niveles"]:
+            niveles = ", ".join(f"n{nivel}: {cantidad}" for nivel, cantidad in sorted(informe["niveles"].items()))
+            print(f"   - Niveles: {niveles}")
+        print(f"   - Grado medio: {informe['grado_medio_nivel0']:.1f} en nivel 0, "
+              f"{informe['grado_medio_superior']:.1f} en niveles superiores")
+        print(f"   - Borrados: {informe['borrados']} ({informe['fraccion_borrados']:.1%})")
+        print(f"   - Disco: {_mb(informe['bytes_en_disco']):.2f} MB | "
+              f"memoria estimada: {_mb(informe['memoria_estimada_bytes']):.2f} MB")
+        if informe.get("pendientes_de_indexar"):
+            print(f"   - Pendientes en embeddings_queue: {informe['pendientes_de_indexar']} "
+                  f"(Chroma los aplica al índice al abrir la colección)")
+        
+        if informe["motivos_reconstruccion"]:
+            print(f"   🔧 Conviene reconstruir:")
+            for motivo in informe["motivos_reconstruccion"]:
+                print(f"      - {motivo}")
+            print(f"   💡 python compactacion.py reconstruye el índice solo con las entradas vivas")
+        else:
+            print(f"   ✅ No compensa reconstruir")
+
+def main():
+    """Inspecciona los segmentos HNSW del directorio de persistencia"""
+    print("=" * 60)
+    print("🔬 INSPECTOR DE SEGMENTOS HNSW")
+    print("=" * 60)
+    
+    persist_directory = get_chroma_config()["persist_directory"]
+    if not os.path.isdir(persist_directory):
+        print(f"⚠️  El directorio {persist_directory} no existe")
+        return
+    imprimir_informe(inspeccionar(persist_directory))
+
+if __name__ == "__main__":
+    main()
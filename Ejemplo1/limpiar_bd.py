@@ -3,17 +3,70 @@ Script de utilidad para limpiar y gestionar la base de datos Chroma
 Permite eliminar documentos específicos o toda la base de datos
 """
 
+import fnmatch
 import os
 import shutil
 import sys
+import time
 from pathlib import Path
 
 # Agregar el directorio actual al path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from config import get_chroma_config, get_ollama_config, get_models_config
+from config import get_chroma_config, get_ollama_config, get_models_config, get_cleanup_config
 from langchain_chroma import Chroma
-from langchain_ollama import OllamaEmbeddings
+from cliente_ollama import crear_embeddings
+from escaneo import contar_metadatos, obtener_coleccion
+from estadisticas_coleccion import cerrar_estadisticas, obtener_estadisticas
+from catalogo_sqlite import abrir_catalogo
+from respaldos import (
+    RepositorioRespaldos, crear_respaldo, imprimir_resumen, tamano_repositorio,
+    restaurar_verificado, imprimir_restauracion, recuperar_intercambio_pendiente
+)
+from compactacion import compactar, imprimir_resultado
+
+# Formas de comparar el nombre pedido con el campo source de los chunks
+MODOS_COINCIDENCIA = ("exacto", "contiene", "glob")
+
+def coincide_fuente(source, patron, modo="contiene"):
+    """Compara la ruta completa y el nombre de archivo con el patrón"""
+    nombre = os.path.basename(source)
+    if modo == "exacto":
+        return patron in (source, nombre)
+    if modo == "glob":
+        return fnmatch.fnmatchcase(source, patron) or fnmatch.fnmatchcase(nombre, patron)
+    if modo == "contiene":
+        return patron in source
+    raise ValueError(f"Modo '{modo}' no válido (usar {', '.join(MODOS_COINCIDENCIA)})")
+
+def modo_por_patron(patron):
+    """glob si el patrón tiene comodines; si no, búsqueda por subcadena"""
+    return "glob" if any(c in patron for c in "*?[") else "contiene"
+
+def eliminar_por_filtro(cliente, where, tamano_lote=None, al_eliminar=None):
+    """
+    Elimina dentro de Chroma los chunks que cumplen el filtro where, por lotes:
+    cada lote pide solo IDs (include=[]) y los elimina, así que nunca se trae la
+    colección ni los metadatos al cliente. al_eliminar(ids) se llama tras cada lote
+    Retorna (eliminados, segundos)
+    """
+    coleccion = obtener_coleccion(cliente)
+    tamano_lote = tamano_lote or get_cleanup_config()["delete_batch_size"]
+    eliminados = 0
+    anteriores = None
+    inicio = time.perf_counter()
+    while True:
+        ids = coleccion.get(where=where, limit=tamano_lote, include=[])["ids"]
+        if not ids:
+            break
+        if ids == anteriores:
+            raise RuntimeError("Chroma no eliminó el lote anterior; se detiene para no repetirlo")
+        coleccion.delete(ids=ids)
+        if al_eliminar:
+            al_eliminar(ids)
+        eliminados += len(ids)
+        anteriores = ids
+    return eliminados, time.perf_counter() - inicio
 
 class DatabaseCleaner:
     """Clase para limpiar y gestionar la base de datos Chroma"""
@@ -25,11 +78,20 @@ class DatabaseCleaner:
         self.models_config = get_models_config()
         
         # Inicializar embeddings y cliente Chroma
-        self.embeddings = OllamaEmbeddings(
-            model=self.models_config["embedding_model"],
+        self.embeddings = crear_embeddings(
+            self.models_config["embedding_model"],
             base_url=self.ollama_config["base_url"]
         )
         
+        # Un restaurar/compactar interrumpido a mitad del intercambio se termina antes de abrir la base
+        recuperado = recuperar_intercambio_pendiente(self.config["persist_directory"])
+        if recuperado:
+            print(f"♻️ Intercambio de directorios pendiente: {recuperado}")
+        
+        self._conectar()
+    
+    def _conectar(self):
+        """Abre (o vuelve a abrir) el cliente Chroma sobre el directorio de persistencia"""
         self.chroma_client = Chroma(
             collection_name=self.config["collection_name"],
             embedding_function=self.embeddings,
@@ -47,11 +109,15 @@ class DatabaseCleaner:
             print(f"📄 Total de documentos: {count}")
             
             if count > 0:
-                results = self.chroma_client.get()
-                sources = set()
-                for metadata in results['metadatas']:
-                    if metadata and 'source' in metadata:
-                        sources.add(metadata['source'])
+                # Consulta agregada en chroma.sqlite3 (o recorrido por lotes de los metadatos)
+                catalogo = self._catalogo()
+                if catalogo:
+                    try:
+                        sources = set(catalogo.chunks_por_fuente())
+                    finally:
+                        catalogo.cerrar()
+                else:
+                    sources = set(contar_metadatos(self.chroma_client, 'source'))
                 
                 print(f"📁 Fuentes únicas: {len(sources)}")
                 for source in sorted(sources):
@@ -78,6 +144,7 @@ class DatabaseCleaner:
             if count > 0:
                 # Eliminar toda la colección
                 self.chroma_client.delete_collection()
+                self._limpiar_estadisticas()
                 print("✅ Colección eliminada completamente")
                 print("💡 Ahora puedes ejecutar 'python ejemplo1.py' para vectorizar nuevos documentos")
             else:
@@ -86,34 +153,70 @@ class DatabaseCleaner:
         except Exception as e:
             print(f"❌ Error al eliminar colección: {e}")
     
-    def eliminar_documentos_por_fuente(self, nombre_archivo):
-        """Elimina documentos de una fuente específica"""
-        print(f"\n🗑️ ELIMINANDO DOCUMENTOS DE: {nombre_archivo}")
+    def _catalogo(self):
+        """Catálogo SQL de solo lectura sobre chroma.sqlite3 (None si no es compatible)"""
+        return abrir_catalogo(self.config["persist_directory"], self.config["collection_name"])
+    
+    def _limpiar_estadisticas(self):
+        """Vacía las estadísticas incrementales tras eliminar la colección"""
+        estadisticas = obtener_estadisticas()
+        if estadisticas:
+            estadisticas.limpiar()
+    
+    def _indice_fuentes(self):
+        """
+        Chunks por fuente sin recorrer la colección: estadísticas incrementales si están
+        al día, si no el catálogo SQL y, como último recurso, un recorrido de metadatos
+        """
+        estadisticas = obtener_estadisticas()
+        if estadisticas and estadisticas.sincronizado(self.chroma_client):
+            return estadisticas.resumen()["chunks_por_fuente"]
+        catalogo = self._catalogo()
+        if catalogo:
+            try:
+                return catalogo.chunks_por_fuente()
+            finally:
+                catalogo.cerrar()
+        return contar_metadatos(self.chroma_client, 'source')
+    
+    def eliminar_documentos_por_fuente(self, nombre_archivo, modo=None):
+        """
+        Elimina los documentos de las fuentes que coinciden con nombre_archivo
+        (subcadena, nombre exacto o patrón glob como '2502*.pdf')
+        """
+        modo = modo or modo_por_patron(nombre_archivo)
+        print(f"\n🗑️ ELIMINANDO DOCUMENTOS DE: {nombre_archivo} ({modo})")
         print("=" * 60)
         
         try:
-            results = self.chroma_client.get()
-            
-            if not results or not results['documents']:
+            if self.chroma_client._collection.count() == 0:
                 print("⚠️  No hay documentos para analizar")
                 return
             
-            # Encontrar documentos de la fuente específica
-            documentos_a_eliminar = []
-            for i, metadata in enumerate(results['metadatas']):
-                if metadata and 'source' in metadata:
-                    if nombre_archivo in metadata['source']:
-                        documentos_a_eliminar.append(results['ids'][i])
+            # Resolver el patrón contra el índice de fuentes (no contra cada chunk)
+            fuentes = {
+                source: chunks for source, chunks in self._indice_fuentes().items()
+                if coincide_fuente(source, nombre_archivo, modo)
+            }
             
-            if documentos_a_eliminar:
-                print(f"📄 Documentos encontrados: {len(documentos_a_eliminar)}")
+            if fuentes:
+                total = sum(fuentes.values())
+                print(f"📁 Fuentes que coinciden: {len(fuentes)}")
+                for source, chunks in sorted(fuentes.items()):
+                    print(f"   - {os.path.basename(source)}: {chunks} documentos")
                 
                 # Confirmar eliminación
-                confirmacion = input(f"¿Eliminar {len(documentos_a_eliminar)} documentos? (y/n): ").strip().lower()
+                confirmacion = input(f"¿Eliminar {total} documentos? (y/n): ").strip().lower()
                 
                 if confirmacion in ['y', 'yes', 'sí', 'si']:
-                    self.chroma_client.delete(ids=documentos_a_eliminar)
-                    print(f"✅ {len(documentos_a_eliminar)} documentos eliminados")
+                    estadisticas = obtener_estadisticas()
+                    eliminados, segundos = eliminar_por_filtro(
+                        self.chroma_client,
+                        {"source": {"$in": sorted(fuentes)}},
+                        al_eliminar=estadisticas.registrar_baja if estadisticas else None
+                    )
+                    print(f"✅ {eliminados} documentos eliminados en {segundos:.2f}s")
+                    print("💡 Los borrados siguen ocupando el índice y el disco: compacta con 'compact'")
                 else:
                     print("❌ Operación cancelada")
             else:
@@ -135,6 +238,8 @@ class DatabaseCleaner:
                 confirmacion = input("¿Eliminar directorio completo? (y/n): ").strip().lower()
                 
                 if confirmacion in ['y', 'yes', 'sí', 'si']:
+                    # Las estadísticas viven en el mismo directorio y se borran con él
+                    cerrar_estadisticas()
                     shutil.rmtree(self.config["persist_directory"])
                     print(f"✅ Directorio {self.config['persist_directory']} eliminado")
                     print("💡 Reinicia Chroma con 'docker-compose restart' y ejecuta 'python ejemplo1.py'")
@@ -147,34 +252,91 @@ class DatabaseCleaner:
             print(f"❌ Error al eliminar directorio: {e}")
     
     def hacer_backup(self):
-        """Crea un backup de la base de datos"""
+        """Crea un respaldo incremental de la base de datos (respaldos.py)"""
         print("\n💾 CREANDO BACKUP")
         print("=" * 60)
         
         try:
             if os.path.exists(self.config["persist_directory"]):
-                from datetime import datetime
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                backup_name = f"backup_chroma_{timestamp}.tar.gz"
-                
-                print(f"📁 Creando backup: {backup_name}")
-                
-                # Crear backup
-                import tarfile
-                with tarfile.open(backup_name, "w:gz") as tar:
-                    tar.add(self.config["persist_directory"], arcname="chroma_data")
-                
-                print(f"✅ Backup creado: {backup_name}")
+                repositorio = RepositorioRespaldos()
+                print(f"📁 Repositorio de respaldos: {repositorio.directorio}")
                 
-                # Mostrar tamaño
-                size = os.path.getsize(backup_name)
-                print(f"📏 Tamaño: {size / (1024*1024):.2f} MB")
+                # Solo se escriben los bloques que cambiaron desde el respaldo anterior
+                manifiesto = crear_respaldo(self.config["persist_directory"], repositorio)
+                imprimir_resumen(manifiesto)
+                print(f"📏 Repositorio: {tamano_repositorio(repositorio) / (1024*1024):.2f} MB "
+                      f"({len(repositorio.manifiestos())} respaldos)")
             else:
                 print(f"ℹ️ No hay datos para hacer backup en {self.config['persist_directory']}")
                 
         except Exception as e:
             print(f"❌ Error al crear backup: {e}")
     
+    def restaurar_backup(self, respaldo_id=None):
+        """Restaura un respaldo: extracción verificada, validación e intercambio del directorio"""
+        print("\n♻️ RESTAURANDO BACKUP")
+        print("=" * 60)
+        
+        try:
+            repositorio = RepositorioRespaldos()
+            ids = repositorio.manifiestos()
+            if not ids:
+                print(f"ℹ️ No hay respaldos en {repositorio.directorio}")
+                return
+            
+            if not respaldo_id:
+                for disponible in ids[-10:]:
+                    colecciones = repositorio.cargar_manifiesto(disponible).get("colecciones") or {}
+                    print(f"   - {disponible}: " + ", ".join(f"{n} ({c} chunks)" for n, c in colecciones.items()))
+                respaldo_id = input(f"🔖 Respaldo a restaurar [{ids[-1]}]: ").strip() or ids[-1]
+            if respaldo_id not in ids:
+                print(f"❌ No existe el respaldo {respaldo_id}")
+                return
+            
+            confirmacion = input(f"¿Reemplazar {self.config['persist_directory']} por el respaldo "
+                                 f"{respaldo_id}? (y/n): ").strip().lower()
+            if confirmacion not in ['y', 'yes', 'sí', 'si']:
+                print("❌ Operación cancelada")
+                return
+            
+            # Este proceso también tiene abiertos Chroma y las estadísticas: se liberan antes del
+            # intercambio y el cliente se vuelve a abrir sobre el directorio resultante
+            cerrar_estadisticas()
+            from chromadb.api.client import SharedSystemClient
+            SharedSystemClient.clear_system_cache()
+            try:
+                imprimir_restauracion(restaurar_verificado(respaldo_id, self.config["persist_directory"], repositorio))
+            finally:
+                self._conectar()
+            print("💡 Reinicia los demás procesos que usan la base de datos (Chroma, monitor, consultas)")
+            
+        except Exception as e:
+            print(f"❌ Error al restaurar backup: {e}")
+    
+    def compactar_base(self):
+        """Reconstruye el índice con las entradas vivas, compacta SQLite e intercambia el directorio"""
+        print("\n🗜️ COMPACTANDO BASE DE DATOS")
+        print("=" * 60)
+        
+        try:
+            confirmacion = input(f"¿Compactar {self.config['persist_directory']}? "
+                                 f"(el actual queda como copia .anterior) (y/n): ").strip().lower()
+            if confirmacion not in ['y', 'yes', 'sí', 'si']:
+                print("❌ Operación cancelada")
+                return
+            
+            # Igual que al restaurar: este proceso libera Chroma y las estadísticas antes del intercambio
+            cerrar_estadisticas()
+            from chromadb.api.client import SharedSystemClient
+            SharedSystemClient.clear_system_cache()
+            try:
+                imprimir_resultado(compactar(self.config["persist_directory"], self.config["collection_name"]))
+            finally:
+                self._conectar()
+            
+        except Exception as e:
+            print(f"❌ Error al compactar: {e}")
+    
     def modo_interactivo(self):
         """Modo interactivo para gestionar la base de datos"""
         print("\n" + "=" * 60)
@@ -184,14 +346,17 @@ class DatabaseCleaner:
         print("  status - Mostrar estado actual")
         print("  clear-all - Eliminar toda la colección")
         print("  clear-dir - Eliminar directorio de datos")
-        print("  clear-source <nombre> - Eliminar documentos por fuente")
+        print("  clear-source <nombre|patrón> - Eliminar documentos por fuente (admite * y ?)")
         print("  backup - Crear backup")
+        print("  restore [id] - Restaurar un backup (verificado)")
+        print("  compact - Compactar índice y SQLite tras borrados")
         print("  quit - Salir")
         print("=" * 60)
         
         while True:
             try:
-                command = input("\n🔧 Comando: ").strip().lower()
+                entrada = input("\n🔧 Comando: ").strip()
+                command = entrada.lower()
                 
                 if command == "quit" or command == "exit":
                     print("👋 ¡Hasta luego!")
@@ -204,8 +369,12 @@ class DatabaseCleaner:
                     self.eliminar_directorio_datos()
                 elif command == "backup":
                     self.hacer_backup()
+                elif command == "restore" or command.startswith("restore "):
+                    self.restaurar_backup(entrada[8:].strip() or None)
+                elif command == "compact":
+                    self.compactar_base()
                 elif command.startswith("clear-source "):
-                    nombre = command[13:]  # Remover "clear-source "
+                    nombre = entrada[13:]  # Remover "clear-source " (conservando mayúsculas)
                     self.eliminar_documentos_por_fuente(nombre)
                 else:
                     print("❌ Comando no reconocido. Usa 'quit' para salir.")
@@ -235,17 +404,19 @@ def main():
         print("2. Eliminar directorio de datos")
         print("3. Eliminar documentos por fuente")
         print("4. Crear backup")
-        print("5. Modo interactivo")
-        print("6. Salir")
+        print("5. Restaurar backup")
+        print("6. Compactar base de datos")
+        print("7. Modo interactivo")
+        print("8. Salir")
         
-        opcion = input("\n🔧 Opción (1-6): ").strip()
+        opcion = input("\n🔧 Opción (1-8): ").strip()
         
         if opcion == "1":
             cleaner.eliminar_coleccion_completa()
         elif opcion == "2":
             cleaner.eliminar_directorio_datos()
         elif opcion == "3":
-            nombre = input("📁 Nombre del archivo (ej: documento.pdf): ").strip()
+            nombre = input("📁 Nombre del archivo o patrón (ej: documento.pdf, 2502*.pdf): ").strip()
             if nombre:
                 cleaner.eliminar_documentos_por_fuente(nombre)
             else:
@@ -253,8 +424,12 @@ def main():
         elif opcion == "4":
             cleaner.hacer_backup()
         elif opcion == "5":
-            cleaner.modo_interactivo()
+            cleaner.restaurar_backup()
         elif opcion == "6":
+            cleaner.compactar_base()
+        elif opcion == "7":
+            cleaner.modo_interactivo()
+        elif opcion == "8":
             print("👋 ¡Hasta luego!")
         else:
             print("❌ Opción no válida")
@@ -0,0 +1,381 @@
+"""
+Planificador de peticiones al LLM
+Se ejecuta como proxy entre los scripts y Ollama: limita la concurrencia,
+atiende primero las consultas interactivas y expone métricas de la cola.
+Con varios servidores en OLLAMA_HOSTS reenvía a través del pool de cliente_ollama
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from concurrent.futures import Future, TimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import get_scheduler_config, get_ollama_config
+
+PRIORIDAD_INTERACTIVA = "interactive"
+PRIORIDAD_BATCH = "batch"
+
+# Orden de atención: un número menor se atiende antes
+ORDEN_PRIORIDADES = {PRIORIDAD_INTERACTIVA: 0, PRIORIDAD_BATCH: 1}
+
+# Endpoints de generación que pasan por la cola; el resto se reenvía directamente
+ENDPOINTS_PLANIFICADOS = ("/api/generate", "/api/chat")
+
+class ColaLlenaError(Exception):
+    """La cola alcanzó su tamaño máximo y la petición fue rechazada"""
+
+class TiempoEnColaError(Exception):
+    """La petición esperó en cola más que su tiempo límite"""
+
+def percentil(valores, p):
+    """Retorna el percentil p (0-100) de una lista de valores"""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, int(round(p / 100.0 * (len(ordenados) - 1)))))
+    return ordenados[indice]
+
+class LLMScheduler:
+    """Pool de workers con cola de prioridades, tiempo límite en cola y métricas"""
+    
+    def __init__(self, workers=None, max_queue=None, timeouts=None):
+        """Inicializa la cola y arranca los workers"""
+        config = get_scheduler_config()
+        self.workers = workers or config["workers"]
+        self.max_queue = max_queue if max_queue is not None else config["max_queue"]
+        self.timeouts = timeouts or {
+            PRIORIDAD_INTERACTIVA: config["interactive_timeout_s"],
+            PRIORIDAD_BATCH: config["batch_timeout_s"]
+        }
+        
+        self._cola = []
+        self._secuencia = itertools.count()
+        self._condicion = threading.Condition()
+        self._detenido = False
+        
+        self._en_ejecucion = 0
+        self._contadores = {
+            "enviadas": 0,
+            "completadas": 0,
+            "fallidas": 0,
+            "rechazadas": 0,
+            "expiradas": 0
+        }
+        self._esperas = {p: deque(maxlen=1000) for p in ORDEN_PRIORIDADES}
+        
+        self._hilos = []
+        for i in range(self.workers):
+            hilo = threading.Thread(target=self._worker, name=f"llm-worker-{i}", daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+    
+    def enviar(self, funcion, *args, prioridad=PRIORIDAD_INTERACTIVA, timeout_cola=None, **kwargs):
+        """
+        Encola una llamada y retorna un Future con su resultado
+        Lanza ColaLlenaError si la cola está llena (control de admisión)
+        """
+        if prioridad not in ORDEN_PRIORIDADES:
+            prioridad = PRIORIDAD_INTERACTIVA
+        if timeout_cola is None:
+            timeout_cola = self.timeouts[prioridad]
+        
+        futuro = Future()
+        # El futuro lleva su plazo para que ejecutar() pueda esperar solo hasta el límite
+        futuro.encolada = time.monotonic()
+        futuro.limite = futuro.encolada + timeout_cola if timeout_cola else None
+        tarea = {
+            "funcion": funcion,
+            "args": args,
+            "kwargs": kwargs,
+            "prioridad": prioridad,
+            "encolada": futuro.encolada,
+            "limite": futuro.limite,
+            "futuro": futuro
+        }
+        
+        with self._condicion:
+            if self._detenido:
+                raise RuntimeError("El planificador está detenido")
+            if self.max_queue and len(self._cola) >= self.max_queue:
+                self._contadores["rechazadas"] += 1
+                raise ColaLlenaError(f"Cola llena ({len(self._cola)} peticiones en espera)")
+            
+            heapq.heappush(self._cola, (ORDEN_PRIORIDADES[prioridad], next(self._secuencia), tarea))
+            self._contadores["enviadas"] += 1
+            self._condicion.notify()
+        
+        return futuro
+    
+    def ejecutar(self, funcion, *args, prioridad=PRIORIDAD_INTERACTIVA, timeout_cola=None, **kwargs):
+        """
+        Encola una llamada y espera su resultado
+        Si el tiempo límite en cola vence antes de que un worker la tome, la retira de la
+        cola y lanza TiempoEnColaError; una vez en ejecución se espera a que termine
+        """
+        futuro = self.enviar(funcion, *args, prioridad=prioridad, timeout_cola=timeout_cola, **kwargs)
+        limite = futuro.limite
+        while limite is not None:
+            try:
+                return futuro.result(timeout=max(0.0, limite - time.monotonic()))
+            except TimeoutError:
+                if self._retirar(futuro):
+                    raise TiempoEnColaError(
+                        f"La petición esperó {time.monotonic() - futuro.encolada:.1f}s en cola"
+                    )
+                # Un worker ya la tomó: el límite en cola ya no aplica
+                limite = None
+        return futuro.result()
+    
+    def _retirar(self, futuro):
+        """Quita de la cola la tarea de un futuro que sigue en espera; False si ya se tomó"""
+        with self._condicion:
+            for indice, (_, _, tarea) in enumerate(self._cola):
+                if tarea["futuro"] is futuro:
+                    break
+            else:
+                return False
+            self._cola[indice] = self._cola[-1]
+            self._cola.pop()
+            heapq.heapify(self._cola)
+            self._contadores["expiradas"] += 1
+            self._esperas[tarea["prioridad"]].append(time.monotonic() - tarea["encolada"])
+        futuro.cancel()
+        return True
+    
+    def _worker(self):
+        """Toma la tarea más prioritaria y la ejecuta (descarta las que expiraron)"""
+        while True:
+            with self._condicion:
+                while not self._cola and not self._detenido:
+                    self._condicion.wait()
+                if self._detenido and not self._cola:
+                    return
+                _, _, tarea = heapq.heappop(self._cola)
+                
+                ahora = time.monotonic()
+                espera = ahora - tarea["encolada"]
+                self._esperas[tarea["prioridad"]].append(espera)
+                
+                if tarea["limite"] is not None and ahora > tarea["limite"]:
+                    self._contadores["expiradas"] += 1
+                    tarea["futuro"].set_exception(
+                        TiempoEnColaError(f"La petición esperó {espera:.1f}s en cola")
+                    )
+                    continue
+                
+                if not tarea["futuro"].set_running_or_notify_cancel():
+                    continue
+                self._en_ejecucion += 1
+            
+            try:
+                resultado = tarea["funcion"](*tarea["args"], **tarea["kwargs"])
+            except BaseException as e:
+                with self._condicion:
+                    self._en_ejecucion -= 1
+                    self._contadores["fallidas"] += 1
+                tarea["futuro"].set_exception(e)
+            else:
+                with self._condicion:
+                    self._en_ejecucion -= 1
+                    self._contadores["completadas"] += 1
+                tarea["futuro"].set_result(resultado)
+    
+    def metricas(self):
+        """Retorna profundidad de cola, peticiones en ejecución, contadores y esperas"""
+        with self._condicion:
+            profundidad = {p: 0 for p in ORDEN_PRIORIDADES}
+            for _, _, tarea in self._cola:
+                profundidad[tarea["prioridad"]] += 1
+            esperas = {p: list(valores) for p, valores in self._esperas.items()}
+            resultado = {
+                "workers": self.workers,
+                "en_ejecucion": self._en_ejecucion,
+                "profundidad_cola": sum(profundidad.values()),
+                "profundidad_por_prioridad": profundidad,
+                **self._contadores
+            }
+        
+        resultado["espera_ms"] = {
+            p: {
+                "p50": percentil(valores, 50) * 1000,
+                "p95": percentil(valores, 95) * 1000,
+                "max": max(valores) * 1000 if valores else 0.0,
+                "muestras": len(valores)
+            }
+            for p, valores in esperas.items()
+        }
+        return resultado
+    
+    def detener(self):
+        """Detiene los workers después de vaciar la cola"""
+        with self._condicion:
+            self._detenido = True
+            self._condicion.notify_all()
+        for hilo in self._hilos:
+            hilo.join(timeout=5)
+
+class ProxyPlanificadorHandler(BaseHTTPRequestHandler):
+    """
+    Proxy HTTP compatible con la API de Ollama
+    Las peticiones de generación pasan por el planificador; la prioridad se
+    indica con la cabecera X-Prioridad (interactive | batch)
+    """
+    
+    planificador = None
+    upstream = None
+    pool = None
+    timeout_upstream = 600
+    _cabeceras_enviadas = False
+    
+    def log_message(self, format, *args):
+        """Silencia el log por petición del servidor HTTP"""
+        pass
+    
+    def _responder_json(self, datos, status=200):
+        cuerpo = json.dumps(datos, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+    
+    def _abrir_upstream(self, metodo, cuerpo):
+        """Abre la petición en Ollama (o en el mejor servidor del pool, con failover)"""
+        content_type = self.headers.get("Content-Type", "application/json")
+        if self.pool is not None:
+            return self.pool.abrir(self.path, cuerpo, metodo, content_type)
+        peticion = urllib.request.Request(
+            f"{self.upstream}{self.path}",
+            data=cuerpo,
+            method=metodo,
+            headers={"Content-Type": content_type}
+        )
+        return urllib.request.urlopen(peticion, timeout=self.timeout_upstream)
+    
+    def _reenviar(self, metodo, cuerpo=None):
+        """Reenvía la petición a Ollama y transmite la respuesta tal como llega"""
+        try:
+            with self._abrir_upstream(metodo, cuerpo) as respuesta:
+                self._transmitir(respuesta, respuesta.status)
+        except urllib.error.HTTPError as e:
+            if self._cabeceras_enviadas:
+                raise
+            with e:
+                self._transmitir(e, e.code)
+        
+    def _transmitir(self, respuesta, status):
+        self.send_response(status)
+        self._cabeceras_enviadas = True
+        self.send_header("Content-Type", respuesta.headers.get("Content-Type", "application/json"))
+        self.end_headers()
+        # Transmitir línea a línea para no retrasar el primer token del streaming
+        for linea in respuesta:
+            self.wfile.write(linea)
+            self.wfile.flush()
+    
+    def _responder_error(self, mensaje, status):
+        """
+        Responde con un error JSON si todavía no se envió nada; si la respuesta del
+        upstream ya empezó, una segunda respuesta corrompería el stream, así que se
+        cierra la conexión para que el cliente vea la respuesta truncada
+        """
+        if self._cabeceras_enviadas:
+            self.close_connection = True
+            return
+        self._responder_json({"error": mensaje}, status=status)
+    
+    def do_GET(self):
+        self._cabeceras_enviadas = False
+        if self.path == "/metrics":
+            self._responder_json(self.planificador.metricas())
+            return
+        try:
+            self._reenviar("GET")
+        except Exception as e:
+            self._responder_error(f"upstream: {e}", 502)
+    
+    def do_POST(self):
+        self._cabeceras_enviadas = False
+        longitud = int(self.headers.get("Content-Length") or 0)
+        cuerpo = self.rfile.read(longitud) if longitud else None
+        
+        if self.path not in ENDPOINTS_PLANIFICADOS:
+            try:
+                self._reenviar("POST", cuerpo)
+            except Exception as e:
+                self._responder_error(f"upstream: {e}", 502)
+            return
+        
+        prioridad = self.headers.get("X-Prioridad", PRIORIDAD_INTERACTIVA).strip().lower()
+        try:
+            self.planificador.ejecutar(self._reenviar, "POST", cuerpo, prioridad=prioridad)
+        except (ColaLlenaError, TiempoEnColaError) as e:
+            self._responder_error(str(e), 503)
+        except Exception as e:
+            self._responder_error(f"upstream: {e}", 502)
+
+def crear_proxy(host=None, port=None, upstream=None, planificador=None, pool=None):
+    """
+    Crea (sin arrancar) el proxy planificador
+    Sin upstream explícito y con varios servidores configurados, reenvía a través del pool
+    """
+    config = get_scheduler_config()
+    if pool is None and upstream is None:
+        from cliente_ollama import obtener_pool, usa_pool
+        if usa_pool():
+            pool = obtener_pool()
+    handler = type("ProxyPlanificadorConfigurado", (ProxyPlanificadorHandler,), {
+        "planificador": planificador or LLMScheduler(),
+        "upstream": (upstream or get_ollama_config()["base_url"]).rstrip("/"),
+        "pool": pool
+    })
+    servidor = ThreadingHTTPServer((host or config["host"], port if port is not None else config["port"]), handler)
+    servidor.daemon_threads = True
+    return servidor
+
+def main():
+    """Arranca el proxy planificador"""
+    config = get_scheduler_config()
+    parser = argparse.ArgumentParser(description="Planificador de peticiones a Ollama")
+    parser.add_argument("--host", default=config["host"])
+    parser.add_argument("--port", type=int, default=config["port"])
+    parser.add_argument("--upstream", help="URL de un único servidor Ollama (por defecto, OLLAMA_HOSTS)")
+    parser.add_argument("--workers", type=int, default=config["workers"])
+    args = parser.parse_args()
+    
+    planificador = LLMScheduler(workers=args.workers)
+    servidor = crear_proxy(args.host, args.port, args.upstream, planificador)
+    
+    print("=" * 60)
+    print("🚦 PLANIFICADOR DE PETICIONES AL LLM")
+    print("=" * 60)
+    print(f"📡 Escuchando en: http://{args.host}:{args.port}")
+    if servidor.RequestHandlerClass.pool is not None:
+        print(f"🎯 Ollama (pool con failover): {', '.join(e.url for e in servidor.RequestHandlerClass.pool.endpoints)}")
+    else:
+        print(f"🎯 Ollama: {servidor.RequestHandlerClass.upstream}")
+    print(f"👷 Workers: {planificador.workers} | Cola máxima: {planificador.max_queue}")
+    print(f"⏱️  Tiempo límite en cola: {planificador.timeouts[PRIORIDAD_INTERACTIVA]}s interactivas, "
+          f"{planificador.timeouts[PRIORIDAD_BATCH]}s batch")
+    print(f"📊 Métricas: http://{args.host}:{args.port}/metrics")
+    
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Planificador detenido")
+        planificador.detener()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+"""
+Estrategias de recuperación de chunks para el sistema RAG
+Selección adaptativa de k a partir de la distribución de scores
+y expansión de la consulta con búsquedas concurrentes (multi-query)
+"""
+
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, wait
+
+import numpy as np
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import (
+    get_search_config, get_context_config, get_multi_query_config,
+    get_ollama_config, get_chroma_config, get_models_config
+)
+from contexto import similitud_desde_distancia, estimar_tokens
+from cache_respuestas import obtener_id_chunk
+from trazas import en_contexto, obtener_tracer
+
+# Palabras vacías que se eliminan al generar la variante por palabras clave
+PALABRAS_VACIAS = {
+    "qué", "que", "cuál", "cual", "cuáles", "cuales", "cómo", "como", "cuándo", "cuando",
+    "dónde", "donde", "por", "para", "de", "del", "la", "las", "el", "los", "un", "una",
+    "unos", "unas", "y", "o", "en", "con", "sobre", "es", "son", "se", "su", "sus", "al",
+    "lo", "me", "explica", "explícame", "describe", "dime", "entre"
+}
+
+# Ejecutores compartidos (se crean al primer uso): uno para las búsquedas en Chroma y otro
+# para las llamadas a Ollama de la expansión (reformulaciones con LLM y sus embeddings).
+# Una llamada que se pasa del presupuesto se abandona, no se cancela: en su propio pool
+# no deja sin hilos a las búsquedas
+_ejecutor = None
+_ejecutor_expansion = None
+
+def _obtener_ejecutor():
+    """Retorna el pool de hilos compartido para las búsquedas multi-query"""
+    global _ejecutor
+    if _ejecutor is None:
+        _ejecutor = ThreadPoolExecutor(
+            max_workers=get_multi_query_config()["workers"],
+            thread_name_prefix="multiquery"
+        )
+    return _ejecutor
+
+def _obtener_ejecutor_expansion():
+    """Retorna el pool de hilos para las llamadas a Ollama de la expansión"""
+    global _ejecutor_expansion
+    if _ejecutor_expansion is None:
+        _ejecutor_expansion = ThreadPoolExecutor(
+            max_workers=get_multi_query_config()["expansion_workers"],
+            thread_name_prefix="multiquery-ollama"
+        )
+    return _ejecutor_expansion
+
+def buscar_por_vector(chroma_client, embedding, k):
+    """
+    Busca los k chunks más cercanos a un embedding
+    Retorna una lista de (Document, similitud) ordenada por similitud
+    """
+    # langchain_chroma retorna la distancia aunque el método hable de "relevance"
+    resultados = chroma_client.similarity_search_by_vector_with_relevance_scores(embedding, k=k)
+    return [(doc, similitud_desde_distancia(distancia)) for doc, distancia in resultados]
+
+def k_adaptativo(scores, k_min=None, k_max=None, salto_minimo=None, masa_acumulada=None):
+    """
+    Decide cuántos chunks conservar a partir de sus scores ordenados de mayor a menor:
+    1. Corta en el mayor salto entre scores consecutivos si supera salto_minimo
+    2. Si no hay un salto claro, corta cuando la suma de scores (sobre el peor
+       candidato del pool) alcanza la fracción masa_acumulada del total
+    Siempre respeta los límites k_min y k_max
+    """
+    config = get_search_config()
+    k_min = k_min if k_min is not None else config["k_min"]
+    k_max = k_max if k_max is not None else config["k_max"]
+    salto_minimo = salto_minimo if salto_minimo is not None else config["gap_min"]
+    masa_acumulada = masa_acumulada if masa_acumulada is not None else config["cumulative_share"]
+    
+    if len(scores) <= k_min:
+        return len(scores)
+    
+    limite = min(k_max, len(scores))
+    
+    # 1. Mayor salto: cortar después de la posición i-1 equivale a k = i
+    mejor_k, mejor_salto = None, 0.0
+    for k in range(k_min, limite + 1):
+        if k >= len(scores):
+            break
+        salto = scores[k - 1] - scores[k]
+        if salto > mejor_salto:
+            mejor_k, mejor_salto = k, salto
+    
+    if mejor_k is not None and mejor_salto >= salto_minimo:
+        return mejor_k
+    
+    # 2. Masa acumulada relativa al peor score del pool
+    piso = scores[-1]
+    pesos = [max(score - piso, 0.0) for score in scores]
+    total = sum(pesos)
+    if total <= 0:
+        return limite
+    
+    acumulado = 0.0
+    for k, peso in enumerate(pesos, start=1):
+        acumulado += peso
+        if acumulado >= masa_acumulada * total:
+            return max(k_min, min(k, limite))
+    
+    return limite
+
+def seleccionar_k_adaptativo(resultados, **limites):
+    """Ordena un pool de (Document, similitud) y conserva los k elegidos por k_adaptativo"""
+    ordenados = sorted(resultados, key=lambda r: r[1], reverse=True)
+    return ordenados[:k_adaptativo([score for _, score in ordenados], **limites)]
+
+def recuperar_adaptativo(chroma_client, embedding):
+    """
+    Recupera un pool de candidatos y lo recorta con la selección adaptativa de k
+    """
+    config = get_search_config()
+    pool = buscar_por_vector(chroma_client, embedding, config["candidate_pool"])
+    return seleccionar_k_adaptativo(pool)
+
+def reformulaciones_por_reglas(query, n):
+    """
+    Genera variantes de la consulta sin llamar a ningún modelo:
+    palabras clave, variantes de nombres de versión (YOLOv11 → YOLO11 / YOLO v11)
+    y una versión en forma de definición
+    """
+    limpia = re.sub(r"[¿?¡!.,;:]", " ", query).strip()
+    palabras = limpia.split()
+    variantes = []
+    
+    clave = " ".join(p for p in palabras if p.lower() not in PALABRAS_VACIAS)
+    if clave:
+        variantes.append(clave)
+    
+    versiones = re.sub(r"\b([A-Za-z]+)v(\d+)\b", r"\1\2", limpia)
+    if versiones != limpia:
+        variantes.append(versiones)
+        variantes.append(re.sub(r"\b([A-Za-z]+)v(\d+)\b", r"\1 v\2", limpia))
+    
+    if clave:
+        variantes.append(f"definición y características de {clave}")
+    
+    unicas = []
+    for variante in variantes:
+        if variante.lower() != query.lower() and variante not in unicas:
+            unicas.append(variante)
+    return unicas[:n]
+
+def reformulaciones_por_llm(query, n, modelo, timeout_s):
+    """
+    Pide a un modelo pequeño n reformulaciones de la consulta
+    Retorna None si el modelo no responde dentro del tiempo límite (o si el pool
+    de expansión sigue ocupado con llamadas anteriores que no respondieron)
+    """
+    from cliente_ollama import crear_llm
+    
+    llm = crear_llm(modelo, temperature=0.3)
+    prompt = (
+        f"Reescribe la siguiente pregunta de {n} formas distintas para buscar en artículos "
+        f"científicos. Usa sinónimos y términos técnicos. Responde solo con las preguntas, "
+        f"una por línea, sin numeración.\n\nPregunta: {query}"
+    )
+    
+    futuro = _obtener_ejecutor_expansion().submit(en_contexto(llm.invoke), prompt)
+    hechos, _ = wait([futuro], timeout=timeout_s)
+    if not hechos:
+        futuro.cancel()
+        return None
+    
+    try:
+        lineas = [l.strip(" -•\t") for l in futuro.result().splitlines()]
+    except Exception:
+        return None
+    return [l for l in lineas if l][:n]
+
+def fusionar_rrf(listas_resultados, constante=60):
+    """
+    Fusiona varias listas de (Document, similitud) con Reciprocal Rank Fusion
+    Retorna los chunks únicos como (Document, score RRF) ordenados por ese score
+    """
+    fusion = {}
+    for resultados in listas_resultados:
+        ordenados = sorted(resultados, key=lambda r: r[1], reverse=True)
+        for posicion, (doc, _) in enumerate(ordenados, start=1):
+            entrada = fusion.setdefault(obtener_id_chunk(doc), {"doc": doc, "rrf": 0.0})
+            entrada["rrf"] += 1.0 / (constante + posicion)
+    
+    ordenados = sorted(fusion.values(), key=lambda e: e["rrf"], reverse=True)
+    return [(e["doc"], e["rrf"]) for e in ordenados]
+
+def recortar_por_similitud(fusionados, similitudes, k):
+    """
+    Conserva, en el orden de RRF, los chunks cuya similitud con la pregunta original
+    está entre las k mejores (los empates con la k-ésima también entran). Cortar la
+    lista de RRF en la posición k dejaría chunks por debajo del salto que eligió k
+    """
+    if not fusionados or k <= 0:
+        return []
+    umbral = sorted(similitudes, reverse=True)[min(k, len(similitudes)) - 1]
+    return [(doc, similitud) for doc, similitud in zip(fusionados, similitudes) if similitud >= umbral]
+
+def similitudes_con_consulta(chroma_client, embedding, resultados_originales, documentos):
+    """
+    Similitud de cada documento con la pregunta original (no con la reformulación que lo
+    encontró): se toma de la búsqueda original o, si no apareció en ella, se calcula con
+    su vector guardado. Si el chunk no tiene ID en Chroma se usa la menor similitud de la
+    búsqueda original, que es una cota superior (quedó fuera de ese top)
+    """
+    similitudes = {obtener_id_chunk(doc): similitud for doc, similitud in resultados_originales}
+    faltantes = [obtener_id_chunk(doc) for doc in documentos if obtener_id_chunk(doc) not in similitudes]
+    if faltantes:
+        try:
+            guardados = chroma_client._collection.get(ids=faltantes, include=["embeddings"])
+            consulta = np.asarray(embedding, dtype=np.float32)
+            for chunk_id, vector in zip(guardados["ids"], guardados["embeddings"]):
+                distancia = float(np.sum((np.asarray(vector, dtype=np.float32) - consulta) ** 2))
+                similitudes[chunk_id] = similitud_desde_distancia(distancia)
+        except Exception:
+            pass
+    cota = min(similitudes.values()) if similitudes else 0.0
+    return [similitudes.get(obtener_id_chunk(doc), cota) for doc in documentos]
+
+def recuperar_multiconsulta(chroma_client, query, embedding, verbose=True):
+    """
+    Recupera chunks para la consulta original y sus reformulaciones:
+    1. Genera reformulaciones (reglas o modelo pequeño con tiempo límite)
+    2. Calcula todos sus embeddings en una sola llamada, dentro del presupuesto restante
+    3. Lanza las búsquedas en paralelo y espera como máximo el presupuesto restante
+    4. Fusiona los resultados con RRF: el orden de los chunks es el de RRF y cuáles se
+       conservan lo decide la similitud a la pregunta original (las k mejores según el
+       k adaptativo, ver recortar_por_similitud)
+    Los scores retornados son similitudes con la pregunta original, así la compuerta de
+    relevancia y CONTEXT_MIN_SCORE miden lo mismo que sin multi-query. La búsqueda
+    original tampoco espera más que el presupuesto: si sigue en cola, se hace directa
+    """
+    config = get_multi_query_config()
+    search_config = get_search_config()
+    inicio = time.perf_counter()
+    presupuesto_s = config["budget_ms"] / 1000.0
+    k_busqueda = search_config["candidate_pool"] if search_config["mode"] == "adaptive" else search_config["k"]
+    ejecutor = _obtener_ejecutor()
+    
+    def restante():
+        return max(presupuesto_s - (time.perf_counter() - inicio), 0)
+    
+    # La búsqueda original arranca antes de generar reformulaciones
+    futuro_original = ejecutor.submit(buscar_por_vector, chroma_client, embedding, k_busqueda)
+    
+    # La espera por las reformulaciones y sus embeddings (en el pool de expansión) se
+    # mide aparte para que no cuente como búsqueda vectorial
+    vectores = None
+    with obtener_tracer().span("query_expansion", generador=config["generator"]) as atributos:
+        reformulaciones = None
+        if config["generator"] == "llm":
+            reformulaciones = reformulaciones_por_llm(
+                query, config["count"], config["model"], presupuesto_s * config["llm_budget_share"]
+            )
+        if reformulaciones is None:
+            reformulaciones = reformulaciones_por_reglas(query, config["count"])
+        atributos["reformulaciones"] = len(reformulaciones)
+        
+        if reformulaciones and restante() > 0:
+            futuro_vectores = _obtener_ejecutor_expansion().submit(
+                en_contexto(chroma_client.embeddings.embed_documents), reformulaciones
+            )
+            hechos, _ = wait([futuro_vectores], timeout=restante())
+            if hechos and futuro_vectores.exception() is None:
+                vectores = futuro_vectores.result()
+            else:
+                futuro_vectores.cancel()
+    
+    futuros = []
+    if vectores:
+        futuros = [ejecutor.submit(buscar_por_vector, chroma_client, vector, k_busqueda) for vector in vectores]
+        wait(futuros, timeout=restante())
+    
+    try:
+        originales = futuro_original.result(timeout=restante())
+    except TimeoutError:
+        # En cola detrás de otras búsquedas: se hace aquí. Si ya está en curso, es
+        # una búsqueda normal que termina en lo mismo que tardaría la directa
+        originales = (buscar_por_vector(chroma_client, embedding, k_busqueda)
+                      if futuro_original.cancel() else futuro_original.result())
+    
+    listas = [originales]
+    completadas = 0
+    for futuro in futuros:
+        if futuro.done() and futuro.exception() is None:
+            listas.append(futuro.result())
+            completadas += 1
+        else:
+            futuro.cancel()
+    
+    fusionados = [doc for doc, _ in fusionar_rrf(listas)]
+    similitudes = similitudes_con_consulta(chroma_client, embedding, originales, fusionados)
+    if search_config["mode"] == "adaptive":
+        k = k_adaptativo(sorted(similitudes, reverse=True))
+        seleccionados = recortar_por_similitud(fusionados, similitudes, k)
+    else:
+        seleccionados = list(zip(fusionados, similitudes))[:search_config["k"]]
+    
+    if verbose:
+        duracion_ms = (time.perf_counter() - inicio) * 1000
+        print(f"🔀 Multi-query: {completadas}/{len(reformulaciones)} reformulaciones a tiempo, "
+              f"{len(fusionados)} chunks únicos → {len(seleccionados)} ({duracion_ms:.0f}ms)")
+    
+    return seleccionados
+
+def evaluar_k_adaptativo(chroma_client, embeddings, consultas):
+    """
+    Compara k fijo contra k adaptativo sobre un conjunto de preguntas
+    La cobertura mide qué fracción de los chunks relevantes del k fijo
+    (score >= CONTEXT_MIN_SCORE) conserva el modo adaptativo
+    """
+    config = get_search_config()
+    score_minimo = get_context_config()["min_score"]
+    filas = []
+    
+    for consulta in consultas:
+        embedding = embeddings.embed_query(consulta)
+        pool = buscar_por_vector(chroma_client, embedding, max(config["candidate_pool"], config["k"]))
+        
+        fijos = sorted(pool, key=lambda r: r[1], reverse=True)[:config["k"]]
+        adaptativos = seleccionar_k_adaptativo(pool)
+        
+        relevantes = {id(doc) for doc, score in fijos if score >= score_minimo}
+        conservados = {id(doc) for doc, _ in adaptativos}
+        cobertura = len(relevantes & conservados) / len(relevantes) if relevantes else 1.0
+        
+        filas.append({
+            "consulta": consulta,
+            "k_fijo": len(fijos),
+            "k_adaptativo": len(adaptativos),
+            "tokens_fijo": estimar_tokens("\n\n".join(doc.page_content for doc, _ in fijos)),
+            "tokens_adaptativo": estimar_tokens("\n\n".join(doc.page_content for doc, _ in adaptativos)),
+            "cobertura": cobertura
+        })
+    
+    return filas
+
+def main():
+    """Evalúa la selección adaptativa de k con las preguntas de ejemplo"""
+    from langchain_chroma import Chroma
+    from cliente_ollama import crear_embeddings
+    from relevancia import CONSULTAS_RELEVANTES
+    
+    print("=" * 60)
+    print("📐 EVALUACIÓN DE K ADAPTATIVO")
+    print("=" * 60)
+    
+    config = get_chroma_config()
+    embeddings = crear_embeddings(
+        get_models_config()["embedding_model"],
+        base_url=get_ollama_config()["base_url"]
+    )
+    chroma_client = Chroma(
+        collection_name=config["collection_name"],
+        embedding_function=embeddings,
+        persist_directory=config["persist_directory"]
+    )
+    
+    filas = evaluar_k_adaptativo(chroma_client, embeddings, CONSULTAS_RELEVANTES)
+    if not filas:
+        print("⚠️  No hay consultas para evaluar")
+        return
+    
+    for fila in filas:
+        print(f"\n🔍 {fila['consulta']}")
+        print(f"   k: {fila['k_fijo']} → {fila['k_adaptativo']}, "
+              f"tokens: ~{fila['tokens_fijo']} → ~{fila['tokens_adaptativo']}, "
+              f"cobertura: {fila['cobertura']:.0%}")
+    
+    n = len(filas)
+    k_fijo = sum(f["k_fijo"] for f in filas) / n
+    k_adaptativo = sum(f["k_adaptativo"] for f in filas) / n
+    tokens_fijo = sum(f["tokens_fijo"] for f in filas) / n
+    tokens_adaptativo = sum(f["tokens_adaptativo"] for f in filas) / n
+    cobertura = sum(f["cobertura"] for f in filas) / n
+    
+    print(f"\n📊 Promedios sobre {n} consultas:")
+    print(f"   - k: {k_fijo:.1f} → {k_adaptativo:.1f}")
+    print(f"   - Tokens de contexto: ~{tokens_fijo:.0f} → ~{tokens_adaptativo:.0f}")
+    print(f"   - Cobertura de chunks relevantes: {cobertura:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Compuerta de relevancia para el sistema RAG
+Evita llamar al LLM cuando ningún chunk recuperado es relevante para la pregunta
+"""
+
+import os
+import sys
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import get_relevance_config, get_ollama_config, get_chroma_config, get_models_config
+from contexto import similitud_desde_distancia
+
+RESPUESTA_SIN_CONTEXTO = (
+    "No encontré información relevante en los documentos indexados para responder "
+    "esta pregunta. Intenta reformularla o verifica que el documento esté vectorizado."
+)
+
+# Preguntas de calibración: las primeras están cubiertas por los PDFs, las segundas no
+CONSULTAS_RELEVANTES = [
+    "¿Qué es YOLOv11 y cuáles son sus características principales?",
+    "¿Cuáles son las mejoras de YOLOv11 sobre versiones anteriores?",
+    "¿Qué tareas de visión por computadora soporta YOLOv11?",
+    "¿Cuál es la diferencia entre YOLOv10 y YOLOv11?",
+    "¿Qué mecanismo de atención usa YOLOv12?",
+    "¿Qué datasets se usaron para evaluar YOLOv12?"
+]
+
+CONSULTAS_IRRELEVANTES = [
+    "¿Cuál es la receta tradicional del guacamole?",
+    "¿Quién ganó el mundial de fútbol de 1986?",
+    "¿Cómo se calcula el impuesto sobre la renta en México?",
+    "¿Cuál es la capital de Australia?",
+    "Recomiéndame una novela de ciencia ficción",
+    "¿Cómo cambio el aceite de un automóvil?"
+]
+
+def mejor_score(resultados):
+    """Retorna la similitud del chunk más relevante (o None si no hay resultados)"""
+    return max((score for _, score in resultados), default=None)
+
+def pasa_compuerta(resultados, umbral=None):
+    """
+    Indica si algún chunk recuperado supera el umbral de relevancia
+    resultados es una lista de (Document, similitud)
+    """
+    config = get_relevance_config()
+    if not config["enabled"]:
+        return True
+    
+    umbral = umbral if umbral is not None else config["min_score"]
+    score = mejor_score(resultados)
+    return score is not None and score >= umbral
+
+def calibrar_umbral(chroma_client, consultas_relevantes=None, consultas_irrelevantes=None, k=1):
+    """
+    Calcula el umbral que mejor separa preguntas cubiertas por los documentos
+    de preguntas fuera de dominio, usando el mejor score de cada una
+    En caso de empate se elige el umbral más bajo para no bloquear preguntas válidas
+    """
+    consultas_relevantes = consultas_relevantes or CONSULTAS_RELEVANTES
+    consultas_irrelevantes = consultas_irrelevantes or CONSULTAS_IRRELEVANTES
+    
+    def scores(consultas):
+        valores = []
+        for consulta in consultas:
+            resultados = chroma_client.similarity_search_with_score(consulta, k=k)
+            if resultados:
+                valores.append(max(similitud_desde_distancia(d) for _, d in resultados))
+        return valores
+    
+    positivos = scores(consultas_relevantes)
+    negativos = scores(consultas_irrelevantes)
+    if not positivos or not negativos:
+        return None
+    
+    candidatos = sorted(set(positivos + negativos))
+    mejor_umbral, mejor_aciertos = None, -1
+    for umbral in candidatos:
+        aciertos = sum(s >= umbral for s in positivos) + sum(s < umbral for s in negativos)
+        if aciertos > mejor_aciertos:
+            mejor_umbral, mejor_aciertos = umbral, aciertos
+    
+    # Centrar el umbral entre el positivo más bajo aceptado y el negativo más alto rechazado
+    rechazados = [s for s in negativos if s < mejor_umbral]
+    if rechazados:
+        mejor_umbral = (mejor_umbral + max(rechazados)) / 2
+    
+    return {
+        "umbral": mejor_umbral,
+        "precision": mejor_aciertos / (len(positivos) + len(negativos)),
+        "scores_relevantes": positivos,
+        "scores_irrelevantes": negativos
+    }
+
+def main():
+    """Calibra el umbral de la compuerta con las preguntas de ejemplo"""
+    from langchain_chroma import Chroma
+    from cliente_ollama import crear_embeddings
+    
+    print("=" * 60)
+    print("🎯 CALIBRACIÓN DE LA COMPUERTA DE RELEVANCIA")
+    print("=" * 60)
+    
+    config = get_chroma_config()
+    embeddings = crear_embeddings(
+        get_models_config()["embedding_model"],
+        base_url=get_ollama_config()["base_url"]
+    )
+    chroma_client = Chroma(
+        collection_name=config["collection_name"],
+        embedding_function=embeddings,
+        persist_directory=config["persist_directory"]
+    )
+    
+    resultado = calibrar_umbral(chroma_client)
+    if not resultado:
+        print("⚠️  No hay documentos suficientes para calibrar")
+        return
+    
+    print(f"📈 Scores de preguntas relevantes: "
+          f"{', '.join(f'{s:.3f}' for s in sorted(resultado['scores_relevantes']))}")
+    print(f"📉 Scores de preguntas irrelevantes: "
+          f"{', '.join(f'{s:.3f}' for s in sorted(resultado['scores_irrelevantes']))}")
+    print(f"\n✅ Umbral recomendado: {resultado['umbral']:.3f} "
+          f"(clasifica bien el {resultado['precision']:.0%} de las preguntas)")
+    print(f"💡 Actualiza RELEVANCE_GATE_MIN_SCORE en config.py "
+          f"(valor actual: {get_relevance_config()['min_score']})")
+
+if __name__ == "__main__":
+    main()
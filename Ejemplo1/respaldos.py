@@ -0,0 +1,657 @@
+"""
+Respaldos incrementales de chroma_data con bloques direccionados por contenido
+Cada archivo se divide en bloques de tamaño fijo identificados por su SHA-256; un
+respaldo solo comprime y escribe los bloques que el repositorio no tiene todavía y
+guarda un manifiesto (archivos -> lista de bloques) para restaurar ese momento.
+Los archivos con el mismo tamaño y fecha de modificación que en el respaldo
+anterior ni siquiera se leen, así que el tiempo depende de lo que cambió.
+La restauración extrae en paralelo, verifica las sumas, valida la colección y
+reemplaza el directorio de persistencia intercambiándolo con renameat2(RENAME_EXCHANGE)
+"""
+
+import argparse
+import ctypes
+import errno
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import get_backup_config, get_chroma_config
+
+VERSION_MANIFIESTO = 1
+
+# Archivos auxiliares de SQLite: su contenido ya entra en la copia consistente del .sqlite3
+SUFIJOS_SQLITE_AUXILIARES = ("-wal", "-shm", "-journal")
+
+# Base de Chroma; de ella salen los conteos que se validan al restaurar
+ARCHIVO_CHROMA = "chroma.sqlite3"
+
+# Intercambio de dos rutas en una sola operación (Linux >= 3.15, glibc >= 2.28)
+AT_FDCWD = -100
+RENAME_EXCHANGE = 2
+
+# Registro de un intercambio en curso cuando no hay RENAME_EXCHANGE (<dir>.intercambio)
+SUFIJO_INTERCAMBIO_PENDIENTE = ".intercambio"
+
+class RepositorioRespaldos:
+    """Directorio con bloques comprimidos (bloques/ab/abcd...) y manifiestos JSON"""
+    
+    def __init__(self, directorio=None):
+        self.directorio = directorio or get_backup_config()["directory"]
+        self.dir_bloques = os.path.join(self.directorio, "bloques")
+        self.dir_manifiestos = os.path.join(self.directorio, "manifiestos")
+        os.makedirs(self.dir_bloques, exist_ok=True)
+        os.makedirs(self.dir_manifiestos, exist_ok=True)
+    
+    def ruta_bloque(self, digest):
+        return os.path.join(self.dir_bloques, digest[:2], digest[2:])
+    
+    def tiene_bloque(self, digest):
+        return os.path.exists(self.ruta_bloque(digest))
+    
+    def guardar_bloque(self, digest, comprimido):
+        """Escribe el bloque con reemplazo atómico (dos hilos con el mismo bloque no se pisan)"""
+        ruta = self.ruta_bloque(digest)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        temporal = f"{ruta}.{uuid.uuid4().hex}.tmp"
+        with open(temporal, "wb") as f:
+            f.write(comprimido)
+        os.replace(temporal, ruta)
+    
+    def leer_bloque(self, digest):
+        with open(self.ruta_bloque(digest), "rb") as f:
+            return zlib.decompress(f.read())
+    
+    def manifiestos(self):
+        """IDs de los respaldos, del más antiguo al más reciente"""
+        return sorted(
+            nombre[:-5] for nombre in os.listdir(self.dir_manifiestos) if nombre.endswith(".json")
+        )
+    
+    def cargar_manifiesto(self, respaldo_id):
+        with open(os.path.join(self.dir_manifiestos, f"{respaldo_id}.json"), encoding="utf-8") as f:
+            return json.load(f)
+    
+    def ultimo_manifiesto(self):
+        ids = self.manifiestos()
+        return self.cargar_manifiesto(ids[-1]) if ids else None
+    
+    def guardar_manifiesto(self, manifiesto):
+        ruta = os.path.join(self.dir_manifiestos, f"{manifiesto['id']}.json")
+        temporal = f"{ruta}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(manifiesto, f, indent=2, ensure_ascii=False)
+        os.replace(temporal, ruta)
+
+def _archivos(directorio):
+    """Rutas relativas de los archivos a respaldar (sin los auxiliares de SQLite)"""
+    rutas = []
+    for raiz, _, archivos in os.walk(directorio):
+        for archivo in archivos:
+            if archivo.endswith(SUFIJOS_SQLITE_AUXILIARES):
+                continue
+            rutas.append(os.path.relpath(os.path.join(raiz, archivo), directorio))
+    return sorted(rutas)
+
+@contextmanager
+def _copia_consistente(ruta, directorio_temporal):
+    """
+    Para bases SQLite, una copia hecha con la API de backup (incluye el WAL y no ve
+    transacciones a medias); para el resto de archivos, el archivo tal cual
+    """
+    if not ruta.endswith(".sqlite3"):
+        yield ruta
+        return
+    descriptor, copia = tempfile.mkstemp(suffix=".sqlite3", dir=directorio_temporal)
+    os.close(descriptor)
+    try:
+        origen = sqlite3.connect(f"file:{ruta}?mode=ro", uri=True)
+        destino = sqlite3.connect(copia)
+        try:
+            origen.backup(destino)
+        finally:
+            destino.close()
+            origen.close()
+        yield copia
+    finally:
+        os.remove(copia)
+
+def ultima_escritura(ruta_sqlite):
+    """seq_id de la última escritura registrada (altas, cambios y borrados pasan por embeddings_queue)"""
+    conexion = sqlite3.connect(f"file:{ruta_sqlite}?mode=ro", uri=True)
+    try:
+        return conexion.execute(
+            "SELECT MAX(seq_id) FROM (SELECT seq_id FROM embeddings_queue UNION ALL SELECT seq_id FROM max_seq_id)"
+        ).fetchone()[0]
+    finally:
+        conexion.close()
+
+def contar_colecciones(ruta_sqlite):
+    """Chunks por colección según el segmento de metadatos (para validar una restauración)"""
+    conexion = sqlite3.connect(f"file:{ruta_sqlite}?mode=ro", uri=True)
+    try:
+        return dict(conexion.execute(
+            """
+            SELECT c.name, COUNT(e.id) FROM collections c
+            JOIN segments s ON s.collection = c.id AND s.scope = 'METADATA'
+            LEFT JOIN embeddings e ON e.segment_id = s.id
+            GROUP BY c.name
+            """
+        ).fetchall())
+    except sqlite3.DatabaseError:
+        return None
+    finally:
+        conexion.close()
+
+def _procesar_bloque(repositorio, bloque, nivel):
+    """Hash y, si el bloque es nuevo, compresión y escritura (zlib y hashlib liberan el GIL)"""
+    digest = hashlib.sha256(bloque).hexdigest()
+    if repositorio.tiene_bloque(digest):
+        return digest, 0
+    comprimido = zlib.compress(bloque, nivel)
+    repositorio.guardar_bloque(digest, comprimido)
+    return digest, len(comprimido)
+
+def _nuevo_id(repositorio):
+    base = datetime.now().strftime("%Y%m%d_%H%M%S")
+    existentes = set(repositorio.manifiestos())
+    respaldo_id, n = base, 1
+    while respaldo_id in existentes:
+        n += 1
+        respaldo_id = f"{base}_{n}"
+    return respaldo_id
+
+def _copiar_archivos(persist_directory, repositorio, config, archivos_previos, ejecutor, directorio_temporal):
+    """
+    Una pasada de copia: guarda los bloques de los archivos que cambiaron y retorna
+    (archivos, colecciones, resumen, movidos), donde movidos son los archivos que
+    cambiaron mientras se leían
+    """
+    archivos, colecciones, movidos = {}, None, []
+    resumen = {"archivos": 0, "reutilizados": 0, "bloques": 0, "bloques_nuevos": 0,
+               "bytes_origen": 0, "bytes_leidos": 0, "bytes_nuevos": 0}
+    en_vuelo_max = 2 * config["workers"]
+    
+    for relativa in _archivos(persist_directory):
+        ruta = os.path.join(persist_directory, relativa)
+        estado = os.stat(ruta)
+        firma = [estado.st_size, estado.st_mtime_ns]
+        resumen["archivos"] += 1
+        resumen["bytes_origen"] += estado.st_size
+        
+        anterior = archivos_previos.get(relativa)
+        if anterior and anterior["firma"] == firma:
+            archivos[relativa] = anterior
+            resumen["reutilizados"] += 1
+            resumen["bloques"] += len(anterior["bloques"])
+            continue
+        
+        with _copia_consistente(ruta, directorio_temporal) as origen:
+            if relativa == ARCHIVO_CHROMA:
+                colecciones = contar_colecciones(origen)
+            hash_archivo = hashlib.sha256()
+            futuros, tamano = [], 0
+            with open(origen, "rb") as f:
+                while True:
+                    bloque = f.read(config["block_size"])
+                    if not bloque:
+                        break
+                    hash_archivo.update(bloque)
+                    tamano += len(bloque)
+                    futuros.append(ejecutor.submit(_procesar_bloque, repositorio, bloque,
+                                                   config["compression_level"]))
+                    # Acota la memoria: no más de en_vuelo_max bloques leídos sin procesar
+                    pendientes = [futuro for futuro in futuros if not futuro.done()]
+                    if len(pendientes) >= en_vuelo_max:
+                        pendientes[0].result()
+        
+        # Los archivos HNSW se leen tal cual: si cambiaron durante la lectura la copia puede estar a medias
+        if origen == ruta:
+            estado = os.stat(ruta)
+            if [estado.st_size, estado.st_mtime_ns] != firma:
+                movidos.append(relativa)
+        
+        bloques = []
+        for futuro in futuros:
+            digest, escritos = futuro.result()
+            bloques.append(digest)
+            if escritos:
+                resumen["bloques_nuevos"] += 1
+                resumen["bytes_nuevos"] += escritos
+        resumen["bloques"] += len(bloques)
+        resumen["bytes_leidos"] += tamano
+        archivos[relativa] = {
+            "firma": firma,
+            "tamano": tamano,
+            "sha256": hash_archivo.hexdigest(),
+            "bloques": bloques
+        }
+    return archivos, colecciones, resumen, movidos
+
+def crear_respaldo(persist_directory=None, repositorio=None, config=None):
+    """
+    Crea un respaldo incremental y retorna su manifiesto
+    chroma.sqlite3 se copia con la API de backup, pero los archivos HNSW se leen tal cual:
+    si la base registró escrituras (su seq_id avanzó) o algún archivo cambió durante la
+    copia, se repite (solo se releen los archivos que cambiaron). Si tras
+    consistency_attempts pasadas sigue habiendo escrituras, el respaldo se guarda
+    marcado como inconsistente y restaurar_verificado() lo rechaza
+    """
+    config = config or get_backup_config()
+    persist_directory = persist_directory or get_chroma_config()["persist_directory"]
+    repositorio = repositorio or RepositorioRespaldos(config["directory"])
+    if not os.path.isdir(persist_directory):
+        raise FileNotFoundError(f"No existe {persist_directory}")
+    
+    inicio = time.perf_counter()
+    previo = repositorio.ultimo_manifiesto()
+    archivos_previos = previo["archivos"] if previo and previo["tamano_bloque"] == config["block_size"] else {}
+    manifiesto = {
+        "version": VERSION_MANIFIESTO,
+        "id": _nuevo_id(repositorio),
+        "creado": datetime.now().isoformat(),
+        "origen": os.path.abspath(persist_directory),
+        "tamano_bloque": config["block_size"],
+        "anterior": previo["id"] if previo else None,
+        "colecciones": previo.get("colecciones") if previo else None,
+        "archivos": {}
+    }
+    ruta_sqlite = os.path.join(persist_directory, ARCHIVO_CHROMA)
+    
+    def seq_id():
+        return ultima_escritura(ruta_sqlite) if os.path.exists(ruta_sqlite) else None
+    
+    acumulado = {"bloques_nuevos": 0, "bytes_leidos": 0, "bytes_nuevos": 0}
+    with ThreadPoolExecutor(max_workers=config["workers"], thread_name_prefix="respaldo") as ejecutor, \
+            tempfile.TemporaryDirectory(dir=repositorio.directorio) as directorio_temporal:
+        for intento in range(1, max(config["consistency_attempts"], 1) + 1):
+            antes = seq_id()
+            archivos, colecciones, resumen, movidos = _copiar_archivos(
+                persist_directory, repositorio, config, archivos_previos, ejecutor, directorio_temporal
+            )
+            consistente = seq_id() == antes and not movidos
+            for clave in acumulado:
+                acumulado[clave] += resumen[clave]
+            manifiesto["archivos"] = archivos
+            if colecciones is not None:
+                manifiesto["colecciones"] = colecciones
+            if consistente:
+                break
+            # La siguiente pasada reutiliza lo que no cambió desde esta
+            archivos_previos = {**archivos_previos, **archivos}
+            
+    resumen.update(acumulado)
+    resumen["intentos"] = intento
+    resumen["segundos"] = round(time.perf_counter() - inicio, 3)
+    manifiesto["resumen"] = resumen
+    manifiesto["consistente"] = consistente
+    # El manifiesto se escribe al final: un respaldo interrumpido no deja un manifiesto incompleto
+    repositorio.guardar_manifiesto(manifiesto)
+    return manifiesto
+
+def _extraer_bloque(repositorio, ruta, desplazamiento, digest):
+    """Descomprime un bloque, comprueba su SHA-256 y lo escribe en su posición del archivo"""
+    datos = repositorio.leer_bloque(digest)
+    if hashlib.sha256(datos).hexdigest() != digest:
+        raise ValueError(f"Bloque {digest[:12]} dañado en el repositorio")
+    with open(ruta, "r+b") as f:
+        f.seek(desplazamiento)
+        f.write(datos)
+    return len(datos)
+
+def _hash_archivo(ruta, tamano_lectura=4 * 1024 * 1024):
+    hash_archivo = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        while True:
+            datos = f.read(tamano_lectura)
+            if not datos:
+                break
+            hash_archivo.update(datos)
+    return hash_archivo.hexdigest()
+
+def restaurar(respaldo_id, destino, repositorio=None, workers=None):
+    """
+    Reconstruye en destino (vacío o inexistente) los archivos de un respaldo
+    Los bloques se extraen en paralelo, cada uno verificado contra su SHA-256, y
+    después se comprueba el SHA-256 de cada archivo contra el manifiesto
+    """
+    repositorio = repositorio or RepositorioRespaldos()
+    workers = workers or get_backup_config()["workers"]
+    manifiesto = repositorio.cargar_manifiesto(respaldo_id)
+    if os.path.exists(destino) and os.listdir(destino):
+        raise FileExistsError(f"{destino} no está vacío")
+    
+    tareas = []
+    for relativa, archivo in manifiesto["archivos"].items():
+        ruta = os.path.join(destino, relativa)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, "wb") as f:
+            f.truncate(archivo["tamano"])
+        desplazamiento = 0
+        for digest in archivo["bloques"]:
+            tareas.append((ruta, desplazamiento, digest))
+            desplazamiento += manifiesto["tamano_bloque"]
+    
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="restaurar") as ejecutor:
+        escritos = sum(ejecutor.map(lambda tarea: _extraer_bloque(repositorio, *tarea), tareas))
+        relativas = list(manifiesto["archivos"])
+        hashes = ejecutor.map(lambda relativa: _hash_archivo(os.path.join(destino, relativa)), relativas)
+        for relativa, digest in zip(relativas, hashes):
+            if digest != manifiesto["archivos"][relativa]["sha256"]:
+                raise ValueError(f"{relativa} no coincide con el manifiesto")
+    
+    manifiesto["restaurado"] = {"bloques": len(tareas), "bytes": escritos}
+    return manifiesto
+
+def verificar_respaldo(respaldo_id, repositorio=None, workers=None):
+    """Comprueba sin escribir nada que todos los bloques del respaldo existen y están intactos"""
+    repositorio = repositorio or RepositorioRespaldos()
+    workers = workers or get_backup_config()["workers"]
+    manifiesto = repositorio.cargar_manifiesto(respaldo_id)
+    bloques = sorted({digest for archivo in manifiesto["archivos"].values() for digest in archivo["bloques"]})
+    
+    def revisar(digest):
+        if not repositorio.tiene_bloque(digest):
+            return f"falta el bloque {digest[:12]}"
+        try:
+            if hashlib.sha256(repositorio.leer_bloque(digest)).hexdigest() != digest:
+                return f"bloque {digest[:12]} dañado"
+        except zlib.error as e:
+            return f"bloque {digest[:12]} ilegible: {e}"
+        return None
+    
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="verificar") as ejecutor:
+        problemas = [problema for problema in ejecutor.map(revisar, bloques) if problema]
+    return len(bloques), problemas
+
+def validar_coleccion(directorio, esperadas):
+    """
+    Abre la copia restaurada con Chroma: cada colección debe tener los chunks que
+    había al respaldar y una búsqueda con uno de sus vectores debe encontrarlo a distancia ~0
+    """
+    import chromadb
+    from chromadb.api.client import SharedSystemClient
+    
+    problemas = []
+    cliente = chromadb.PersistentClient(path=directorio)
+    try:
+        for nombre, esperado in (esperadas or {}).items():
+            coleccion = cliente.get_collection(nombre)
+            total = coleccion.count()
+            if total != esperado:
+                problemas.append(f"{nombre}: {total} chunks, se esperaban {esperado}")
+                continue
+            if total:
+                muestra = coleccion.get(limit=1, include=["embeddings"])
+                resultado = coleccion.query(query_embeddings=[muestra["embeddings"][0]], n_results=1,
+                                            include=["distances"])
+                if not resultado["ids"][0] or resultado["distances"][0][0] > 1e-3:
+                    problemas.append(f"{nombre}: la búsqueda de muestra no encontró el vector consultado")
+    finally:
+        # Libera los archivos para poder mover el directorio
+        SharedSystemClient.clear_system_cache()
+    return problemas
+
+def _renameat2_exchange(origen, destino):
+    """
+    Intercambia dos rutas existentes de forma atómica; retorna False si el sistema
+    o el sistema de archivos no lo soportan
+    """
+    try:
+        renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+    except (AttributeError, OSError):
+        return False
+    renameat2.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint]
+    renameat2.restype = ctypes.c_int
+    if renameat2(AT_FDCWD, os.fsencode(origen), AT_FDCWD, os.fsencode(destino), RENAME_EXCHANGE) == 0:
+        return True
+    codigo = ctypes.get_errno()
+    if codigo in (errno.ENOSYS, errno.EINVAL, errno.ENOTSUP):
+        return False
+    raise OSError(codigo, os.strerror(codigo), origen, None, destino)
+
+def recuperar_intercambio_pendiente(persist_directory=None):
+    """
+    Termina un intercambio por dos renombrados que se interrumpió (solo ocurre sin
+    RENAME_EXCHANGE): si el directorio de persistencia falta, se pone el preparado
+    (ya validado) o, si tampoco está, se devuelve el anterior. Retorna un mensaje o None
+    """
+    persist_directory = os.path.abspath(persist_directory or get_chroma_config()["persist_directory"])
+    registro = persist_directory + SUFIJO_INTERCAMBIO_PENDIENTE
+    if not os.path.exists(registro):
+        return None
+    with open(registro, encoding="utf-8") as f:
+        pendiente = json.load(f)
+    
+    mensaje = None
+    if not os.path.exists(persist_directory):
+        if os.path.isdir(pendiente["preparado"]):
+            os.rename(pendiente["preparado"], persist_directory)
+            mensaje = f"se completó el intercambio con {pendiente['preparado']}"
+        elif pendiente["anterior"] and os.path.isdir(pendiente["anterior"]):
+            os.rename(pendiente["anterior"], persist_directory)
+            mensaje = f"se devolvió {pendiente['anterior']}"
+    os.remove(registro)
+    return mensaje or "el intercambio ya estaba completo"
+
+def intercambiar_directorio(preparado, persist_directory, anterior=None):
+    """
+    Pone el directorio preparado en lugar del de persistencia; el actual queda como
+    <dir>.anterior-<fecha> o en la ruta indicada (retorna esa ruta o None si no existía).
+    Con RENAME_EXCHANGE el cambio es atómico. Si no está disponible se hace con dos
+    renombrados y se deja <dir>.intercambio mientras tanto para que
+    recuperar_intercambio_pendiente() lo termine si el proceso se interrumpe
+    """
+    if not os.path.exists(persist_directory):
+        os.rename(preparado, persist_directory)
+        return None
+    
+    anterior = anterior or f"{persist_directory}.anterior-{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    if _renameat2_exchange(preparado, persist_directory):
+        # El preparado ahora tiene el contenido anterior; persist_directory ya es el nuevo
+        try:
+            os.rename(preparado, anterior)
+        except OSError:
+            return preparado
+        return anterior
+    
+    registro = persist_directory + SUFIJO_INTERCAMBIO_PENDIENTE
+    with open(registro, "w", encoding="utf-8") as f:
+        json.dump({"preparado": preparado, "anterior": anterior}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        os.rename(persist_directory, anterior)
+    except OSError:
+        os.remove(registro)
+        raise
+    try:
+        os.rename(preparado, persist_directory)
+    except OSError:
+        os.rename(anterior, persist_directory)
+        os.remove(registro)
+        raise
+    os.remove(registro)
+    return anterior
+
+def restaurar_verificado(respaldo_id, persist_directory=None, repositorio=None, workers=None, forzar=False):
+    """
+    Restaura un respaldo sobre el directorio de persistencia:
+    1. extracción en paralelo a un directorio hermano, con sumas verificadas
+    2. validación de conteos y de una búsqueda de muestra
+    3. intercambio de directorios (el actual queda como <dir>.anterior-<fecha>)
+    Si algo falla antes del paso 3, el directorio actual no se toca. Los respaldos
+    marcados como inconsistentes solo se restauran con forzar=True
+    """
+    persist_directory = os.path.abspath(persist_directory or get_chroma_config()["persist_directory"])
+    recuperar_intercambio_pendiente(persist_directory)
+    repositorio = repositorio or RepositorioRespaldos()
+    if not forzar and repositorio.cargar_manifiesto(respaldo_id).get("consistente") is False:
+        raise ValueError(f"El respaldo {respaldo_id} es inconsistente (hubo escrituras durante la copia); "
+                         f"usa forzar=True para restaurarlo igualmente")
+    tiempos = {}
+    preparacion = f"{persist_directory}.restaurando-{respaldo_id}"
+    if os.path.exists(preparacion):
+        shutil.rmtree(preparacion)
+    
+    try:
+        inicio = time.perf_counter()
+        manifiesto = restaurar(respaldo_id, preparacion, repositorio, workers)
+        tiempos["extraccion_s"] = time.perf_counter() - inicio
+        
+        inicio = time.perf_counter()
+        problemas = validar_coleccion(preparacion, manifiesto.get("colecciones"))
+        tiempos["validacion_s"] = time.perf_counter() - inicio
+        if problemas:
+            raise ValueError("Validación fallida: " + "; ".join(problemas))
+    except Exception:
+        shutil.rmtree(preparacion, ignore_errors=True)
+        raise
+    
+    inicio = time.perf_counter()
+    anterior = intercambiar_directorio(preparacion, persist_directory)
+    tiempos["intercambio_s"] = time.perf_counter() - inicio
+    
+    return {
+        "id": respaldo_id,
+        "directorio": persist_directory,
+        "anterior": anterior,
+        "colecciones": manifiesto.get("colecciones"),
+        "bytes": manifiesto["restaurado"]["bytes"],
+        "tiempos": {clave: round(valor, 3) for clave, valor in tiempos.items()}
+    }
+
+def imprimir_restauracion(resultado):
+    """Muestra el resultado de restaurar_verificado()"""
+    tiempos = resultado["tiempos"]
+    total = sum(tiempos.values())
+    print(f"✅ Respaldo {resultado['id']} restaurado en {resultado['directorio']} ({total:.2f}s)")
+    print(f"   - Extracción verificada: {_mb(resultado['bytes']):.2f} MB en {tiempos['extraccion_s']:.2f}s "
+          f"({_mb(resultado['bytes']) / max(tiempos['extraccion_s'], 1e-9):.0f} MB/s)")
+    colecciones = ", ".join(f"{nombre}: {total}" for nombre, total in (resultado["colecciones"] or {}).items())
+    print(f"   - Validación ({colecciones or 'sin colecciones'}): {tiempos['validacion_s']:.2f}s")
+    print(f"   - Intercambio de directorios: {tiempos['intercambio_s'] * 1000:.1f}ms")
+    if resultado["anterior"]:
+        print(f"   💡 El directorio anterior quedó en {resultado['anterior']} (bórralo cuando confirmes)")
+
+def purgar(conservar=None, repositorio=None):
+    """
+    Borra los manifiestos más antiguos (conserva los `conservar` más recientes) y los
+    bloques que ya no referencia ningún manifiesto. Retorna (manifiestos, bloques, bytes) borrados
+    """
+    conservar = conservar or get_backup_config()["keep"]
+    repositorio = repositorio or RepositorioRespaldos()
+    ids = repositorio.manifiestos()
+    borrar = ids[:-conservar] if len(ids) > conservar else []
+    for respaldo_id in borrar:
+        os.remove(os.path.join(repositorio.dir_manifiestos, f"{respaldo_id}.json"))
+    
+    referenciados = set()
+    for respaldo_id in repositorio.manifiestos():
+        for archivo in repositorio.cargar_manifiesto(respaldo_id)["archivos"].values():
+            referenciados.update(archivo["bloques"])
+    
+    bloques, liberados = 0, 0
+    for prefijo in os.listdir(repositorio.dir_bloques):
+        carpeta = os.path.join(repositorio.dir_bloques, prefijo)
+        for nombre in os.listdir(carpeta):
+            if prefijo + nombre not in referenciados:
+                ruta = os.path.join(carpeta, nombre)
+                liberados += os.path.getsize(ruta)
+                os.remove(ruta)
+                bloques += 1
+    return len(borrar), bloques, liberados
+
+def tamano_repositorio(repositorio):
+    """Bytes ocupados por los bloques del repositorio"""
+    total = 0
+    for raiz, _, archivos in os.walk(repositorio.dir_bloques):
+        total += sum(os.path.getsize(os.path.join(raiz, archivo)) for archivo in archivos)
+    return total
+
+def _mb(bytes_):
+    return bytes_ / (1024 * 1024)
+
+def imprimir_resumen(manifiesto):
+    """Muestra lo que hizo un respaldo"""
+    resumen = manifiesto["resumen"]
+    print(f"✅ Respaldo {manifiesto['id']} en {resumen['segundos']:.2f}s")
+    print(f"   - Archivos: {resumen['archivos']} ({resumen['reutilizados']} sin cambios, no se leyeron)")
+    print(f"   - Datos: {_mb(resumen['bytes_origen']):.2f} MB, leídos {_mb(resumen['bytes_leidos']):.2f} MB")
+    print(f"   - Bloques: {resumen['bloques']} ({resumen['bloques_nuevos']} nuevos, "
+          f"{_mb(resumen['bytes_nuevos']):.2f} MB comprimidos escritos)")
+    if manifiesto.get("consistente") is False:
+        print(f"   ⚠️  Hubo escrituras durante las {resumen['intentos']} copias: respaldo marcado como inconsistente")
+    elif resumen.get("intentos", 1) > 1:
+        print(f"   - Copia repetida por escrituras concurrentes ({resumen['intentos']} intentos)")
+
+def main():
+    """Crea, lista, verifica, restaura o purga respaldos"""
+    config = get_backup_config()
+    parser = argparse.ArgumentParser(description="Respaldos incrementales de chroma_data")
+    subcomandos = parser.add_subparsers(dest="comando")
+    subcomandos.add_parser("crear", help="Crear un respaldo incremental")
+    subcomandos.add_parser("listar", help="Listar respaldos")
+    restaurar_parser = subcomandos.add_parser(
+        "restaurar", help="Restaurar un respaldo sobre chroma_data (verificado, con intercambio de directorios)"
+    )
+    restaurar_parser.add_argument("id")
+    restaurar_parser.add_argument("--destino", help="Solo extraer (verificado) en este directorio, sin intercambio")
+    restaurar_parser.add_argument("--forzar", action="store_true", help="Restaurar aunque esté marcado como inconsistente")
+    verificar_parser = subcomandos.add_parser("verificar", help="Comprobar la integridad de un respaldo")
+    verificar_parser.add_argument("id", nargs="?", help="Por defecto, el más reciente")
+    purgar_parser = subcomandos.add_parser("purgar", help="Borrar respaldos antiguos y bloques sin uso")
+    purgar_parser.add_argument("--conservar", type=int, default=config["keep"])
+    args = parser.parse_args()
+    
+    print("=" * 60)
+    print("💾 RESPALDOS INCREMENTALES")
+    print("=" * 60)
+    
+    repositorio = RepositorioRespaldos(config["directory"])
+    if args.comando == "listar":
+        for respaldo_id in repositorio.manifiestos():
+            manifiesto = repositorio.cargar_manifiesto(respaldo_id)
+            resumen = manifiesto["resumen"]
+            aviso = " ⚠️  inconsistente" if manifiesto.get("consistente") is False else ""
+            print(f"   - {respaldo_id}: {resumen['archivos']} archivos, {_mb(resumen['bytes_origen']):.2f} MB, "
+                  f"+{_mb(resumen['bytes_nuevos']):.2f} MB nuevos{aviso}")
+        print(f"📦 Repositorio: {_mb(tamano_repositorio(repositorio)):.2f} MB en {repositorio.directorio}")
+    elif args.comando == "restaurar" and args.destino:
+        manifiesto = restaurar(args.id, args.destino, repositorio)
+        print(f"✅ Respaldo {manifiesto['id']} restaurado en {args.destino} ({len(manifiesto['archivos'])} archivos)")
+    elif args.comando == "restaurar":
+        print("⚠️  Detén los procesos que usan la base de datos antes de restaurar")
+        imprimir_restauracion(restaurar_verificado(args.id, repositorio=repositorio, forzar=args.forzar))
+    elif args.comando == "verificar":
+        ids = repositorio.manifiestos()
+        respaldo_id = args.id or (ids[-1] if ids else None)
+        if not respaldo_id:
+            print("ℹ️ No hay respaldos")
+            return
+        bloques, problemas = verificar_respaldo(respaldo_id, repositorio)
+        for problema in problemas:
+            print(f"   ❌ {problema}")
+        print(f"{'❌' if problemas else '✅'} {respaldo_id}: {bloques} bloques, {len(problemas)} con problemas")
+        sys.exit(1 if problemas else 0)
+    elif args.comando == "purgar":
+        manifiestos, bloques, liberados = purgar(args.conservar, repositorio)
+        print(f"🧹 {manifiestos} respaldos y {bloques} bloques borrados ({_mb(liberados):.2f} MB liberados)")
+    else:
+        imprimir_resumen(crear_respaldo(repositorio=repositorio, config=config))
+
+if __name__ == "__main__":
+    main()
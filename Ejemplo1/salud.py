@@ -0,0 +1,193 @@
+"""
+Chequeo de salud concurrente con plazos y resultado en caché
+Sondea Chroma (count y una búsqueda de 1 resultado con un vector ya guardado) y
+cada servidor Ollama (/api/tags, sin generar embeddings ni texto) en paralelo;
+ningún sondeo puede retrasar el chequeo más allá de HEALTH_TIMEOUT_S
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import get_chroma_config, get_health_config, get_models_config, get_ollama_config
+from escaneo import obtener_coleccion, primer_registro
+
+# Los servidores Ollama se reportan uno a uno, pero el estado general solo depende
+# de que haya alguno con cada modelo (el pool de cliente_ollama hace failover)
+CHECKS_PRINCIPALES = ("chroma", "search", "embeddings", "llm")
+
+def _tiene_modelo(modelos, modelo):
+    """Ollama lista los modelos con etiqueta (nomic-embed-text:latest)"""
+    return modelo in modelos or (":" not in modelo and f"{modelo}:latest" in modelos)
+
+class HealthChecker:
+    """Sondeos de salud en paralelo, con plazo estricto y caché de corta duración"""
+    
+    def __init__(self, chroma_client, hosts=None, modelos=None, timeout_s=None, ttl_s=None):
+        """Recibe el cliente Chroma (LangChain o chromadb); los servidores y modelos salen de config.py"""
+        config = get_health_config()
+        self.coleccion = obtener_coleccion(chroma_client)
+        self.hosts = [url.rstrip("/") for url in (hosts or get_ollama_config()["hosts"])]
+        self.modelos = modelos or get_models_config()
+        self.timeout_s = config["timeout_s"] if timeout_s is None else timeout_s
+        self.ttl_s = config["cache_ttl_s"] if ttl_s is None else ttl_s
+        
+        self._ejecutor = ThreadPoolExecutor(max_workers=2 + len(self.hosts), thread_name_prefix="salud")
+        self._en_curso = {}
+        self._vector = None
+        self._ultimo = None
+        self._lock = threading.Lock()
+    
+    # ------------------------------------------------------------------
+    # Sondeos individuales
+    # ------------------------------------------------------------------
+    
+    def _sondear_chroma(self):
+        documentos = self.coleccion.count()
+        return {"documentos": documentos, "detalle": f"{documentos} documentos"}
+    
+    def _sondear_busqueda(self):
+        """Búsqueda de 1 resultado con el embedding de un registro (se lee una sola vez)"""
+        if self._vector is None:
+            registro = primer_registro(self.coleccion, include=("embeddings",))
+            if registro is None:
+                return {"ok": None, "detalle": "no probada (sin documentos)"}
+            self._vector = list(registro["embedding"])
+        self.coleccion.query(query_embeddings=[self._vector], n_results=1, include=[])
+        return {"detalle": "1 resultado"}
+    
+    def _sondear_ollama(self, url):
+        with urllib.request.urlopen(f"{url}/api/tags", timeout=self.timeout_s) as respuesta:
+            datos = json.loads(respuesta.read().decode("utf-8"))
+        modelos = [modelo["name"] for modelo in datos.get("models", [])]
+        return {"modelos": modelos, "detalle": f"{len(modelos)} modelos"}
+    
+    # ------------------------------------------------------------------
+    # Chequeo completo
+    # ------------------------------------------------------------------
+    
+    def _lanzar(self, nombre, funcion, *args):
+        """
+        Envía el sondeo al pool salvo que el anterior del mismo nombre siga colgado:
+        así un servicio que no responde no acumula hilos
+        """
+        anterior = self._en_curso.get(nombre)
+        if anterior is not None and not anterior.done():
+            return anterior, False
+        futuro = self._ejecutor.submit(self._medir, funcion, *args)
+        self._en_curso[nombre] = futuro
+        return futuro, True
+    
+    @staticmethod
+    def _medir(funcion, *args):
+        inicio = time.perf_counter()
+        resultado = funcion(*args)
+        resultado.setdefault("ok", True)
+        resultado["ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+        return resultado
+    
+    def _ejecutar(self):
+        inicio = time.perf_counter()
+        sondeos = {
+            "chroma": (self._sondear_chroma,),
+            "search": (self._sondear_busqueda,)
+        }
+        for url in self.hosts:
+            sondeos[f"ollama:{url}"] = (self._sondear_ollama, url)
+        
+        lanzados = {nombre: self._lanzar(nombre, *sondeo) for nombre, sondeo in sondeos.items()}
+        wait([futuro for futuro, nuevo in lanzados.values() if nuevo], timeout=self.timeout_s)
+        
+        checks = {}
+        for nombre, (futuro, nuevo) in lanzados.items():
+            if not futuro.done():
+                motivo = "sin respuesta" if nuevo else "el sondeo anterior sigue sin responder"
+                checks[nombre] = {"ok": False, "detalle": f"{motivo} (plazo {self.timeout_s}s)"}
+            elif futuro.exception() is not None:
+                checks[nombre] = {"ok": False, "detalle": str(futuro.exception())}
+            else:
+                checks[nombre] = futuro.result()
+        
+        # Embeddings y LLM: algún servidor que responde tiene el modelo
+        for check, modelo in (("embeddings", self.modelos["embedding_model"]), ("llm", self.modelos["llm_model"])):
+            servidores = [
+                url for url in self.hosts
+                if checks[f"ollama:{url}"]["ok"] and _tiene_modelo(checks[f"ollama:{url}"]["modelos"], modelo)
+            ]
+            checks[check] = {
+                "ok": bool(servidores),
+                "detalle": f"{modelo} en {', '.join(servidores)}" if servidores else f"{modelo} no disponible"
+            }
+        
+        return {
+            "ok": all(checks[nombre]["ok"] is not False for nombre in CHECKS_PRINCIPALES),
+            "checks": checks,
+            "timestamp": time.time(),
+            "duracion_ms": round((time.perf_counter() - inicio) * 1000, 2)
+        }
+    
+    def verificar(self, forzar=False):
+        """
+        Retorna el último resultado si tiene menos de ttl_s segundos; si no, sondea.
+        Las llamadas simultáneas esperan al mismo sondeo en vez de lanzar otro
+        """
+        with self._lock:
+            if not forzar and self._ultimo and time.time() - self._ultimo["timestamp"] < self.ttl_s:
+                return dict(self._ultimo, cacheado=True)
+            self._ultimo = self._ejecutar()
+            return dict(self._ultimo, cacheado=False)
+    
+    def detener(self):
+        """Libera el pool sin esperar a los sondeos colgados"""
+        self._ejecutor.shutdown(wait=False)
+
+def imprimir_salud(resultado):
+    """Muestra un resultado de HealthChecker.verificar()"""
+    for nombre, check in resultado["checks"].items():
+        icono = "✅" if check["ok"] else ("⚠️ " if check["ok"] is None else "❌")
+        duracion = f" [{check['ms']:.0f}ms]" if "ms" in check else ""
+        print(f"{icono} {nombre}: {check['detalle']}{duracion}")
+    origen = " (caché)" if resultado.get("cacheado") else ""
+    print(f"\n⏱️  Chequeo en {resultado['duracion_ms']:.0f}ms{origen}")
+
+def main():
+    """Ejecuta un chequeo de salud; con --watch N lo repite cada N segundos"""
+    import argparse
+    from langchain_chroma import Chroma
+    
+    parser = argparse.ArgumentParser(description="Chequeo de salud de Chroma y Ollama")
+    parser.add_argument("--watch", type=float, help="Repetir cada N segundos")
+    args = parser.parse_args()
+    
+    config = get_chroma_config()
+    cliente = Chroma(collection_name=config["collection_name"], persist_directory=config["persist_directory"])
+    checker = HealthChecker(cliente)
+    resultado = None
+    
+    print("=" * 60)
+    print("🏥 CHEQUEO DE SALUD")
+    print("=" * 60)
+    try:
+        while True:
+            resultado = checker.verificar()
+            imprimir_salud(resultado)
+            print("🎉 Todo en orden" if resultado["ok"] else "⚠️  Hay servicios con problemas")
+            if not args.watch:
+                break
+            time.sleep(args.watch)
+            print("-" * 60)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        checker.detener()
+    sys.exit(0 if resultado and resultado["ok"] else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Servidor stub que imita la API de Ollama para pruebas locales
+Responde /api/generate, /api/chat, /api/embed, /api/embeddings, /api/tags y /api/version
+con latencias configurables, sin necesidad de GPU ni modelos reales
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DIMENSION_EMBEDDINGS = 768
+
+def embedding_determinista(texto, dimension=DIMENSION_EMBEDDINGS):
+    """
+    Genera un vector normalizado y reproducible a partir del texto
+    (el mismo texto siempre produce el mismo embedding)
+    """
+    valores = []
+    bloque = 0
+    while len(valores) < dimension:
+        digest = hashlib.sha256(f"{bloque}|{texto}".encode("utf-8")).digest()
+        valores.extend((b - 127.5) / 127.5 for b in digest)
+        bloque += 1
+    valores = valores[:dimension]
+    norma = math.sqrt(sum(v * v for v in valores)) or 1.0
+    return [v / norma for v in valores]
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    """Manejador HTTP que imita los endpoints de Ollama"""
+    
+    # Valores por defecto, sobrescritos por crear_servidor()
+    latencia_s = 0.2
+    tokens_por_segundo = 50.0
+    tokens_respuesta = 20
+    latencia_embeddings_s = 0.01
+    nombre = "stub"
+    
+    def log_message(self, format, *args):
+        """Silencia el log por petición del servidor HTTP"""
+        pass
+    
+    def _leer_json(self):
+        longitud = int(self.headers.get("Content-Length") or 0)
+        cuerpo = self.rfile.read(longitud) if longitud else b"{}"
+        return json.loads(cuerpo or b"{}")
+    
+    def _responder_json(self, datos, status=200):
+        cuerpo = json.dumps(datos).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+    
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._responder_json({"models": [
+                {"name": "nomic-embed-text:latest"},
+                {"name": "gpt-oss:20b"},
+                {"name": "gpt-oss:120b"},
+                {"name": "gemma3:12b"},
+                {"name": "llama3.1:8b"}
+            ]})
+        elif self.path == "/api/version":
+            self._responder_json({"version": f"stub-{self.nombre}"})
+        elif self.path == "/":
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b"Ollama is running")
+        else:
+            self._responder_json({"error": "not found"}, status=404)
+    
+    def do_HEAD(self):
+        self.send_response(200)
+        self.end_headers()
+    
+    def do_POST(self):
+        try:
+            datos = self._leer_json()
+        except ValueError:
+            self._responder_json({"error": "invalid json"}, status=400)
+            return
+        
+        if self.path in ("/api/generate", "/api/chat"):
+            self._generar(datos, chat=self.path == "/api/chat")
+        elif self.path == "/api/embed":
+            entradas = datos.get("input", "")
+            if isinstance(entradas, str):
+                entradas = [entradas]
+            time.sleep(self.latencia_embeddings_s * len(entradas))
+            self._responder_json({
+                "model": datos.get("model", ""),
+                "embeddings": [embedding_determinista(t) for t in entradas]
+            })
+        elif self.path == "/api/embeddings":
+            time.sleep(self.latencia_embeddings_s)
+            self._responder_json({"embedding": embedding_determinista(datos.get("prompt", ""))})
+        else:
+            self._responder_json({"error": "not found"}, status=404)
+    
+    def _generar(self, datos, chat=False):
+        """Simula la generación: latencia de prefill y luego tokens a ritmo fijo"""
+        modelo = datos.get("model", "")
+        stream = datos.get("stream", True)
+        tokens = [f"token{i} " for i in range(self.tokens_respuesta)]
+        inicio = time.time()
+        
+        time.sleep(self.latencia_s)
+        
+        def fragmento(texto, hecho):
+            base = {"model": modelo, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"), "done": hecho}
+            if chat:
+                base["message"] = {"role": "assistant", "content": texto}
+            else:
+                base["response"] = texto
+            if hecho:
+                base["total_duration"] = int((time.time() - inicio) * 1e9)
+                base["eval_count"] = len(tokens)
+                base["served_by"] = self.nombre
+            return base
+        
+        if not stream:
+            time.sleep(len(tokens) / self.tokens_por_segundo)
+            respuesta = fragmento("".join(tokens), True)
+            self._responder_json(respuesta)
+            return
+        
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for token in tokens:
+            time.sleep(1.0 / self.tokens_por_segundo)
+            self.wfile.write((json.dumps(fragmento(token, False)) + "\n").encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write((json.dumps(fragmento("", True)) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+def crear_servidor(host="127.0.0.1", port=11500, latencia_ms=200, tokens_por_segundo=50.0,
+                   tokens_respuesta=20, nombre=None):
+    """
+    Crea (sin arrancar) un servidor stub con su propia configuración de latencia
+    Usar port=0 para que el sistema asigne un puerto libre
+    """
+    atributos = {
+        "latencia_s": latencia_ms / 1000.0,
+        "tokens_por_segundo": tokens_por_segundo,
+        "tokens_respuesta": tokens_respuesta,
+        "nombre": nombre or f"{host}:{port}"
+    }
+    handler = type("StubOllamaHandlerConfigurado", (StubOllamaHandler,), atributos)
+    servidor = ThreadingHTTPServer((host, port), handler)
+    servidor.daemon_threads = True
+    return servidor
+
+def arrancar_en_hilo(**kwargs):
+    """Arranca un servidor stub en un hilo de fondo y retorna (servidor, base_url)"""
+    servidor = crear_servidor(**kwargs)
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    host, port = servidor.server_address[:2]
+    return servidor, f"http://{host}:{port}"
+
+def main():
+    """Arranca el servidor stub desde la línea de comandos"""
+    parser = argparse.ArgumentParser(description="Servidor stub de la API de Ollama")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--latencia-ms", type=float, default=200, help="Latencia antes del primer token")
+    parser.add_argument("--tokens-por-segundo", type=float, default=50.0)
+    parser.add_argument("--tokens-respuesta", type=int, default=20)
+    args = parser.parse_args()
+    
+    servidor = crear_servidor(
+        host=args.host,
+        port=args.port,
+        latencia_ms=args.latencia_ms,
+        tokens_por_segundo=args.tokens_por_segundo,
+        tokens_respuesta=args.tokens_respuesta
+    )
+    print(f"🧪 Stub de Ollama escuchando en http://{args.host}:{args.port}")
+    print(f"   - Latencia: {args.latencia_ms}ms, {args.tokens_por_segundo} tokens/s")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Stub detenido")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Pruebas del pool de servidores Ollama contra dos servidores stub
+Cubren failover, enfriamiento de un servidor caído, peticiones duplicadas y el
+planificador reenviando a través del pool. No necesitan Ollama ni GPU
+"""
+
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from cliente_ollama import OllamaPool
+from planificador_llm import LLMScheduler, crear_proxy
+from servidor_stub_ollama import arrancar_en_hilo
+
+def _url_sin_servidor():
+    """URL de un puerto local en el que no escucha nadie"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+def _stub(latencia_ms, nombre):
+    return arrancar_en_hilo(port=0, latencia_ms=latencia_ms, tokens_por_segundo=1000.0,
+                            tokens_respuesta=3, nombre=nombre)
+
+def _cerrar(*servidores):
+    for servidor in servidores:
+        servidor.shutdown()
+        servidor.server_close()
+
+def test_failover_y_enfriamiento():
+    """Un servidor caído se salta, queda fuera durante el enfriamiento y luego se reintenta"""
+    print("🔍 Probando failover y enfriamiento...")
+    vivo, url_vivo = _stub(10, "vivo")
+    url_caido = _url_sin_servidor()
+    pool = OllamaPool(hosts=[url_caido, url_vivo], intervalo_salud_s=0, hedge=False)
+    pool.enfriamiento_s = 0.5
+    caido = pool.endpoints[0]
+    try:
+        # Sin latencias previas se elige el primero de la lista: el caído
+        assert pool.generar("hola", "stub") == "token0 token1 token2 "
+        assert pool.contadores["failovers"] == 1, pool.contadores
+        assert caido.errores == 1 and not caido.disponible()
+        
+        # Durante el enfriamiento no se vuelve a intentar
+        pool.generar("hola", "stub")
+        assert caido.errores == 1, caido.errores
+        assert pool.contadores["failovers"] == 1, pool.contadores
+        
+        # Pasado el enfriamiento vuelve a ser candidato (y vuelve a fallar)
+        time.sleep(0.6)
+        assert caido.disponible()
+        pool.generar("hola", "stub")
+        assert caido.errores == 2, caido.errores
+        assert pool.contadores["failovers"] == 2 and pool.contadores["fallidas"] == 0, pool.contadores
+    finally:
+        pool.detener()
+        _cerrar(vivo)
+    print(f"✅ Failover al servidor vivo y {caido.errores} reintentos del caído respetando el enfriamiento")
+
+def test_peticion_duplicada():
+    """Si el primer servidor supera el p95, se duplica en el otro y gana la respuesta más rápida"""
+    print("\n🔍 Probando peticiones duplicadas...")
+    lento, url_lento = _stub(2000, "lento")
+    rapido, url_rapido = _stub(10, "rapido")
+    pool = OllamaPool(hosts=[url_lento, url_rapido], intervalo_salud_s=0, hedge=True)
+    pool.hedge_min_espera_ms = 50
+    # p95 previo de ~20ms y preferencia por el lento para que sea el primero
+    pool._latencias["generate:stub:1"] = deque([20.0] * pool.hedge_min_muestras, maxlen=200)
+    pool.endpoints[0].latencia_ewma_ms = 1.0
+    pool.endpoints[1].latencia_ewma_ms = 100.0
+    try:
+        inicio = time.monotonic()
+        respuesta = pool.generar("hola", "stub")
+        segundos = time.monotonic() - inicio
+    finally:
+        pool.detener()
+        _cerrar(lento, rapido)
+    
+    assert respuesta == "token0 token1 token2 "
+    assert pool.contadores["duplicadas"] == 1 and pool.contadores["duplicadas_ganadoras"] == 1, pool.contadores
+    assert segundos < 1.0, f"tardó {segundos:.2f}s: esperó al servidor lento"
+    print(f"✅ Duplicado en el servidor rápido, respuesta en {segundos:.2f}s")
+
+def test_lotes_no_usan_el_p95_de_consultas():
+    """Los lotes de embeddings tienen su propia ventana de latencias y los grandes no se duplican"""
+    print("\n🔍 Probando la ventana de latencias por tamaño de lote...")
+    uno, url_uno = _stub(10, "uno")
+    dos, url_dos = _stub(10, "dos")
+    pool = OllamaPool(hosts=[url_uno, url_dos], intervalo_salud_s=0, hedge=True)
+    pool.hedge_min_espera_ms = 0
+    # p95 de consultas sueltas de 1ms: cualquier lote lo superaría
+    consultas = deque([1.0] * pool.hedge_min_muestras, maxlen=200)
+    pool._latencias["embed:1"] = consultas
+    pool._latencias["embed:16"] = deque([1.0] * pool.hedge_min_muestras, maxlen=200)
+    try:
+        vectores = pool.embed([f"texto {i}" for i in range(16)], "stub")
+        pool.embed([f"texto {i}" for i in range(3)], "stub")
+    finally:
+        pool.detener()
+        _cerrar(uno, dos)
+    
+    assert len(vectores) == 16
+    assert pool.contadores["duplicadas"] == 0, pool.contadores
+    assert len(consultas) == pool.hedge_min_muestras, "los lotes entraron en la ventana de consultas"
+    assert len(pool._latencias["embed:4"]) == 1 and len(pool._latencias["embed:16"]) == pool.hedge_min_muestras + 1
+    print(f"✅ Sin duplicados; ventanas: {', '.join(sorted(pool._latencias))}")
+
+def test_error_de_peticion_sin_failover():
+    """Un 4xx se propaga sin enfriar el servidor ni repetir la petición en otro"""
+    print("\n🔍 Probando errores 4xx...")
+    uno, url_uno = _stub(10, "uno")
+    dos, url_dos = _stub(10, "dos")
+    pool = OllamaPool(hosts=[url_uno, url_dos], intervalo_salud_s=0, hedge=False)
+    try:
+        # El stub responde 404 a las rutas que no conoce, como Ollama a un modelo sin descargar
+        pool.solicitar("/api/no-existe", {"model": "stub"}, "prueba")
+        raise AssertionError("se esperaba un HTTPError 404")
+    except urllib.error.HTTPError as e:
+        codigo = e.code
+    finally:
+        pool.detener()
+        _cerrar(uno, dos)
+    
+    assert codigo == 404, codigo
+    assert pool.contadores["failovers"] == 0 and pool.contadores["fallidas"] == 1, pool.contadores
+    assert all(e.disponible() and e.errores == 0 for e in pool.endpoints), pool.estadisticas()
+    assert sum(e.peticiones for e in pool.endpoints) == 1
+    print("✅ 404 propagado; ningún servidor quedó en enfriamiento")
+
+def test_planificador_con_pool():
+    """El proxy planificador reenvía a través del pool y conserva el failover"""
+    print("\n🔍 Probando el planificador sobre el pool...")
+    vivo, url_vivo = _stub(10, "vivo")
+    pool = OllamaPool(hosts=[_url_sin_servidor(), url_vivo], intervalo_salud_s=0, hedge=False)
+    planificador = LLMScheduler(workers=1, max_queue=10)
+    proxy = crear_proxy("127.0.0.1", 0, planificador=planificador, pool=pool)
+    threading.Thread(target=proxy.serve_forever, daemon=True).start()
+    host, port = proxy.server_address[:2]
+    try:
+        cuerpo = json.dumps({"model": "stub", "prompt": "hola", "stream": False}).encode("utf-8")
+        peticion = urllib.request.Request(f"http://{host}:{port}/api/generate", data=cuerpo, method="POST",
+                                          headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(peticion, timeout=10) as respuesta:
+            datos = json.loads(respuesta.read())
+    finally:
+        proxy.shutdown()
+        proxy.server_close()
+        planificador.detener()
+        pool.detener()
+        _cerrar(vivo)
+    
+    assert datos["served_by"] == "vivo", datos
+    assert pool.contadores["failovers"] == 1, pool.contadores
+    print("✅ La generación planificada pasó al servidor vivo")
+
+def main():
+    """Ejecuta las pruebas del pool de servidores Ollama"""
+    print("=" * 60)
+    print("🧪 PRUEBAS DEL POOL DE SERVIDORES OLLAMA")
+    print("=" * 60)
+    
+    tests = [
+        ("Failover y enfriamiento", test_failover_y_enfriamiento),
+        ("Petición duplicada", test_peticion_duplicada),
+        ("Ventanas por tamaño de lote", test_lotes_no_usan_el_p95_de_consultas),
+        ("Error 4xx sin failover", test_error_de_peticion_sin_failover),
+        ("Planificador con pool", test_planificador_con_pool),
+    ]
+    
+    fallidas = 0
+    for test_name, test_func in tests:
+        try:
+            test_func()
+        except Exception as e:
+            fallidas += 1
+            print(f"❌ Error en prueba {test_name}: {e!r}")
+    
+    print(f"\n🎯 Resultado: {len(tests) - fallidas}/{len(tests)} pruebas pasaron")
+    sys.exit(1 if fallidas else 0)
+
+if __name__ == "__main__":
+    main()
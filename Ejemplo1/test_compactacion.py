@@ -0,0 +1,145 @@
+"""
+Pruebas de la compactación de la base tras borrados masivos
+Trabajan sobre una colección pequeña generada en un directorio temporal (no necesitan Ollama)
+"""
+
+import os
+import sys
+import tempfile
+
+import chromadb
+import numpy as np
+from chromadb.api.client import SharedSystemClient
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import compactacion
+from compactacion import EscriturasDuranteCompactacionError, compactar
+
+COLECCION = "documentos_pdf"
+CHUNKS = 200
+DIMENSION = 16
+CONFIG = {"batch_size": 50, "benchmark_queries": 5, "benchmark_k": 3}
+
+def _crear_base(directorio):
+    """Crea una colección con CHUNKS vectores aleatorios, borra la mitad y la cierra"""
+    generador = np.random.default_rng(11)
+    coleccion = chromadb.PersistentClient(path=directorio).get_or_create_collection(COLECCION)
+    coleccion.add(
+        ids=[f"chunk_{i}" for i in range(CHUNKS)],
+        embeddings=generador.random((CHUNKS, DIMENSION), dtype=np.float32).tolist(),
+        documents=[f"Texto del chunk {i}" for i in range(CHUNKS)],
+        metadatas=[{"pagina": i} for i in range(CHUNKS)]
+    )
+    coleccion.delete(ids=[f"chunk_{i}" for i in range(0, CHUNKS, 2)])
+    SharedSystemClient.clear_system_cache()
+
+def _coleccion(directorio):
+    return chromadb.PersistentClient(path=directorio).get_collection(COLECCION)
+
+def _escribir(directorio, chunk_id):
+    """Escritura de otro proceso sobre la base original"""
+    _coleccion(directorio).add(ids=[chunk_id], embeddings=[[0.5] * DIMENSION], documents=["Escritura concurrente"])
+
+def test_compactar_conserva_los_chunks():
+    """La compactación copia las entradas vivas y deja la base anterior aparte"""
+    print("🔍 Probando la compactación tras borrar la mitad de los chunks...")
+    with tempfile.TemporaryDirectory() as temporal:
+        persist_directory = os.path.join(temporal, "chroma_data")
+        _crear_base(persist_directory)
+        resultado = compactar(persist_directory, COLECCION, CONFIG)
+        
+        assert resultado["colecciones"] == {COLECCION: CHUNKS // 2}, resultado["colecciones"]
+        coleccion = _coleccion(persist_directory)
+        assert coleccion.count() == CHUNKS // 2
+        assert coleccion.get(ids=["chunk_1"], include=["metadatas"])["metadatas"] == [{"pagina": 1}]
+        assert not coleccion.get(ids=["chunk_0"])["ids"]
+        SharedSystemClient.clear_system_cache()
+        assert os.path.isdir(resultado["anterior"]) and not os.path.exists(f"{persist_directory}.compactando")
+    print(f"✅ {CHUNKS // 2} chunks vivos copiados; la base anterior quedó en {os.path.basename(resultado['anterior'])}")
+
+def test_escritura_durante_la_copia():
+    """Una escritura mientras se copia a la sombra cancela la compactación sin tocar la base"""
+    print("\n🔍 Probando una escritura durante la copia...")
+    copiar_auxiliares = compactacion._copiar_auxiliares
+    
+    def copiar_y_escribir(persist_directory, sombra):
+        copiar_auxiliares(persist_directory, sombra)
+        _escribir(persist_directory, "durante_la_copia")
+    
+    with tempfile.TemporaryDirectory() as temporal:
+        persist_directory = os.path.join(temporal, "chroma_data")
+        _crear_base(persist_directory)
+        compactacion._copiar_auxiliares = copiar_y_escribir
+        try:
+            compactar(persist_directory, COLECCION, CONFIG)
+            raise AssertionError("se esperaba EscriturasDuranteCompactacionError")
+        except EscriturasDuranteCompactacionError:
+            pass
+        finally:
+            compactacion._copiar_auxiliares = copiar_auxiliares
+        
+        coleccion = _coleccion(persist_directory)
+        assert coleccion.count() == CHUNKS // 2 + 1, coleccion.count()
+        assert coleccion.get(ids=["durante_la_copia"])["ids"] == ["durante_la_copia"]
+        SharedSystemClient.clear_system_cache()
+        hermanos = [nombre for nombre in os.listdir(temporal) if nombre.startswith("chroma_data.")]
+        assert not hermanos, hermanos
+    print("✅ Compactación cancelada; la escritura sigue en la base y no quedó la sombra")
+
+def test_escritura_justo_antes_del_intercambio():
+    """Una escritura entre la última comprobación y el intercambio deshace el intercambio"""
+    print("\n🔍 Probando una escritura justo antes del intercambio...")
+    intercambiar = compactacion.intercambiar_directorio
+    
+    def escribir_e_intercambiar(preparado, persist_directory, anterior=None):
+        if anterior is None:
+            _escribir(persist_directory, "antes_del_intercambio")
+            SharedSystemClient.clear_system_cache()
+        return intercambiar(preparado, persist_directory, anterior=anterior)
+    
+    with tempfile.TemporaryDirectory() as temporal:
+        persist_directory = os.path.join(temporal, "chroma_data")
+        _crear_base(persist_directory)
+        compactacion.intercambiar_directorio = escribir_e_intercambiar
+        try:
+            compactar(persist_directory, COLECCION, CONFIG)
+            raise AssertionError("se esperaba EscriturasDuranteCompactacionError")
+        except EscriturasDuranteCompactacionError:
+            pass
+        finally:
+            compactacion.intercambiar_directorio = intercambiar
+        
+        coleccion = _coleccion(persist_directory)
+        assert coleccion.get(ids=["antes_del_intercambio"])["ids"] == ["antes_del_intercambio"]
+        SharedSystemClient.clear_system_cache()
+        hermanos = [nombre for nombre in os.listdir(temporal) if nombre.startswith("chroma_data.")]
+        assert not hermanos, hermanos
+    print("✅ Intercambio deshecho; la base con la escritura volvió a su sitio")
+
+def main():
+    """Ejecuta las pruebas de compactación"""
+    print("=" * 60)
+    print("🧪 PRUEBAS DE COMPACTACIÓN")
+    print("=" * 60)
+    
+    tests = [
+        ("Compactar conserva los chunks", test_compactar_conserva_los_chunks),
+        ("Escritura durante la copia", test_escritura_durante_la_copia),
+        ("Escritura antes del intercambio", test_escritura_justo_antes_del_intercambio),
+    ]
+    
+    fallidas = 0
+    for test_name, test_func in tests:
+        try:
+            test_func()
+        except Exception as e:
+            fallidas += 1
+            print(f"❌ Error en prueba {test_name}: {e!r}")
+    
+    print(f"\n🎯 Resultado: {len(tests) - fallidas}/{len(tests)} pruebas pasaron")
+    sys.exit(1 if fallidas else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Pruebas de la exportación e importación columnar de colecciones
+Trabajan sobre una colección pequeña generada en un directorio temporal (no necesitan Ollama)
+"""
+
+import os
+import sys
+import tempfile
+
+import chromadb
+import numpy as np
+from chromadb.api.client import SharedSystemClient
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from exportacion import exportar, importar, iterar_grupos, leer_cabecera
+
+COLECCION = "documentos_pdf"
+CHUNKS = 130
+DIMENSION = 16
+LOTE = 50
+
+def _crear_base(directorio):
+    """Crea una colección con CHUNKS vectores aleatorios (reproducibles)"""
+    generador = np.random.default_rng(3)
+    coleccion = chromadb.PersistentClient(path=directorio).get_or_create_collection(COLECCION)
+    coleccion.add(
+        ids=[f"chunk_{i}" for i in range(CHUNKS)],
+        embeddings=generador.random((CHUNKS, DIMENSION), dtype=np.float32).tolist(),
+        documents=[f"Texto del chunk {i} con acentos: recuperación" for i in range(CHUNKS)],
+        metadatas=[{"pagina": i, "fuente": f"doc_{i % 3}.pdf"} for i in range(CHUNKS)]
+    )
+    return coleccion
+
+def _contenido(coleccion):
+    """IDs, textos, metadatos y vectores ordenados por ID"""
+    datos = coleccion.get(include=["embeddings", "documents", "metadatas"])
+    orden = np.argsort(datos["ids"])
+    return (
+        [datos["ids"][i] for i in orden],
+        [datos["documents"][i] for i in orden],
+        [datos["metadatas"][i] for i in orden],
+        np.asarray(datos["embeddings"], dtype=np.float32)[orden]
+    )
+
+def test_ida_y_vuelta():
+    """Exportar e importar en otra base conserva IDs, textos, metadatos y vectores"""
+    print("🔍 Probando la exportación e importación de ida y vuelta...")
+    with tempfile.TemporaryDirectory() as temporal:
+        original = _crear_base(os.path.join(temporal, "origen"))
+        ruta = os.path.join(temporal, "coleccion.chromacol")
+        exportado = exportar(original, ruta, float16=False, tamano_lote=LOTE, nivel=6)
+        assert exportado["filas"] == CHUNKS and exportado["grupos"] == 3, exportado
+        assert leer_cabecera(ruta)["dimension"] == DIMENSION
+        
+        destino = os.path.join(temporal, "destino")
+        importado = importar(ruta, destino, tamano_lote=LOTE)
+        assert importado["filas"] == CHUNKS, importado
+        
+        ids, textos, metadatos, vectores = _contenido(original)
+        ids_2, textos_2, metadatos_2, vectores_2 = _contenido(
+            chromadb.PersistentClient(path=destino).get_collection(COLECCION)
+        )
+        assert ids == ids_2 and textos == textos_2 and metadatos == metadatos_2
+        assert np.array_equal(vectores, vectores_2), "los vectores float32 cambiaron"
+        
+        # Con float16 los vectores pierden precisión, pero no más de la del tipo
+        ruta_16 = os.path.join(temporal, "coleccion_16.chromacol")
+        exportar(original, ruta_16, float16=True, tamano_lote=LOTE, nivel=6)
+        vectores_16 = np.concatenate([grupo["embeddings"] for grupo in iterar_grupos(ruta_16)])
+        ids_16 = [chunk_id for grupo in iterar_grupos(ruta_16) for chunk_id in grupo["ids"]]
+        vectores_16 = vectores_16[np.argsort(ids_16)]
+        assert np.allclose(vectores, vectores_16, atol=1e-3)
+        proporcion = os.path.getsize(ruta_16) / exportado["bytes"]
+        SharedSystemClient.clear_system_cache()
+    print(f"✅ {CHUNKS} chunks en {exportado['grupos']} grupos, idénticos tras importar "
+          f"({proporcion:.0%} del tamaño con float16)")
+
+def test_columna_danada():
+    """Un byte cambiado en una columna se detecta por su CRC y la importación no deja nada"""
+    print("\n🔍 Probando una columna dañada...")
+    with tempfile.TemporaryDirectory() as temporal:
+        original = _crear_base(os.path.join(temporal, "origen"))
+        ruta = os.path.join(temporal, "coleccion.chromacol")
+        exportar(original, ruta, float16=False, tamano_lote=LOTE, nivel=6)
+        
+        # Invierte un byte en mitad de la columna de vectores del segundo grupo
+        desplazamiento, longitud, _ = leer_cabecera(ruta)["grupos"][1]["columnas"]["embeddings"]
+        with open(ruta, "r+b") as f:
+            f.seek(desplazamiento + longitud // 2)
+            byte = f.read(1)
+            f.seek(-1, os.SEEK_CUR)
+            f.write(bytes([byte[0] ^ 0xFF]))
+        
+        try:
+            list(iterar_grupos(ruta))
+            raise AssertionError("se esperaba un error de CRC")
+        except ValueError as e:
+            mensaje = str(e)
+        assert "embeddings" in mensaje and "grupo 2" in mensaje, mensaje
+        
+        destino = os.path.join(temporal, "destino")
+        try:
+            importar(ruta, destino, tamano_lote=LOTE)
+            raise AssertionError("la importación de un archivo dañado debería fallar")
+        except ValueError:
+            pass
+        colecciones = [coleccion.name for coleccion in chromadb.PersistentClient(path=destino).list_collections()]
+        assert not colecciones, colecciones
+        SharedSystemClient.clear_system_cache()
+    print(f"✅ {mensaje}; el destino quedó sin colecciones a medias")
+
+def main():
+    """Ejecuta las pruebas de exportación e importación"""
+    print("=" * 60)
+    print("🧪 PRUEBAS DE EXPORTACIÓN E IMPORTACIÓN")
+    print("=" * 60)
+    
+    tests = [
+        ("Ida y vuelta", test_ida_y_vuelta),
+        ("Columna dañada", test_columna_danada),
+    ]
+    
+    fallidas = 0
+    for test_name, test_func in tests:
+        try:
+            test_func()
+        except Exception as e:
+            fallidas += 1
+            print(f"❌ Error en prueba {test_name}: {e!r}")
+    
+    print(f"\n🎯 Resultado: {len(tests) - fallidas}/{len(tests)} pruebas pasaron")
+    sys.exit(1 if fallidas else 0)
+
+if __name__ == "__main__":
+    main()
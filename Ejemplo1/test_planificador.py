@@ -0,0 +1,145 @@
+"""
+Pruebas del planificador de peticiones al LLM contra el servidor stub de Ollama
+No necesitan Ollama ni GPU: cada prueba arranca su propio stub y su propio proxy
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from planificador_llm import (PRIORIDAD_BATCH, PRIORIDAD_INTERACTIVA, LLMScheduler,
+                              crear_proxy)
+from servidor_stub_ollama import arrancar_en_hilo
+
+def _arrancar(latencia_ms, timeouts=None):
+    """Arranca stub + proxy con un único worker y retorna (url_proxy, planificador, cerrar)"""
+    stub, url_stub = arrancar_en_hilo(port=0, latencia_ms=latencia_ms,
+                                      tokens_por_segundo=1000.0, tokens_respuesta=5)
+    planificador = LLMScheduler(workers=1, max_queue=10, timeouts=timeouts or {
+        PRIORIDAD_INTERACTIVA: 30,
+        PRIORIDAD_BATCH: 30
+    })
+    proxy = crear_proxy("127.0.0.1", 0, url_stub, planificador)
+    threading.Thread(target=proxy.serve_forever, daemon=True).start()
+    host, port = proxy.server_address[:2]
+    
+    def cerrar():
+        proxy.shutdown()
+        proxy.server_close()
+        planificador.detener()
+        stub.shutdown()
+        stub.server_close()
+    
+    return f"http://{host}:{port}", planificador, cerrar
+
+def _generar(url, prioridad, etiqueta):
+    """POST /api/generate a través del proxy; retorna (status, segundos)"""
+    cuerpo = json.dumps({"model": "stub", "prompt": etiqueta, "stream": False}).encode("utf-8")
+    peticion = urllib.request.Request(f"{url}/api/generate", data=cuerpo, method="POST", headers={
+        "Content-Type": "application/json",
+        "X-Prioridad": prioridad
+    })
+    inicio = time.monotonic()
+    try:
+        with urllib.request.urlopen(peticion, timeout=30) as respuesta:
+            json.loads(respuesta.read())
+            status = respuesta.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, time.monotonic() - inicio
+
+def _esperar(condicion, timeout=5.0):
+    limite = time.monotonic() + timeout
+    while not condicion():
+        if time.monotonic() > limite:
+            raise AssertionError("La condición no se cumplió a tiempo")
+        time.sleep(0.01)
+
+def _en_hilo(funcion, *args):
+    hilo = threading.Thread(target=funcion, args=args, daemon=True)
+    hilo.start()
+    return hilo
+
+def test_prioridad_interactiva():
+    """Con el worker ocupado, una interactiva encolada al final se atiende antes que las batch"""
+    print("🔍 Probando el orden por prioridad...")
+    url, planificador, cerrar = _arrancar(latencia_ms=200)
+    orden = []
+    bloqueo = threading.Lock()
+    
+    def peticion(prioridad, etiqueta):
+        status, _ = _generar(url, prioridad, etiqueta)
+        with bloqueo:
+            orden.append((etiqueta, status))
+    
+    try:
+        hilos = [_en_hilo(peticion, PRIORIDAD_BATCH, "ocupa-worker")]
+        _esperar(lambda: planificador.metricas()["en_ejecucion"] == 1)
+        for i in range(2):
+            hilos.append(_en_hilo(peticion, PRIORIDAD_BATCH, f"batch-{i}"))
+        _esperar(lambda: planificador.metricas()["profundidad_cola"] == 2)
+        hilos.append(_en_hilo(peticion, PRIORIDAD_INTERACTIVA, "interactiva"))
+        _esperar(lambda: planificador.metricas()["profundidad_cola"] == 3)
+        for hilo in hilos:
+            hilo.join(timeout=10)
+    finally:
+        cerrar()
+    
+    etiquetas = [etiqueta for etiqueta, _ in orden]
+    assert all(status == 200 for _, status in orden), orden
+    assert etiquetas[:2] == ["ocupa-worker", "interactiva"], etiquetas
+    print(f"✅ Orden de atención: {', '.join(etiquetas)}")
+
+def test_tiempo_limite_en_cola():
+    """Una petición que no llega a un worker responde 503 al vencer su límite, sin esperar al upstream"""
+    print("\n🔍 Probando el tiempo límite en cola...")
+    url, planificador, cerrar = _arrancar(latencia_ms=1500, timeouts={
+        PRIORIDAD_INTERACTIVA: 0.3,
+        PRIORIDAD_BATCH: 30
+    })
+    try:
+        ocupante = _en_hilo(_generar, url, PRIORIDAD_BATCH, "ocupa-worker")
+        _esperar(lambda: planificador.metricas()["en_ejecucion"] == 1)
+        status, segundos = _generar(url, PRIORIDAD_INTERACTIVA, "interactiva")
+        metricas = planificador.metricas()
+        ocupante.join(timeout=10)
+    finally:
+        cerrar()
+    
+    assert status == 503, status
+    assert segundos < 1.0, f"respondió en {segundos:.2f}s, después de que el upstream terminara"
+    assert metricas["expiradas"] == 1, metricas
+    assert metricas["profundidad_cola"] == 0, metricas
+    print(f"✅ 503 tras {segundos:.2f}s en cola, petición retirada de la cola")
+
+def main():
+    """Ejecuta las pruebas del planificador"""
+    print("=" * 60)
+    print("🧪 PRUEBAS DEL PLANIFICADOR DE PETICIONES")
+    print("=" * 60)
+    
+    tests = [
+        ("Prioridad interactiva", test_prioridad_interactiva),
+        ("Tiempo límite en cola", test_tiempo_limite_en_cola),
+    ]
+    
+    fallidas = 0
+    for test_name, test_func in tests:
+        try:
+            test_func()
+        except Exception as e:
+            fallidas += 1
+            print(f"❌ Error en prueba {test_name}: {e!r}")
+    
+    print(f"\n🎯 Resultado: {len(tests) - fallidas}/{len(tests)} pruebas pasaron")
+    sys.exit(1 if fallidas else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Pruebas de la selección de chunks en la recuperación multi-query
+No necesitan Ollama ni Chroma: trabajan sobre listas de scores
+"""
+
+import os
+import sys
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from recuperacion import k_adaptativo, recortar_por_similitud
+
+# Similitud con la pregunta original; las reformulaciones ponen D y E arriba en RRF
+SIMILITUDES = {"A": 0.90, "B": 0.85, "C": 0.60, "D": 0.55, "E": 0.55}
+ORDEN_RRF = ["D", "A", "E", "B", "C"]
+LIMITES = {"k_min": 1, "k_max": 5, "salto_minimo": 0.1, "masa_acumulada": 0.8}
+
+def test_corte_por_similitud_en_orden_rrf():
+    """El corte adaptativo conserva los chunks sobre el salto, aunque RRF los ponga más abajo"""
+    print("🔍 Probando el recorte adaptativo sobre el orden de RRF...")
+    similitudes = [SIMILITUDES[doc] for doc in ORDEN_RRF]
+    k = k_adaptativo(sorted(similitudes, reverse=True), **LIMITES)
+    seleccionados = recortar_por_similitud(ORDEN_RRF, similitudes, k)
+    
+    assert k == 2, k
+    assert seleccionados == [("A", 0.90), ("B", 0.85)], seleccionados
+    print(f"✅ k={k}: {', '.join(doc for doc, _ in seleccionados)} (D y E quedan bajo el salto)")
+
+def test_empates_con_el_umbral():
+    """Los chunks empatados con la k-ésima similitud entran todos, en orden de RRF"""
+    print("\n🔍 Probando empates con el umbral...")
+    similitudes = [SIMILITUDES[doc] for doc in ORDEN_RRF]
+    seleccionados = recortar_por_similitud(ORDEN_RRF, similitudes, 4)
+    
+    # La 4.ª similitud es 0.55 y la comparten D y E: entran los cinco
+    assert [doc for doc, _ in seleccionados] == ["D", "A", "E", "B", "C"], seleccionados
+    assert [doc for doc, _ in recortar_por_similitud(ORDEN_RRF, similitudes, 3)] == ["A", "B", "C"]
+    assert recortar_por_similitud([], [], 3) == []
+    print(f"✅ k=4 con empate en 0.55: {', '.join(doc for doc, _ in seleccionados)}")
+
+def main():
+    """Ejecuta las pruebas de recuperación"""
+    print("=" * 60)
+    print("🧪 PRUEBAS DE RECUPERACIÓN")
+    print("=" * 60)
+    
+    tests = [
+        ("Corte por similitud en orden RRF", test_corte_por_similitud_en_orden_rrf),
+        ("Empates con el umbral", test_empates_con_el_umbral),
+    ]
+    
+    fallidas = 0
+    for test_name, test_func in tests:
+        try:
+            test_func()
+        except Exception as e:
+            fallidas += 1
+            print(f"❌ Error en prueba {test_name}: {e!r}")
+    
+    print(f"\n🎯 Resultado: {len(tests) - fallidas}/{len(tests)} pruebas pasaron")
+    sys.exit(1 if fallidas else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Pruebas de los respaldos incrementales y de la restauración verificada
+Trabajan sobre una colección pequeña generada en un directorio temporal (no necesitan Ollama)
+"""
+
+import itertools
+import os
+import sys
+import tempfile
+
+import chromadb
+import numpy as np
+from chromadb.api.client import SharedSystemClient
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import respaldos
+from respaldos import RepositorioRespaldos, crear_respaldo, restaurar_verificado, verificar_respaldo
+
+COLECCION = "documentos_pdf"
+CHUNKS = 60
+DIMENSION = 16
+
+def _crear_base(directorio):
+    """Crea una colección con CHUNKS vectores aleatorios (reproducibles) y la cierra"""
+    generador = np.random.default_rng(7)
+    coleccion = chromadb.PersistentClient(path=directorio).get_or_create_collection(COLECCION)
+    coleccion.add(
+        ids=[f"chunk_{i}" for i in range(CHUNKS)],
+        embeddings=generador.random((CHUNKS, DIMENSION), dtype=np.float32).tolist(),
+        documents=[f"Texto del chunk {i}" for i in range(CHUNKS)],
+        metadatas=[{"pagina": i} for i in range(CHUNKS)]
+    )
+    SharedSystemClient.clear_system_cache()
+
+def _coleccion(directorio):
+    return chromadb.PersistentClient(path=directorio).get_collection(COLECCION)
+
+def _modificar_base(directorio):
+    """Borra 20 chunks y agrega uno nuevo, como haría una ingesta posterior al respaldo"""
+    coleccion = _coleccion(directorio)
+    coleccion.delete(ids=[f"chunk_{i}" for i in range(20)])
+    coleccion.add(ids=["nuevo"], embeddings=[[0.5] * DIMENSION], documents=["Chunk posterior al respaldo"])
+    total = coleccion.count()
+    SharedSystemClient.clear_system_cache()
+    return total
+
+def _preparar(temporal):
+    persist_directory = os.path.join(temporal, "chroma_data")
+    _crear_base(persist_directory)
+    return persist_directory, RepositorioRespaldos(os.path.join(temporal, "respaldos"))
+
+def test_restaurar_sobre_base_modificada():
+    """La restauración deja la base como al respaldar y conserva la anterior aparte"""
+    print("🔍 Probando la restauración sobre una base modificada...")
+    with tempfile.TemporaryDirectory() as temporal:
+        persist_directory, repositorio = _preparar(temporal)
+        manifiesto = crear_respaldo(persist_directory, repositorio)
+        assert manifiesto["consistente"] and manifiesto["colecciones"] == {COLECCION: CHUNKS}, manifiesto
+        bloques, problemas = verificar_respaldo(manifiesto["id"], repositorio)
+        assert bloques and not problemas, problemas
+        
+        assert _modificar_base(persist_directory) == CHUNKS - 19
+        resultado = restaurar_verificado(manifiesto["id"], persist_directory, repositorio)
+        
+        coleccion = _coleccion(persist_directory)
+        assert coleccion.count() == CHUNKS, coleccion.count()
+        assert coleccion.get(ids=["chunk_0"])["documents"] == ["Texto del chunk 0"]
+        assert not coleccion.get(ids=["nuevo"])["ids"]
+        SharedSystemClient.clear_system_cache()
+        assert _coleccion(resultado["anterior"]).count() == CHUNKS - 19
+        SharedSystemClient.clear_system_cache()
+        assert not os.path.exists(f"{persist_directory}.restaurando-{manifiesto['id']}")
+    print(f"✅ {CHUNKS} chunks restaurados; la base modificada quedó en *.anterior-*")
+
+def test_validacion_fallida_no_toca_la_base():
+    """Si la copia extraída no pasa la validación, la base actual queda intacta"""
+    print("\n🔍 Probando la restauración con validación fallida...")
+    with tempfile.TemporaryDirectory() as temporal:
+        persist_directory, repositorio = _preparar(temporal)
+        manifiesto = crear_respaldo(persist_directory, repositorio)
+        total = _modificar_base(persist_directory)
+        
+        # Un manifiesto que espera más chunks de los que tiene la copia
+        manifiesto["colecciones"] = {COLECCION: CHUNKS + 1}
+        repositorio.guardar_manifiesto(manifiesto)
+        try:
+            restaurar_verificado(manifiesto["id"], persist_directory, repositorio)
+            raise AssertionError("se esperaba un error de validación")
+        except ValueError as e:
+            mensaje = str(e)
+        
+        assert "Validación fallida" in mensaje, mensaje
+        assert _coleccion(persist_directory).count() == total
+        SharedSystemClient.clear_system_cache()
+        hermanos = [nombre for nombre in os.listdir(temporal) if nombre.startswith("chroma_data.")]
+        assert not hermanos, hermanos
+    print(f"✅ {mensaje}; la base sigue con sus {total} chunks y no quedan directorios a medias")
+
+def test_respaldo_inconsistente_no_se_restaura():
+    """Con escrituras durante todas las copias, el respaldo queda marcado y no se restaura sin forzar"""
+    print("\n🔍 Probando un respaldo con escrituras concurrentes...")
+    original = respaldos.ultima_escritura
+    with tempfile.TemporaryDirectory() as temporal:
+        persist_directory, repositorio = _preparar(temporal)
+        # Cada lectura del seq_id ve una escritura nueva
+        contador = itertools.count()
+        respaldos.ultima_escritura = lambda ruta: next(contador)
+        try:
+            manifiesto = crear_respaldo(persist_directory, repositorio)
+        finally:
+            respaldos.ultima_escritura = original
+        
+        assert manifiesto["consistente"] is False, manifiesto
+        assert manifiesto["resumen"]["intentos"] == respaldos.get_backup_config()["consistency_attempts"]
+        try:
+            restaurar_verificado(manifiesto["id"], persist_directory, repositorio)
+            raise AssertionError("se esperaba el rechazo del respaldo inconsistente")
+        except ValueError as e:
+            assert "inconsistente" in str(e), e
+        
+        restaurar_verificado(manifiesto["id"], persist_directory, repositorio, forzar=True)
+        assert _coleccion(persist_directory).count() == CHUNKS
+        SharedSystemClient.clear_system_cache()
+    print(f"✅ Marcado como inconsistente tras {manifiesto['resumen']['intentos']} copias; solo se restaura forzando")
+
+def main():
+    """Ejecuta las pruebas de respaldos"""
+    print("=" * 60)
+    print("🧪 PRUEBAS DE RESPALDOS")
+    print("=" * 60)
+    
+    tests = [
+        ("Restaurar sobre base modificada", test_restaurar_sobre_base_modificada),
+        ("Validación fallida", test_validacion_fallida_no_toca_la_base),
+        ("Respaldo inconsistente", test_respaldo_inconsistente_no_se_restaura),
+    ]
+    
+    fallidas = 0
+    for test_name, test_func in tests:
+        try:
+            test_func()
+        except Exception as e:
+            fallidas += 1
+            print(f"❌ Error en prueba {test_name}: {e!r}")
+    
+    print(f"\n🎯 Resultado: {len(tests) - fallidas}/{len(tests)} pruebas pasaron")
+    sys.exit(1 if fallidas else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Trazas por etapa del pipeline RAG
+Mide carga de PDFs, división, embeddings, inserción, búsqueda, construcción
+del prompt y tiempos del LLM; agrega histogramas de latencia y exporta a JSON
+"""
+
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+# Agregar el directorio actual al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from langchain_core.embeddings import Embeddings
+
+from config import get_tracing_config
+
+# Límites superiores (ms) de los buckets de los histogramas
+BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+# Orden de presentación de las etapas conocidas
+ETAPAS = [
+    "pdf_load", "split", "embed", "upsert",
+    "query_embed", "query_expansion", "vector_search", "context_pack", "prompt_build",
+    "llm_ttft", "llm_generation", "consulta"
+]
+
+def _percentil(ordenados, p):
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100.0 * (len(ordenados) - 1))))]
+
+class Histograma:
+    """Histograma de latencias con buckets fijos y muestras recientes para percentiles"""
+    
+    def __init__(self, max_muestras=1000):
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.muestras = deque(maxlen=max_muestras)
+        self.total = 0
+        self.suma_ms = 0.0
+        self.max_ms = 0.0
+    
+    def registrar(self, duracion_ms):
+        indice = next((i for i, limite in enumerate(BUCKETS_MS) if duracion_ms <= limite), len(BUCKETS_MS))
+        self.buckets[indice] += 1
+        self.muestras.append(duracion_ms)
+        self.total += 1
+        self.suma_ms += duracion_ms
+        self.max_ms = max(self.max_ms, duracion_ms)
+    
+    def resumen(self):
+        ordenados = sorted(self.muestras)
+        return {
+            "total": self.total,
+            "suma_ms": round(self.suma_ms, 3),
+            "media_ms": round(self.suma_ms / self.total, 3) if self.total else 0.0,
+            "p50_ms": round(_percentil(ordenados, 50), 3),
+            "p95_ms": round(_percentil(ordenados, 95), 3),
+            "p99_ms": round(_percentil(ordenados, 99), 3),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": {
+                **{f"<={limite}": n for limite, n in zip(BUCKETS_MS, self.buckets)},
+                "+Inf": self.buckets[-1]
+            }
+        }
+
+class Tracer:
+    """
+    Registra spans anidados y agrega su duración por etapa
+    Un span exclusivo descuenta el tiempo de sus spans hijos del mismo hilo (p. ej. la
+    búsqueda sin el embedding de la consulta que LangChain calcula dentro). El span
+    actual vive en una variable de contexto: las tareas enviadas a otros hilos con
+    en_contexto() quedan como hijas suyas, pero su tiempo no se descuenta porque
+    corre en paralelo (lo que el hilo que llama espera se mide con su propio span)
+    """
+    
+    def __init__(self, habilitado=None, max_spans=None):
+        config = get_tracing_config()
+        self.habilitado = config["enabled"] if habilitado is None else habilitado
+        self.spans = deque(maxlen=max_spans or config["max_spans"])
+        self.histogramas = {}
+        self._lock = threading.Lock()
+        self._actual = contextvars.ContextVar(f"span_actual_{id(self)}", default=None)
+        self._ids = 0
+    
+    def _nuevo_id(self):
+        with self._lock:
+            self._ids += 1
+            return self._ids
+    
+    @contextmanager
+    def span(self, nombre, exclusivo=False, **atributos):
+        """Mide el bloque como un span de la etapa indicada"""
+        if not self.habilitado:
+            yield atributos
+            return
+        
+        padre = self._actual.get()
+        actual = {
+            "id": self._nuevo_id(),
+            "padre": padre["id"] if padre else None,
+            "nombre": nombre,
+            "inicio": time.time(),
+            "hilo": threading.get_ident(),
+            "hijos_ms": 0.0,
+            "atributos": atributos
+        }
+        token = self._actual.set(actual)
+        inicio = time.perf_counter()
+        error = None
+        try:
+            yield atributos
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            duracion_ms = (time.perf_counter() - inicio) * 1000
+            self._actual.reset(token)
+            if padre and padre["hilo"] == actual["hilo"]:
+                padre["hijos_ms"] += duracion_ms
+            
+            propia_ms = max(duracion_ms - actual["hijos_ms"], 0.0)
+            self._guardar(actual, duracion_ms, propia_ms if exclusivo else duracion_ms, error)
+    
+    def registrar(self, nombre, duracion_ms, **atributos):
+        """Registra una duración medida fuera de un bloque (p. ej. el primer token del LLM)"""
+        if not self.habilitado:
+            return
+        padre = self._actual.get()
+        actual = {
+            "id": self._nuevo_id(),
+            "padre": padre["id"] if padre else None,
+            "nombre": nombre,
+            "inicio": time.time() - duracion_ms / 1000,
+            "atributos": atributos
+        }
+        self._guardar(actual, duracion_ms, duracion_ms, None)
+    
+    def _guardar(self, span, duracion_ms, duracion_etapa_ms, error):
+        registro = {
+            "id": span["id"],
+            "padre": span["padre"],
+            "nombre": span["nombre"],
+            "inicio": span["inicio"],
+            "duracion_ms": round(duracion_ms, 3),
+            "duracion_etapa_ms": round(duracion_etapa_ms, 3),
+            "atributos": span["atributos"],
+            "error": error
+        }
+        with self._lock:
+            self.spans.append(registro)
+            if span["nombre"] not in self.histogramas:
+                self.histogramas[span["nombre"]] = Histograma()
+            self.histogramas[span["nombre"]].registrar(duracion_etapa_ms)
+    
+    def resumen(self):
+        """Retorna el resumen de los histogramas por etapa"""
+        with self._lock:
+            nombres = sorted(self.histogramas, key=lambda n: (ETAPAS.index(n) if n in ETAPAS else len(ETAPAS), n))
+            return {nombre: self.histogramas[nombre].resumen() for nombre in nombres}
+    
+    def exportar_json(self, ruta=None):
+        """Exporta spans e histogramas a un archivo JSON y retorna la ruta"""
+        ruta = ruta or get_tracing_config()["export_path"]
+        with self._lock:
+            spans = list(self.spans)
+        datos = {
+            "timestamp": datetime.now().isoformat(),
+            "histogramas": self.resumen(),
+            "spans": spans
+        }
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(datos, f, indent=2, ensure_ascii=False)
+        return ruta
+    
+    def imprimir_resumen(self):
+        """Muestra la latencia por etapa"""
+        resumen = self.resumen()
+        if not resumen:
+            print("ℹ️ No hay trazas registradas todavía")
+            return
+        
+        print(f"\n⏱️  Latencia por etapa:")
+        print(f"   {'Etapa':<16}{'N':>6}{'p50 ms':>11}{'p95 ms':>11}{'max ms':>11}{'total s':>10}")
+        for nombre, datos in resumen.items():
+            print(f"   {nombre:<16}{datos['total']:>6}{datos['p50_ms']:>11.1f}{datos['p95_ms']:>11.1f}"
+                  f"{datos['max_ms']:>11.1f}{datos['suma_ms'] / 1000:>10.2f}")
+
+class EmbeddingsTrazados(Embeddings):
+    """Envuelve un modelo de embeddings para medir embed (documentos) y query_embed"""
+    
+    def __init__(self, embeddings, tracer):
+        self.embeddings = embeddings
+        self.tracer = tracer
+    
+    def embed_documents(self, texts):
+        with self.tracer.span("embed", textos=len(texts)):
+            return self.embeddings.embed_documents(texts)
+    
+    def embed_query(self, text):
+        with self.tracer.span("query_embed"):
+            return self.embeddings.embed_query(text)
+    
+    def __getattr__(self, nombre):
+        # Exponer model, base_url, etc. del modelo envuelto
+        if nombre == "embeddings":
+            raise AttributeError(nombre)
+        return getattr(self.embeddings, nombre)
+
+def en_contexto(funcion):
+    """
+    Envuelve una función para ejecutarla en otro hilo (p. ej. con un ThreadPoolExecutor)
+    con el contexto actual, así sus spans cuelgan del span que la envió
+    """
+    return functools.partial(contextvars.copy_context().run, funcion)
+
+def trazar(nombre, exclusivo=False):
+    """Decorador que mide cada llamada a la función como un span"""
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with obtener_tracer().span(nombre, exclusivo=exclusivo):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+_tracer = None
+
+def obtener_tracer():
+    """Retorna el tracer compartido del proceso"""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer()
+    return _tracer
@@ -14,7 +14,13 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from config import get_ollama_config, get_chroma_config, get_models_config
 from langchain_chroma import Chroma
-from langchain_ollama import OllamaEmbeddings
+from cliente_ollama import crear_embeddings
+from escaneo import escanear, primer_registro
+from estadisticas_coleccion import obtener_estadisticas
+from benchmark_recuperacion import ejecutar_benchmark, imprimir_resultados
+from ajuste_hnsw import configuracion_hnsw
+from catalogo_sqlite import abrir_catalogo
+from inspector_hnsw import inspeccionar, imprimir_informe
 
 class IndexAnalyzer:
     """Clase para analizar índices de la base de datos Chroma"""
@@ -26,8 +32,8 @@ class IndexAnalyzer:
         self.models_config = get_models_config()
         
         # Inicializar embeddings y cliente Chroma
-        self.embeddings = OllamaEmbeddings(
-            model=self.models_config["embedding_model"],
+        self.embeddings = crear_embeddings(
+            self.models_config["embedding_model"],
             base_url=self.ollama_config["base_url"]
         )
         
@@ -61,25 +67,24 @@ class IndexAnalyzer:
             print(f"   - Total de documentos: {count}")
             
             if count > 0:
-                # Obtener información de metadatos
-                results = collection.get()
-                if results and results['metadatas']:
-                    print(f"   - Documentos con metadatos: {len([m for m in results['metadatas'] if m])}")
-                    
-                    # Analizar metadatos únicos
-                    metadata_keys = set()
-                    for metadata in results['metadatas']:
-                        if metadata:
-                            metadata_keys.update(metadata.keys())
+                # Obtener información de metadatos (solo metadatos, por lotes)
+                con_metadatos = 0
+                metadata_keys = set()
+                for registro in escanear(collection, include=("metadatas",)):
+                    if registro['metadata']:
+                        con_metadatos += 1
+                        metadata_keys.update(registro['metadata'].keys())
                     
+                if con_metadatos:
+                    print(f"   - Documentos con metadatos: {con_metadatos}")
                     print(f"   - Campos de metadatos: {len(metadata_keys)}")
                     for key in sorted(metadata_keys):
                         print(f"      - {key}")
                 
-                # Información de embeddings
-                if results and results['embeddings']:
-                    embedding_dim = len(results['embeddings'][0]) if results['embeddings'] else 0
-                    print(f"   - Dimensión de embeddings: {embedding_dim}")
+                # Información de embeddings (basta con un vector)
+                primero = primer_registro(collection, include=("embeddings",))
+                if primero and primero['embedding'] is not None:
+                    print(f"   - Dimensión de embeddings: {len(primero['embedding'])}")
                     
         except Exception as e:
             print(f"❌ Error al obtener información básica: {e}")
@@ -127,6 +132,10 @@ class IndexAnalyzer:
                             size = file.stat().st_size
                             size_mb = size / (1024 * 1024)
                             print(f"      - {file.name}: {size_mb:.2f} MB")
+                
+                # Contenido de los segmentos HNSW (niveles, grado, borrados, huérfanos)
+                print(f"\n🔬 Segmentos HNSW:")
+                imprimir_informe(inspeccionar(str(persist_dir), collection.name))
             else:
                 print(f"⚠️  El directorio {persist_dir} no existe")
                 
@@ -150,62 +159,82 @@ class IndexAnalyzer:
             print(f"📊 Métricas de rendimiento:")
             print(f"   - Total de documentos indexados: {count}")
             
-            # Probar diferentes tipos de consultas
-            test_queries = [
-                "YOLO",
-                "detection", 
-                "model",
-                "architecture"
-            ]
-            
+            # Benchmark corto (con calentamiento y percentiles); el barrido
+            # completo se ejecuta con: python benchmark_recuperacion.py
             print(f"\n🔍 Pruebas de rendimiento de consultas:")
-            
-            for query in test_queries:
-                import time
-                start_time = time.time()
-                
-                # Realizar consulta
-                results = self.chroma_client.similarity_search(query, k=5)
-                
-                end_time = time.time()
-                query_time = (end_time - start_time) * 1000  # en milisegundos
-                
-                print(f"   - '{query}': {len(results)} resultados en {query_time:.2f}ms")
+            imprimir_resultados(self._benchmark_rapido())
             
             # Análisis de distribución de documentos
             print(f"\n📈 Análisis de distribución:")
             
-            results = collection.get()
-            if results and results['metadatas']:
-                # Analizar distribución por fuente
-                source_distribution = {}
-                for metadata in results['metadatas']:
-                    if metadata and 'source' in metadata:
-                        source = os.path.basename(metadata['source'])
-                        source_distribution[source] = source_distribution.get(source, 0) + 1
+            total, source_distribution, page_distribution = self._distribuciones(collection)
                 
+            if total:
                 print(f"   - Distribución por documento:")
                 for source, count in sorted(source_distribution.items()):
-                    percentage = (count / len(results['metadatas'])) * 100
+                    percentage = (count / total) * 100
                     print(f"      - {source}: {count} chunks ({percentage:.1f}%)")
                 
-                # Analizar distribución por página
-                page_distribution = {}
-                for metadata in results['metadatas']:
-                    if metadata and 'page' in metadata:
-                        page = metadata['page']
-                        page_distribution[page] = page_distribution.get(page, 0) + 1
-                
                 if page_distribution:
                     print(f"   - Distribución por página:")
                     for page in sorted(page_distribution.keys()):
                         count = page_distribution[page]
-                        percentage = (count / len(results['metadatas'])) * 100
+                        percentage = (count / total) * 100
                         print(f"      - Página {page}: {count} chunks ({percentage:.1f}%)")
             
         except Exception as e:
             print(f"❌ Error al analizar rendimiento: {e}")
     
+    def _benchmark_rapido(self):
+        """Benchmark con k=5, una consulta por llamada y un solo cliente"""
+        return ejecutar_benchmark(
+            self.chroma_client, self.embeddings,
+            k_values=[5], tamanos_lote=[1], concurrencias=[1], repeticiones=10
+        )
+    
+    def _distribuciones(self, collection):
+        """
+        Retorna (total, chunks por fuente, chunks por página) desde las estadísticas
+        incrementales o, si no están al día, con SQL sobre chroma.sqlite3; solo si
+        el catálogo no es compatible se hace una pasada por lotes sobre los metadatos
+        """
+        source_distribution = {}
+        page_distribution = {}
+        
+        resumen = None
+        estadisticas = obtener_estadisticas()
+        if estadisticas and estadisticas.sincronizado(collection):
+            resumen = estadisticas.resumen()
+        else:
+            catalogo = abrir_catalogo(self.config["persist_directory"], self.config["collection_name"])
+            if catalogo:
+                try:
+                    resumen = {
+                        "total": catalogo.contar(),
+                        "chunks_por_fuente": catalogo.chunks_por_fuente(),
+                        "chunks_por_pagina": catalogo.chunks_por_pagina()
+                    }
+                finally:
+                    catalogo.cerrar()
+        
+        if resumen:
+            for source, count in resumen["chunks_por_fuente"].items():
+                nombre = os.path.basename(source)
+                source_distribution[nombre] = source_distribution.get(nombre, 0) + count
+            return resumen["total"], source_distribution, resumen["chunks_por_pagina"]
+        
+        total = 0
+        for registro in escanear(collection, include=("metadatas",)):
+            total += 1
+            metadata = registro['metadata']
+            if metadata and 'source' in metadata:
+                source = os.path.basename(metadata['source'])
+                source_distribution[source] = source_distribution.get(source, 0) + 1
+            if metadata and 'page' in metadata:
+                page = metadata['page']
+                page_distribution[page] = page_distribution.get(page, 0) + 1
+        return total, source_distribution, page_distribution
+    
     def mostrar_configuracion_indices(self):
         """Muestra la configuración de índices"""
         print("\n" + "=" * 60)
@@ -228,6 +257,11 @@ class IndexAnalyzer:
             print(f"   - Optimizado para búsquedas de similitud de vectores")
             print(f"   - Índice en memoria para consultas rápidas")
             
+            hnsw = configuracion_hnsw(collection)
+            print(f"   - Espacio: {hnsw['space']}, M: {hnsw['M']}, "
+                  f"ef construcción: {hnsw['construction_ef']}, ef búsqueda: {hnsw['search_ef']}")
+            print(f"   - Medir recall vs latencia: python ajuste_hnsw.py")
+            
             # Información sobre persistencia
             print(f"\n💾 Persistencia:")
             print(f"   - Directorio: {self.config['persist_directory']}")
@@ -262,10 +296,15 @@ class IndexAnalyzer:
                     "chunk_size": self.config["chunk_size"],
                     "chunk_overlap": self.config["chunk_overlap"]
                 },
-                "index_structure": {},
+                "index_structure": {"hnsw": configuracion_hnsw(collection)},
                 "performance_metrics": {}
             }
             
+            # Distribución de chunks (desde las estadísticas incrementales si están al día)
+            _, source_distribution, page_distribution = self._distribuciones(collection)
+            report["collection_info"]["chunks_per_source"] = source_distribution
+            report["collection_info"]["chunks_per_page"] = {str(p): n for p, n in page_distribution.items()}
+            
             # Información de estructura de índices
             persist_dir = Path(self.config["persist_directory"])
             if persist_dir.exists():
@@ -283,24 +322,11 @@ class IndexAnalyzer:
                 report["index_structure"]["files"] = index_files
                 report["index_structure"]["total_files"] = len(index_files)
                 report["index_structure"]["total_size_mb"] = sum(f["size_mb"] for f in index_files)
+                report["index_structure"]["segments"] = inspeccionar(str(persist_dir), collection.name)
             
             # Métricas de rendimiento
             if count > 0:
-                import time
-                performance_tests = {}
-                
-                test_queries = ["YOLO", "detection", "model"]
-                for query in test_queries:
-                    start_time = time.time()
-                    results = self.chroma_client.similarity_search(query, k=5)
-                    end_time = time.time()
-                    
-                    performance_tests[query] = {
-                        "query_time_ms": (end_time - start_time) * 1000,
-                        "results_count": len(results)
-                    }
-                
-                report["performance_metrics"] = performance_tests
+                report["performance_metrics"] = self._benchmark_rapido()
             
             # Guardar reporte
             with open(filename, 'w', encoding='utf-8') as f: